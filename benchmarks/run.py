@@ -0,0 +1,449 @@
+"""
+Benchmarks for KasongoType
+Times the typing engine, analytics and storage hot paths on synthetic data
+and compares the results with a stored baseline
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from common.analytics import UserProfile, _empty_stats
+from common.catalog import CATALOG_SUFFIX, build_catalog
+from common.rescore import DEFAULT_CHUNK_SIZE, rescore_store
+from common.storage import STORE_BACKENDS, create_store
+from common.typing_engine import ExerciseManager, TypingSession
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+# A best time per operation this much above the baseline is a regression
+DEFAULT_THRESHOLD = 0.25
+# Disk-bound benchmarks vary more from run to run
+STORAGE_THRESHOLD = 0.6
+
+WORDS = ("the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "neon", "grid", "signal",
+         "cyber", "deck", "runner", "static", "chrome", "pulse", "vector", "night", "city", "code")
+
+# name -> (setup, params, rounds, threshold); setup(tmp_dir, scale, **params) returns
+# (prepare, ops): prepare() builds the state for one round and returns the
+# timed callable, which performs `ops` operations
+BENCHMARKS = {}
+
+
+def benchmark(name: str, rounds: int = 5, threshold: Optional[float] = None, **params):
+    """Register a benchmark, once per parameter set
+
+    A `threshold` replaces the default regression threshold for it.
+    """
+    def register(setup: Callable):
+        label = name + ("[" + ",".join(f"{key}={value}" for key, value in params.items()) + "]" if params else "")
+        BENCHMARKS[label] = (setup, params, rounds, threshold)
+        return setup
+    return register
+
+
+def scaled(size: int, scale: float) -> int:
+    return max(1, int(size * scale))
+
+
+def make_text(chars: int, rng: random.Random) -> str:
+    """Space-separated words, `chars` characters long"""
+    words = []
+    length = 0
+    while length < chars:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:chars]
+
+
+def make_profile(session_count: int, rng: random.Random) -> Dict:
+    """A stored profile with `session_count` sessions and fresh aggregates"""
+    sessions = []
+    for i in range(session_count):
+        wpm = round(rng.uniform(20, 120), 1)
+        accuracy = round(rng.uniform(80, 100), 1)
+        time_elapsed = rng.uniform(10, 60)
+        sessions.append({
+            "timestamp": "2026-01-01T00:00:00",
+            "ts": 1767225600000 + i * 60000,
+            "exercise_id": "b1",
+            "wpm": wpm,
+            "accuracy": accuracy,
+            "time_elapsed": time_elapsed,
+            "char_count": int(wpm * 5 * time_elapsed / 60),
+            "errors": 0,
+            "total_keystrokes": int(wpm * 5 * time_elapsed / 60),
+            "verified": True
+        })
+    profile = {"created_at": "2026-01-01T00:00:00", "last_active": "2026-01-01T00:00:00",
+               "sessions": sessions, "stats": _empty_stats()}
+    UserProfile.rebuild_stats(profile)
+    return profile
+
+
+def make_exercises(count: int, rng: random.Random) -> Dict:
+    """An exercise catalog in the JSON file shape, spread over three levels"""
+    levels = {"beginner": [], "intermediate": [], "advanced": []}
+    names = list(levels)
+    for i in range(count):
+        level = names[i % len(names)]
+        levels[level].append({"id": f"x{i}", "title": f"Drill {i}", "text": make_text(rng.randint(40, 120), rng)})
+    return {"levels": levels}
+
+
+@benchmark("typing_session.process_keystroke", text_chars=20_000)
+def bench_process_keystroke(tmp_dir: Path, scale: float, text_chars: int):
+    """Type a long text one keystroke at a time, with a typo every 50 keys"""
+    rng = random.Random(1)
+    text = make_text(scaled(text_chars, scale), rng)
+    keys = []
+    for i, char in enumerate(text):
+        if i % 50 == 49:
+            keys.append("#")
+        keys.append(char)
+
+    def prepare():
+        typing_session = TypingSession(text, "bench")
+        start = typing_session.start_time
+
+        def run():
+            for i, key in enumerate(keys):
+                typing_session.process_keystroke(key, start + i * 0.01)
+        return run
+    return prepare, len(keys)
+
+
+@benchmark("typing_session.process_keystrokes", text_chars=20_000, batch=50)
+def bench_process_keystrokes(tmp_dir: Path, scale: float, text_chars: int, batch: int):
+    """Type a long text in client batches, as the keystroke endpoints do"""
+    rng = random.Random(2)
+    text = make_text(scaled(text_chars, scale), rng)
+    keystrokes = [{"key": char, "timestamp": 1000 + i * 10} for i, char in enumerate(text)]
+    batches = [keystrokes[i:i + batch] for i in range(0, len(keystrokes), batch)]
+
+    def prepare():
+        typing_session = TypingSession(text, "bench")
+
+        def run():
+            for keystroke_batch in batches:
+                typing_session.process_keystrokes(keystroke_batch)
+        return run
+    return prepare, len(keystrokes)
+
+
+@benchmark("typing_session.get_metrics", text_chars=20_000)
+def bench_get_metrics(tmp_dir: Path, scale: float, text_chars: int):
+    """A keystroke then a fresh metrics snapshot, as each live reply builds"""
+    rng = random.Random(3)
+    text = make_text(scaled(text_chars, scale), rng)
+
+    def prepare():
+        typing_session = TypingSession(text, "bench")
+        start = typing_session.start_time
+
+        def run():
+            for i, char in enumerate(text):
+                typing_session.process_keystroke(char, start + i * 0.01)
+                typing_session.get_metrics().to_dict()
+        return run
+    return prepare, len(text)
+
+
+def _exercise_manager_setup(tmp_dir: Path, scale: float, source: str, exercises: int):
+    path = tmp_dir / f"exercises_{source}_{exercises}.json"
+    catalog = make_exercises(scaled(exercises, scale), random.Random(4))
+    if source == "kcat":
+        path = path.with_suffix(CATALOG_SUFFIX)
+        build_catalog(catalog, str(path))
+    else:
+        with open(path, "w") as f:
+            json.dump(catalog, f)
+    del catalog
+
+    manager = ExerciseManager(str(path), check_interval=60.0)
+    calls = 10_000
+
+    def prepare():
+        def run():
+            for i in range(calls):
+                manager.get_random_exercise("advanced" if i % 2 else None)
+        return run
+    return prepare, calls
+
+
+for _size in (1_000, 100_000):
+    benchmark("exercise_manager.get_random_exercise", source="json", exercises=_size)(_exercise_manager_setup)
+# Catalogs this large are served memory-mapped rather than from JSON, and
+# random picks then depend on the page cache like the storage benchmarks
+for _size in (1_000, 100_000, 1_000_000):
+    benchmark("exercise_manager.get_random_exercise", threshold=STORAGE_THRESHOLD, source="kcat",
+              exercises=_size)(_exercise_manager_setup)
+
+
+def _record_session_setup(tmp_dir: Path, scale: float, store: str, sessions: int):
+    """Record sessions into a profile that already holds many"""
+    path = tmp_dir / store / "user_profiles.json"
+    path.parent.mkdir()
+    profile_store = create_store(store, str(path))
+    profile_store.save("bench", make_profile(scaled(sessions, scale), random.Random(5)))
+    user_profile = UserProfile("bench", str(path), store=profile_store)
+
+    text = make_text(60, random.Random(6))
+    keystrokes = [{"key": char, "timestamp": 1000 + i * 150} for i, char in enumerate(text)]
+    # The JSON store rewrites the whole file per session
+    calls = 10 if store == "json" else 100
+
+    def prepare():
+        def run():
+            for _ in range(calls):
+                user_profile.record_session("b1", 62.5, 97.0, 12.0, text=text, keystrokes=keystrokes)
+        return run
+    return prepare, calls
+
+
+for _store in STORE_BACKENDS:
+    benchmark("user_profile.record_session", rounds=7, threshold=STORAGE_THRESHOLD, store=_store,
+              sessions=10_000)(_record_session_setup)
+
+
+def _profile_load_setup(tmp_dir: Path, scale: float, store: str, users: int):
+    """Open a store and load one user's profile from a file of many users"""
+    path = tmp_dir / store / "user_profiles.json"
+    path.parent.mkdir()
+    rng = random.Random(7)
+    count = scaled(users, scale)
+    profile_store = create_store(store, str(path))
+    profile_store.save_many((f"user{i}", make_profile(5, rng)) for i in range(count))
+    profile_store.close()
+
+    def prepare():
+        def run():
+            cold_store = create_store(store, str(path))
+            UserProfile(f"user{count // 2}", str(path), store=cold_store)
+            cold_store.close()
+        return run
+    return prepare, 1
+
+
+for _store in STORE_BACKENDS:
+    benchmark("user_profile.load", rounds=3, threshold=STORAGE_THRESHOLD, store=_store,
+              users=100_000)(_profile_load_setup)
+
+
+def _rescore_setup(tmp_dir: Path, scale: float, store: str, users: int, sessions: int):
+    """Rescore every stored session, timed per session"""
+    path = tmp_dir / store / "user_profiles.json"
+    path.parent.mkdir()
+    rng = random.Random(8)
+    # Profiles are written serialized, so a few can stand in for all users
+    profiles = [make_profile(sessions, rng) for _ in range(50)]
+    count = scaled(users, scale)
+    profile_store = create_store(store, str(path))
+    with profile_store.bulk_write():
+        for start in range(0, count, DEFAULT_CHUNK_SIZE):
+            profile_store.save_many((f"user{i}", profiles[i % len(profiles)])
+                                    for i in range(start, min(count, start + DEFAULT_CHUNK_SIZE)))
+    profile_store.close()
+    del profiles
+
+    def prepare():
+        def run():
+            cold_store = create_store(store, str(path))
+            rescore_store(cold_store, str(tmp_dir / "rescore.json"))
+            cold_store.close()
+        return run
+    return prepare, count * sessions
+
+
+# A million sessions; the JSON store rewrites its whole file per chunk
+for _store in ("log", "sqlite"):
+    benchmark("rescore.rescore_store", rounds=1, threshold=STORAGE_THRESHOLD, store=_store,
+              users=20_000, sessions=50)(_rescore_setup)
+
+
+def reference_time(rounds: int = 5) -> float:
+    """Best time of a fixed pure-Python workload
+
+    Timed before each benchmark round, it tracks how fast the machine is
+    running at that moment, which varies a lot on shared and virtual machines.
+    """
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        values = {}
+        for i in range(20_000):
+            values[i & 255] = str(i) + "x"
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_benchmark(prepare: Callable, ops: int, rounds: int) -> Dict:
+    """Time rounds of a benchmark, in seconds per operation
+
+    "relative" is the best round's time per operation divided by the best
+    reference time measured before the rounds.
+    """
+    # One untimed round warms caches and lazy imports
+    prepare()()
+    times = []
+    references = []
+    for _ in range(rounds):
+        run = prepare()
+        references.append(reference_time())
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            run()
+            times.append((time.perf_counter() - started) / ops)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+    return {
+        "ops": ops,
+        "rounds": rounds,
+        "min": min(times),
+        "median": statistics.median(times),
+        "max": max(times),
+        "relative": min(times) / min(references)
+    }
+
+
+def run_benchmarks(selected: Optional[List[str]] = None, scale: float = 1.0, rounds: Optional[int] = None,
+                   progress: Optional[Callable[[str, Dict], None]] = None) -> Dict:
+    """Run the named benchmarks, or all, and return the results document"""
+    results = {}
+    for label, (setup, params, default_rounds, threshold) in BENCHMARKS.items():
+        if selected and not any(label.startswith(name) for name in selected):
+            continue
+        tmp_dir = Path(tempfile.mkdtemp(prefix="kasongotype-bench-"))
+        try:
+            prepare, ops = setup(tmp_dir, scale, **params)
+            result = time_benchmark(prepare, ops, rounds or default_rounds)
+            del prepare
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if threshold is not None:
+            result["threshold"] = threshold
+        results[label] = result
+        if progress is not None:
+            progress(label, result)
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+            "cpu_count": os.cpu_count(),
+            "scale": scale
+        },
+        "results": results
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, float, str]]:
+    """Compare the best round of each benchmark with a baseline
+
+    The fastest round relative to the reference workload is the least
+    disturbed by other load on the machine.
+    Returns (benchmark, current / baseline ratio, verdict) for benchmarks
+    present in both; the verdict is "slower", "faster" or "same". A
+    benchmark's own threshold takes precedence over `threshold`.
+    """
+    if current["meta"]["scale"] != baseline["meta"]["scale"]:
+        raise ValueError(f"baseline was run at scale {baseline['meta']['scale']}, "
+                         f"not {current['meta']['scale']}")
+
+    rows = []
+    for label, result in current["results"].items():
+        before = baseline["results"].get(label)
+        if before is None:
+            continue
+        ratio = result["relative"] / before["relative"]
+        limit = result.get("threshold", threshold)
+        if ratio > 1 + limit:
+            verdict = "slower"
+        elif ratio < 1 / (1 + limit):
+            verdict = "faster"
+        else:
+            verdict = "same"
+        rows.append((label, ratio, verdict))
+    return rows
+
+
+def _format_time(seconds: float) -> str:
+    for unit, factor in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if seconds * factor >= 1:
+            return f"{seconds * factor:.2f} {unit}"
+    return f"{seconds * 1e9:.0f} ns"
+
+
+def main(argv=None) -> None:
+    """Run the benchmarks from the command line"""
+    parser = argparse.ArgumentParser(description="Benchmark KasongoType's hot paths")
+    parser.add_argument("names", nargs="*", help="benchmarks to run, by name prefix (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply workload sizes, e.g. 0.01 for a quick run")
+    parser.add_argument("--rounds", type=int, help="timed rounds per benchmark")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fraction slower than the baseline that counts as a regression, "
+                             "storage benchmarks use their own")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    options = parser.parse_args(argv)
+
+    if options.list:
+        print("\n".join(BENCHMARKS))
+        return
+
+    def progress(label, result):
+        print(f"{label:<72} {_format_time(result['min']):>10}/op", file=sys.stderr)
+
+    current = run_benchmarks(options.names, options.scale, options.rounds, progress)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if options.save_baseline:
+        with open(options.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Saved baseline to {options.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(options.baseline):
+        print(f"No baseline at {options.baseline}, run with --save-baseline to store one", file=sys.stderr)
+        return
+    with open(options.baseline, "r") as f:
+        baseline = json.load(f)
+    try:
+        rows = compare(current, baseline, options.threshold)
+    except ValueError as e:
+        # A quick run at another scale is still useful, just not comparable
+        print(f"Not comparing with the baseline: {e}", file=sys.stderr)
+        return
+
+    for label, ratio, verdict in rows:
+        print(f"{label:<72} {ratio:>6.2f}x  {verdict}")
+    if any(verdict == "slower" for _, _, verdict in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
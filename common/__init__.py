@@ -0,0 +1,3 @@
+"""
+KasongoType core: typing engine, analytics and storage shared by the web and desktop apps
+"""
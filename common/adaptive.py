@@ -0,0 +1,174 @@
+"""
+Adaptive practice for KasongoType
+Tracks per-key weaknesses and generates drills that target them
+"""
+
+import random
+from array import array
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from common.typing_engine import PAUSE_MS
+
+# Bigram entries kept per profile, the least observed are dropped beyond it
+MAX_BIGRAMS = 2048
+
+# Observations a key needs before its own rates outweigh the user's average
+PRIOR_WEIGHT = 5
+
+# Share of drill words drawn from the whole vocabulary rather than targeted
+EXPLORE_SHARE = 0.25
+
+# Stat entry fields: correct keystrokes, wrong keystrokes, summed latency
+# of correct keystrokes in ms and how many latencies were summed
+HITS, MISSES, LATENCY_SUM, LATENCY_COUNT = range(4)
+
+
+def empty_key_stats() -> Dict:
+    """Per-character and per-bigram stats of a new profile"""
+    return {"chars": {}, "bigrams": {}}
+
+
+def _observe(table: Dict, key: str, correct: bool, latency_ms: Optional[float]) -> None:
+    entry = table.get(key)
+    if entry is None:
+        entry = table[key] = [0, 0, 0.0, 0]
+    if correct:
+        entry[HITS] += 1
+        if latency_ms is not None:
+            entry[LATENCY_SUM] += latency_ms
+            entry[LATENCY_COUNT] += 1
+    else:
+        entry[MISSES] += 1
+
+
+def update_key_stats(key_stats: Dict, text: str, keystrokes: Iterable[Dict]) -> Dict:
+    """Fold one session's keystrokes into running per-key stats
+
+    Each character keystroke counts against the character expected at that
+    point of `text`, and against the bigram ending in it. Latency is the time
+    since the previous character keystroke. Only this session's keystrokes
+    are read, the stored counts are updated in place.
+    """
+    chars = key_stats.setdefault("chars", {})
+    bigrams = key_stats.setdefault("bigrams", {})
+
+    position = 0
+    previous_time = None
+    for keystroke in keystrokes:
+        key = keystroke["key"]
+        # Modifiers and other named keys are not typed characters
+        if len(key) != 1:
+            continue
+        if position >= len(text):
+            break
+
+        latency_ms = None
+        if previous_time is not None:
+            interval = (keystroke["timestamp"] - previous_time) * 1000
+            if 0 <= interval <= PAUSE_MS:
+                latency_ms = interval
+        previous_time = keystroke["timestamp"]
+
+        expected = text[position]
+        correct = key == expected
+        _observe(chars, expected, correct, latency_ms)
+        if position > 0:
+            _observe(bigrams, text[position - 1:position + 1], correct, latency_ms)
+
+        if correct:
+            position += 1
+
+    if len(bigrams) > MAX_BIGRAMS:
+        keep = sorted(bigrams.items(), key=lambda item: item[1][HITS] + item[1][MISSES],
+                      reverse=True)[:MAX_BIGRAMS * 3 // 4]
+        key_stats["bigrams"] = dict(keep)
+    return key_stats
+
+
+def weakness_scores(key_stats: Dict) -> Dict[str, float]:
+    """Score every observed character and bigram, 1.0 being the user's average
+
+    Error rate and mean latency are both shrunk toward the user's overall
+    values, so keys seen only a few times stay close to 1.0.
+    """
+    chars = key_stats.get("chars", {})
+    hits = sum(entry[HITS] for entry in chars.values())
+    misses = sum(entry[MISSES] for entry in chars.values())
+    latency_sum = sum(entry[LATENCY_SUM] for entry in chars.values())
+    latency_count = sum(entry[LATENCY_COUNT] for entry in chars.values())
+    if hits + misses == 0:
+        return {}
+
+    # Floors keep the ratios finite for a flawless or instant typist
+    mean_error = max((misses + 1) / (hits + misses + 2), 0.01)
+    mean_latency = max(latency_sum / latency_count, 1.0) if latency_count else 1.0
+
+    scores = {}
+    for table in (chars, key_stats.get("bigrams", {})):
+        for key, entry in table.items():
+            error = (entry[MISSES] + PRIOR_WEIGHT * mean_error) / (entry[HITS] + entry[MISSES] + PRIOR_WEIGHT)
+            latency = (entry[LATENCY_SUM] + PRIOR_WEIGHT * mean_latency) / (entry[LATENCY_COUNT] + PRIOR_WEIGHT)
+            scores[key] = (error / mean_error) * (latency / mean_latency)
+    return scores
+
+
+class AdaptiveGenerator:
+    """Builds practice text weighted toward a user's weak keys
+
+    The corpus vocabulary is indexed once by every character and bigram its
+    words contain. A drill then only weighs the keys the user has stats for
+    and draws words straight from the index.
+    """
+
+    def __init__(self, texts: Iterable[str], max_words: int = 50000, max_word_length: int = 15):
+        self.words = []
+        seen = set()
+        for text in texts:
+            for word in text.split():
+                if len(word) <= max_word_length and word not in seen:
+                    seen.add(word)
+                    self.words.append(word)
+                    if len(self.words) >= max_words:
+                        break
+            if len(self.words) >= max_words:
+                break
+
+        # n-gram -> ids of the words containing it
+        self._index = {}
+        for word_id, word in enumerate(self.words):
+            grams = set(word)
+            grams.update(word[i:i + 2] for i in range(len(word) - 1))
+            for gram in grams:
+                ids = self._index.get(gram)
+                if ids is None:
+                    ids = self._index[gram] = array('I')
+                ids.append(word_id)
+
+    def targets(self, key_stats: Dict, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Weak keys present in the corpus, weakest first"""
+        scores = weakness_scores(key_stats)
+        targets = [(gram, score) for gram, score in scores.items() if score > 1.0 and gram in self._index]
+        targets.sort(key=lambda item: item[1], reverse=True)
+        return targets[:limit] if limit is not None else targets
+
+    def generate(self, key_stats: Dict, word_count: int = 30, rng: Optional[random.Random] = None) -> Dict:
+        """Synthesize a drill, returning its text and the keys it focuses on"""
+        rng = rng or random
+        if not self.words:
+            return {"text": "", "focus": []}
+
+        targets = self.targets(key_stats)
+        grams = [gram for gram, _ in targets]
+        # Squared scores push most of the drill onto the weakest keys
+        cum_weights = list(accumulate(score * score for _, score in targets))
+
+        words = []
+        for _ in range(word_count):
+            if grams and rng.random() >= EXPLORE_SHARE:
+                ids = self._index[rng.choices(grams, cum_weights=cum_weights)[0]]
+                words.append(self.words[ids[rng.randrange(len(ids))]])
+            else:
+                words.append(self.words[rng.randrange(len(self.words))])
+
+        return {"text": " ".join(words), "focus": grams[:5]}
@@ -3,42 +3,148 @@ Analytics module for KasongoType
 Tracks user performance over time and provides insights
 """
 
-import json
 import time
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime
 
+from common.adaptive import empty_key_stats, update_key_stats
+from common.leaderboard import SQLiteLeaderboard
+from common.storage import ProfileStore, JsonFileStore
+
+# Number of most recent sessions covered by the rolling averages
+ROLLING_WINDOWS = (10, 50, 100)
+
+# Progress bucket widths and offsets in milliseconds (weeks start on Monday)
+DAY_MS = 24 * 60 * 60 * 1000
+PROGRESS_RESOLUTIONS = {
+    "day": (DAY_MS, 0),
+    "week": (7 * DAY_MS, 4 * DAY_MS)
+}
+
+def downsample_lttb(xs: List[float], ys: List[float], threshold: int) -> List[int]:
+    """Pick indices of at most `threshold` points with Largest-Triangle-Three-Buckets"""
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+    
+    # Keep the first and last points, pick one per bucket in between
+    every = (n - 2) / (threshold - 2)
+    indices = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_count = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / avg_count
+        avg_y = sum(ys[avg_start:avg_end]) / avg_count
+        
+        ax, ay = xs[a], ys[a]
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        
+        indices.append(best)
+        a = best
+    
+    indices.append(n - 1)
+    return indices
+
+def _empty_rolling() -> Dict:
+    """Running sums for each rolling window"""
+    return {
+        str(window): {"wpm_sum": 0.0, "accuracy_sum": 0.0, "average_wpm": 0, "accuracy": 100}
+        for window in ROLLING_WINDOWS
+    }
+
+def _empty_stats() -> Dict:
+    """Aggregate stats for a profile without sessions"""
+    return {
+        "best_wpm": 0,
+        "average_wpm": 0,
+        "total_time": 0,
+        "exercises_completed": 0,
+        "accuracy": 100,
+        # Running sums so aggregates update in constant time
+        "session_count": 0,
+        "wpm_sum": 0.0,
+        "wpm_sq_sum": 0.0,
+        "accuracy_sum": 0.0,
+        "accuracy_sq_sum": 0.0,
+        "wpm_stddev": 0.0,
+        "accuracy_stddev": 0.0,
+        "rolling": _empty_rolling()
+    }
+
+def _stddev(total: float, total_sq: float, count: int) -> float:
+    """Population standard deviation from running sums"""
+    if count == 0:
+        return 0.0
+    mean = total / count
+    return max(total_sq / count - mean * mean, 0.0) ** 0.5
+
+def _empty_rhythm() -> Dict:
+    """Running inter-key interval totals for a profile without sessions"""
+    return {
+        "sessions": 0,
+        "interval_count": 0,
+        "interval_sum_ms": 0.0,
+        "interval_sq_sum_ms": 0.0,
+        "histogram": [],
+        "histogram_edges_ms": [],
+        "pauses": 0,
+        "active_time": 0.0,
+        "correct_keystrokes": 0,
+        "best_burst_wpm": 0.0
+    }
+
+def _add_rhythm(rhythm: Dict, summary: Dict) -> None:
+    """Fold one session's rhythm summary into the profile totals"""
+    rhythm["sessions"] += 1
+    for key in ("interval_count", "interval_sum_ms", "interval_sq_sum_ms", "pauses",
+                "active_time", "correct_keystrokes"):
+        rhythm[key] += summary[key]
+    rhythm["best_burst_wpm"] = max(rhythm["best_burst_wpm"], summary["burst_wpm"])
+    
+    # Start over if the bucket edges ever change
+    if rhythm["histogram_edges_ms"] != summary["histogram_edges_ms"]:
+        rhythm["histogram_edges_ms"] = list(summary["histogram_edges_ms"])
+        rhythm["histogram"] = [0] * len(summary["histogram"])
+    rhythm["histogram"] = [total + count for total, count in zip(rhythm["histogram"], summary["histogram"])]
+
 class UserProfile:
-    def __init__(self, user_id: str, data_path: str = "../common/data/user_profiles.json"):
+    def __init__(self, user_id: str, data_path: str = "../common/data/user_profiles.json",
+                 store: Optional[ProfileStore] = None):
         self.user_id = user_id
         self.data_path = Path(data_path)
+        # Default to the single JSON file at data_path
+        self.store = store if store is not None else JsonFileStore(data_path)
+        # Guards updates when one profile is shared between request threads
+        self._lock = threading.Lock()
         self.profile = self._load_profile()
+        self._build_progress_index()
         
     def _load_profile(self) -> Dict:
         """Load user profile from storage or create new one"""
-        if not self.data_path.exists():
-            # Create directory if it doesn't exist
-            self.data_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Create empty profiles file
-            with open(self.data_path, 'w') as f:
-                json.dump({}, f)
-                
-            return self._create_new_profile()
-            
-        try:
-            with open(self.data_path, 'r') as f:
-                profiles = json.load(f)
-            
-            if self.user_id in profiles:
-                return profiles[self.user_id]
-            else:
-                return self._create_new_profile()
-                
-        except (json.JSONDecodeError, IOError):
-            # Return empty structure if file is corrupted or unreadable
+        profile = self.store.load(self.user_id)
+        if profile is None:
             return self._create_new_profile()
+        
+        self._order_sessions(profile)
+        
+        # Stats are stored whole with each write, so when several processes
+        # record sessions the last writer's win. Derive them again whenever
+        # they do not cover the stored sessions, or predate running sums.
+        if profile["stats"].get("session_count") != len(profile["sessions"]):
+            self.rebuild_stats(profile)
+        return profile
     
     def _create_new_profile(self) -> Dict:
         """Create a new user profile with default values"""
@@ -46,13 +152,7 @@ class UserProfile:
             "created_at": datetime.now().isoformat(),
             "last_active": datetime.now().isoformat(),
             "sessions": [],
-            "stats": {
-                "best_wpm": 0,
-                "average_wpm": 0,
-                "total_time": 0,
-                "exercises_completed": 0,
-                "accuracy": 100
-            }
+            "stats": _empty_stats()
         }
         
         # Save new profile
@@ -64,81 +164,316 @@ class UserProfile:
         if profile_data is None:
             profile_data = self.profile
             
-        try:
-            with open(self.data_path, 'r') as f:
-                profiles = json.load(f)
-        except (json.JSONDecodeError, IOError):
-            profiles = {}
-            
-        profiles[self.user_id] = profile_data
+        self.store.save(self.user_id, profile_data)
+    
+    @staticmethod
+    def _order_sessions(profile: Dict) -> None:
+        """Give legacy sessions epoch-millis timestamps and keep them in time order"""
+        sessions = profile["sessions"]
+        in_order = True
+        previous = None
+        for session in sessions:
+            if "ts" not in session:
+                session["ts"] = int(datetime.fromisoformat(session["timestamp"]).timestamp() * 1000)
+            if previous is not None and session["ts"] < previous:
+                in_order = False
+            previous = session["ts"]
         
-        with open(self.data_path, 'w') as f:
-            json.dump(profiles, f, indent=2)
+        # Sessions are appended in time order, so this only sorts old data once
+        if not in_order:
+            sessions.sort(key=lambda s: s["ts"])
     
-    def record_session(self, exercise_id: str, wpm: float, accuracy: float, time_elapsed: float) -> None:
-        """Record a completed typing session"""
+    def _build_progress_index(self) -> None:
+        """Build the parallel arrays behind the progress charts"""
+        sessions = self.profile["sessions"]
+        self._progress_x = [s["ts"] for s in sessions]
+        self._progress_wpm = [s["wpm"] for s in sessions]
+        self._progress_accuracy = [s["accuracy"] for s in sessions]
+        
+        # Per-resolution bucket aggregates, built on first use
+        self._progress_buckets = {}
+    
+    def _bucket_aggregates(self, resolution: str) -> Dict[int, List[float]]:
+        """Get the cached {bucket start: [count, wpm sum/min/max, accuracy sum/min/max]} map"""
+        buckets = self._progress_buckets.get(resolution)
+        if buckets is None:
+            buckets = {}
+            self._progress_buckets[resolution] = buckets
+            for x, wpm, accuracy in zip(self._progress_x, self._progress_wpm, self._progress_accuracy):
+                self._add_to_bucket(buckets, resolution, x, wpm, accuracy)
+        return buckets
+    
+    @staticmethod
+    def _add_to_bucket(buckets: Dict, resolution: str, x: int, wpm: float, accuracy: float) -> None:
+        """Fold one session into its bucket"""
+        width, offset = PROGRESS_RESOLUTIONS[resolution]
+        start = (x - offset) // width * width + offset
+        
+        bucket = buckets.get(start)
+        if bucket is None:
+            buckets[start] = [1, wpm, wpm, wpm, accuracy, accuracy, accuracy]
+            return
+        
+        bucket[0] += 1
+        bucket[1] += wpm
+        bucket[2] = min(bucket[2], wpm)
+        bucket[3] = max(bucket[3], wpm)
+        bucket[4] += accuracy
+        bucket[5] = min(bucket[5], accuracy)
+        bucket[6] = max(bucket[6], accuracy)
+    
+    def record_session(self, exercise_id: str, wpm: float, accuracy: float, time_elapsed: float,
+                       text: Optional[str] = None, keystrokes: Optional[Iterable[Dict]] = None,
+                       rhythm: Optional[Dict] = None, verification: Optional[Dict] = None,
+                       level: Optional[str] = None,
+                       leaderboard: Optional[SQLiteLeaderboard] = None) -> None:
+        """Record a completed typing session
+        
+        When the exercise text and its keystrokes are given, they are also
+        folded into the profile's per-key stats. A rhythm summary from the
+        session's IntervalStats is added to the profile's interval totals.
+        A server verification result marks the session verified or flagged;
+        flagged sessions never count toward the best WPM. `level` is the
+        exercise's level when known, and a given leaderboard is offered the
+        recorded session.
+        """
+        now = datetime.now()
         session = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
+            "ts": int(now.timestamp() * 1000),
             "exercise_id": exercise_id,
             "wpm": wpm,
             "accuracy": accuracy,
             "time_elapsed": time_elapsed
         }
+        if level is not None:
+            session["level"] = level
+        if verification is not None:
+            # Raw counts let the score be recomputed if the formulas change
+            session["char_count"] = verification["char_count"]
+            session["errors"] = verification["errors"]
+            session["total_keystrokes"] = verification["total_keystrokes"]
+            session["verified"] = verification["verified"]
+            if verification["flags"]:
+                session["flags"] = verification["flags"]
+        if rhythm is not None:
+            session["burst_wpm"] = rhythm["burst_wpm"]
+            session["sustained_wpm"] = rhythm["sustained_wpm"]
+            session["consistency"] = rhythm["consistency"]
+        
+        with self._lock:
+            if text is not None and keystrokes is not None:
+                update_key_stats(self.profile.setdefault("key_stats", empty_key_stats()), text, keystrokes)
+            if rhythm is not None:
+                _add_rhythm(self.profile.setdefault("rhythm", _empty_rhythm()), rhythm)
+            self._append_session(session)
+        
+        if leaderboard is not None:
+            leaderboard.add_session(self.user_id, session)
+    
+    def get_rhythm(self) -> Dict:
+        """Inter-key interval stats across all sessions, for the dashboard"""
+        rhythm = self.profile.get("rhythm") or _empty_rhythm()
+        count = rhythm["interval_count"]
+        mean = rhythm["interval_sum_ms"] / count if count else 0.0
+        stddev = _stddev(rhythm["interval_sum_ms"], rhythm["interval_sq_sum_ms"], count)
+        active_time = rhythm["active_time"]
+        return {
+            "sessions": rhythm["sessions"],
+            "mean_interval_ms": round(mean, 1),
+            "stddev_interval_ms": round(stddev, 1),
+            "consistency": round(stddev / mean, 3) if mean else 0.0,
+            "best_burst_wpm": round(rhythm["best_burst_wpm"], 1),
+            "sustained_wpm": round((rhythm["correct_keystrokes"] / 5) / (active_time / 60), 1) if active_time else 0.0,
+            "pauses": rhythm["pauses"],
+            "histogram": rhythm["histogram"],
+            "histogram_edges_ms": rhythm["histogram_edges_ms"]
+        }
+    
+    def get_key_stats(self) -> Dict:
+        """Per-character and per-bigram error and latency counts"""
+        return self.profile.get("key_stats") or empty_key_stats()
+    
+    def _append_session(self, session: Dict) -> None:
+        """Add a session to the profile, its aggregates and storage"""
+        wpm = session["wpm"]
+        accuracy = session["accuracy"]
+        time_elapsed = session["time_elapsed"]
         
         # Update profile with new session
         self.profile["sessions"].append(session)
-        self.profile["last_active"] = datetime.now().isoformat()
+        self.profile["last_active"] = session["timestamp"]
+        self._progress_x.append(session["ts"])
+        self._progress_wpm.append(wpm)
+        self._progress_accuracy.append(accuracy)
+        for resolution, buckets in self._progress_buckets.items():
+            self._add_to_bucket(buckets, resolution, session["ts"], wpm, accuracy)
         
         # Update aggregate stats
         stats = self.profile["stats"]
-        stats["best_wpm"] = max(stats["best_wpm"], wpm)
+        if not session.get("flags"):
+            stats["best_wpm"] = max(stats["best_wpm"], wpm)
         stats["exercises_completed"] += 1
         stats["total_time"] += time_elapsed
-        
-        # Calculate new average WPM
-        total_sessions = len(self.profile["sessions"])
-        if total_sessions > 0:
-            total_wpm = sum(s["wpm"] for s in self.profile["sessions"])
-            stats["average_wpm"] = round(total_wpm / total_sessions, 2)
+        self._add_to_aggregates(stats, self.profile["sessions"], session)
             
-            # Calculate new average accuracy
-            total_accuracy = sum(s["accuracy"] for s in self.profile["sessions"])
-            stats["accuracy"] = round(total_accuracy / total_sessions, 2)
+        # Persist only the new session and the updated aggregates
+        self.store.append_session(self.user_id, session, self.profile)
+    
+    @staticmethod
+    def _add_to_aggregates(stats: Dict, sessions: List[Dict], session: Dict) -> None:
+        """Fold the newest session (already appended to sessions) into the running sums"""
+        wpm = session["wpm"]
+        accuracy = session["accuracy"]
+        
+        stats["session_count"] += 1
+        stats["wpm_sum"] += wpm
+        stats["wpm_sq_sum"] += wpm * wpm
+        stats["accuracy_sum"] += accuracy
+        stats["accuracy_sq_sum"] += accuracy * accuracy
+        
+        count = stats["session_count"]
+        stats["average_wpm"] = round(stats["wpm_sum"] / count, 2)
+        stats["accuracy"] = round(stats["accuracy_sum"] / count, 2)
+        stats["wpm_stddev"] = round(_stddev(stats["wpm_sum"], stats["wpm_sq_sum"], count), 2)
+        stats["accuracy_stddev"] = round(_stddev(stats["accuracy_sum"], stats["accuracy_sq_sum"], count), 2)
+        
+        # Slide each window forward: add the new session, drop the one that fell out
+        for window in ROLLING_WINDOWS:
+            rolling = stats["rolling"][str(window)]
+            rolling["wpm_sum"] += wpm
+            rolling["accuracy_sum"] += accuracy
+            if len(sessions) > window:
+                dropped = sessions[-window - 1]
+                rolling["wpm_sum"] -= dropped["wpm"]
+                rolling["accuracy_sum"] -= dropped["accuracy"]
             
-        # Save updated profile
-        self._save_profile()
+            window_count = min(len(sessions), window)
+            rolling["average_wpm"] = round(rolling["wpm_sum"] / window_count, 2)
+            rolling["accuracy"] = round(rolling["accuracy_sum"] / window_count, 2)
+    
+    @classmethod
+    def rebuild_stats(cls, profile: Dict) -> None:
+        """Recompute all aggregate stats, including running sums, from the sessions"""
+        stats = profile["stats"]
+        stats.update(_empty_stats())
+        
+        # Replay sessions through the same incremental update used when recording
+        replayed = []
+        for session in profile["sessions"]:
+            replayed.append(session)
+            if not session.get("flags"):
+                stats["best_wpm"] = max(stats["best_wpm"], session["wpm"])
+            stats["exercises_completed"] += 1
+            stats["total_time"] += session["time_elapsed"]
+            cls._add_to_aggregates(stats, replayed, session)
     
     def get_recent_sessions(self, limit: int = 10) -> List[Dict]:
-        """Get the most recent typing sessions"""
-        sessions = sorted(
-            self.profile["sessions"], 
-            key=lambda s: s["timestamp"], 
-            reverse=True
-        )
-        return sessions[:limit]
-    
-    def get_progress_data(self) -> Dict[str, List]:
-        """Get data for progress charts"""
-        # Sort sessions by timestamp
-        sorted_sessions = sorted(
-            self.profile["sessions"],
-            key=lambda s: s["timestamp"]
-        )
-        
-        # Prepare data for charts
-        wpm_over_time = []
-        accuracy_over_time = []
-        
-        for session in sorted_sessions:
-            timestamp = datetime.fromisoformat(session["timestamp"]).timestamp() * 1000  # Convert to JS timestamp
-            wpm_over_time.append({"x": timestamp, "y": session["wpm"]})
-            accuracy_over_time.append({"x": timestamp, "y": session["accuracy"]})
+        """Get the most recent typing sessions, newest first"""
+        if limit <= 0:
+            return []
+        # Sessions are kept in time order, so the newest are at the tail
+        return self.profile["sessions"][-limit:][::-1]
+    
+    def get_progress_data(self, limit: Optional[int] = None, resolution: Optional[str] = None,
+                          max_points: Optional[int] = None) -> Dict[str, List]:
+        """Get data for progress charts
+        
+        By default there is one point per session, optionally only the last
+        `limit` ones. With a `resolution` of "day" or "week" each point is a
+        bucket with mean, min and max values. `max_points` bounds the series
+        with LTTB downsampling.
+        """
+        if resolution is not None:
+            if resolution not in PROGRESS_RESOLUTIONS:
+                raise ValueError(f"Unknown resolution: {resolution}")
             
+            buckets = self._bucket_aggregates(resolution)
+            xs = list(buckets)
+            aggregates = list(buckets.values())
+            wpm = [b[1] / b[0] for b in aggregates]
+            accuracy = [b[4] / b[0] for b in aggregates]
+        else:
+            xs, wpm, accuracy, aggregates = self._progress_x, self._progress_wpm, self._progress_accuracy, None
+        
+        start = 0
+        if limit is not None:
+            start = max(len(xs) - limit, 0)
+        indices = range(start, len(xs))
+        
+        if max_points is not None and len(indices) > max_points:
+            picked = downsample_lttb(xs[start:], wpm[start:], max_points)
+            indices = [start + i for i in picked]
+        
+        if aggregates is None:
+            return {
+                "wpm": [{"x": xs[i], "y": wpm[i]} for i in indices],
+                "accuracy": [{"x": xs[i], "y": accuracy[i]} for i in indices]
+            }
+        
         return {
-            "wpm": wpm_over_time,
-            "accuracy": accuracy_over_time
+            "wpm": [{"x": xs[i], "y": round(wpm[i], 2), "min": aggregates[i][2], "max": aggregates[i][3],
+                     "count": aggregates[i][0]} for i in indices],
+            "accuracy": [{"x": xs[i], "y": round(accuracy[i], 2), "min": aggregates[i][5], "max": aggregates[i][6],
+                          "count": aggregates[i][0]} for i in indices]
         }
         
     def get_stats(self) -> Dict:
         """Get user statistics"""
-        return self.profile["stats"]
\ No newline at end of file
+        return self.profile["stats"]
+
+class ProfileCache:
+    """Process-wide LRU cache of loaded user profiles
+    
+    Keeps recently used profiles in memory so dashboard reads and session
+    records for active users skip storage. Pair it with a WriteBehindStore
+    to coalesce the writes as well. A profile is only reloaded once evicted
+    or, with `ttl` set, once it has been cached for `ttl` seconds. When
+    several processes share the store, set `revalidate` to check the
+    store's version of the profile on every get and reload it on a change.
+    """
+    
+    def __init__(self, store: ProfileStore, capacity: int = 1024, ttl: Optional[float] = None,
+                 data_path: str = "../common/data/user_profiles.json", revalidate: bool = False):
+        self.store = store
+        self.capacity = capacity
+        self.ttl = ttl
+        self.data_path = data_path
+        self.revalidate = revalidate
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id: str) -> UserProfile:
+        """Get a user's profile, loading it on a miss"""
+        now = time.monotonic()
+        # Read before any load, so a change made during it is caught next time
+        version = self.store.version(user_id) if self.revalidate else None
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if (entry is not None and (self.ttl is None or now - entry[1] < self.ttl)
+                    and entry[2] == version):
+                self._profiles.move_to_end(user_id)
+                return entry[0]
+        
+        # Load outside the lock so one slow read doesn't stall every user
+        profile = UserProfile(user_id, data_path=self.data_path, store=self.store)
+        
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if entry is not None and entry[1] >= now:
+                # Another thread loaded it meanwhile, keep a single instance
+                return entry[0]
+            
+            self._profiles[user_id] = (profile, now, version)
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.capacity:
+                self._profiles.popitem(last=False)
+        return profile
+    
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's profile so the next get reloads it"""
+        with self._lock:
+            self._profiles.pop(user_id, None)
+    
+    def __len__(self) -> int:
+        return len(self._profiles)
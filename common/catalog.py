@@ -0,0 +1,261 @@
+"""
+Memory-mapped exercise catalog for KasongoType
+Serves large exercise corpora without loading them into memory
+"""
+
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# File layout, all integers little-endian:
+#   header   magic, version, level count, record count, then byte offsets
+#            of the level table, record table, id index and string blob
+#   levels   per level: name offset and length in the blob, first record
+#            and record count; records of a level are contiguous
+#   records  per exercise: offsets and lengths of id, title and text
+#   index    record numbers sorted by (level, id) for binary search
+#   blob     UTF-8 strings the tables point into
+CATALOG_MAGIC = b"KCAT"
+CATALOG_VERSION = 1
+CATALOG_SUFFIX = ".kcat"
+
+_HEADER = struct.Struct("<4sHxxIIQQQQ")
+_LEVEL = struct.Struct("<QIII")
+_RECORD = struct.Struct("<QQQIII")
+_INDEX = struct.Struct("<I")
+
+
+class CatalogError(ValueError):
+    """Raised for a file that is not a readable exercise catalog"""
+
+
+def build_catalog(exercises: Dict, output_path: str) -> int:
+    """Write exercises in the ``{"levels": {...}}`` JSON shape to a catalog
+
+    The file is written next to the target and moved into place, so readers
+    never see a partial catalog. Returns the number of exercises written.
+    """
+    blob = bytearray()
+    strings = {}
+
+    def intern(value: str):
+        data = str(value).encode("utf-8")
+        offset = strings.get(data)
+        if offset is None:
+            offset = strings[data] = len(blob)
+            blob.extend(data)
+        return offset, len(data)
+
+    levels = []
+    records = []
+    index = []
+    for level, level_exercises in exercises.get("levels", {}).items():
+        first = len(records)
+        level_ids = []
+        for exercise in level_exercises:
+            exercise_id = intern(exercise.get("id", ""))
+            records.append((exercise_id, intern(exercise.get("title", "")), intern(exercise.get("text", ""))))
+            level_ids.append(bytes(blob[exercise_id[0]:exercise_id[0] + exercise_id[1]]))
+
+        # Stable sort keeps the first of any duplicate IDs in front
+        order = sorted(range(len(level_ids)), key=level_ids.__getitem__)
+        index.extend(first + i for i in order)
+        levels.append((intern(level), first, len(records) - first))
+
+    level_offset = _HEADER.size
+    record_offset = level_offset + _LEVEL.size * len(levels)
+    index_offset = record_offset + _RECORD.size * len(records)
+    blob_offset = index_offset + _INDEX.size * len(index)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(temp_path, "wb") as f:
+        f.write(_HEADER.pack(CATALOG_MAGIC, CATALOG_VERSION, len(levels), len(records),
+                             level_offset, record_offset, index_offset, blob_offset))
+        for (name_offset, name_len), first, count in levels:
+            f.write(_LEVEL.pack(name_offset, name_len, first, count))
+        for (id_offset, id_len), (title_offset, title_len), (text_offset, text_len) in records:
+            f.write(_RECORD.pack(id_offset, title_offset, text_offset, id_len, title_len, text_len))
+        f.write(struct.pack(f"<{len(index)}I", *index))
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, output_path)
+    return len(records)
+
+
+class _CatalogView:
+    """One open, immutable version of a catalog file"""
+
+    def __init__(self, path: Path):
+        self.stat_key = _stat_key(path)
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, version, level_count, self.record_count, level_offset, self.record_offset,
+             self.index_offset, self.blob_offset) = _HEADER.unpack_from(self.map)
+        except struct.error:
+            raise CatalogError(f"Truncated exercise catalog: {path}")
+        if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+            raise CatalogError(f"Not a version {CATALOG_VERSION} exercise catalog: {path}")
+
+        # The level table is tiny, keep it decoded: name -> (first, count)
+        self.levels = {}
+        for i in range(level_count):
+            name_offset, name_len, first, count = _LEVEL.unpack_from(self.map, level_offset + i * _LEVEL.size)
+            self.levels[self._string(name_offset, name_len)] = (first, count)
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self.blob_offset + offset
+        return self.map[start:start + length].decode("utf-8")
+
+    def _id_bytes(self, record: int) -> bytes:
+        id_offset, _, _, id_len, _, _ = _RECORD.unpack_from(self.map, self.record_offset + record * _RECORD.size)
+        start = self.blob_offset + id_offset
+        return self.map[start:start + id_len]
+
+    def exercise(self, record: int) -> Dict:
+        """Decode one exercise record"""
+        id_offset, title_offset, text_offset, id_len, title_len, text_len = _RECORD.unpack_from(
+            self.map, self.record_offset + record * _RECORD.size)
+        return {
+            "id": self._string(id_offset, id_len),
+            "title": self._string(title_offset, title_len),
+            "text": self._string(text_offset, text_len)
+        }
+
+    def find(self, level: str, exercise_id: str) -> Optional[int]:
+        """Binary search a level's slice of the id index for a record"""
+        if level not in self.levels:
+            return None
+        first, count = self.levels[level]
+        target = exercise_id.encode("utf-8")
+
+        low, high = first, first + count
+        while low < high:
+            middle = (low + high) // 2
+            record = _INDEX.unpack_from(self.map, self.index_offset + middle * _INDEX.size)[0]
+            if self._id_bytes(record) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < first + count:
+            record = _INDEX.unpack_from(self.map, self.index_offset + low * _INDEX.size)[0]
+            if self._id_bytes(record) == target:
+                return record
+        return None
+
+
+def _stat_key(path: Path):
+    """What identifies one version of a file on disk"""
+    stat = path.stat()
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class ExerciseCatalog:
+    """Read-only exercise catalog served from a memory-mapped file
+
+    Exercise text stays on disk and is decoded only when an exercise is
+    requested, so memory use does not grow with the corpus. The file is
+    checked for changes at most every ``check_interval`` seconds; a changed
+    file is mapped afresh and swapped in as a whole, and ``version`` counts
+    the swaps.
+    """
+
+    def __init__(self, path: str, check_interval: float = 2.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.version = 1
+
+        self._view = _CatalogView(self.path)
+        self._checked_at = time.monotonic()
+        self._reload_lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload the catalog if the file changed, returning whether it did"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+
+        with self._reload_lock:
+            self._checked_at = now
+            try:
+                if _stat_key(self.path) == self._view.stat_key:
+                    return False
+                view = _CatalogView(self.path)
+            except (OSError, CatalogError):
+                # Keep serving the version already loaded
+                return False
+
+            # Readers holding the old view finish with it, the map is
+            # released once nothing references it
+            self._view = view
+            self.version += 1
+            return True
+
+    def _current(self) -> _CatalogView:
+        self.refresh()
+        return self._view
+
+    def __len__(self) -> int:
+        return self._current().record_count
+
+    def get_levels(self) -> List[str]:
+        """Level names in catalog order"""
+        return list(self._current().levels)
+
+    def get_exercise(self, level: str, exercise_id: str) -> Optional[Dict]:
+        """Get one exercise, or None when it does not exist"""
+        view = self._current()
+        record = view.find(level, exercise_id)
+        return view.exercise(record) if record is not None else None
+
+    def count_exercises(self, level: str) -> int:
+        """Number of exercises in a level"""
+        return self._current().levels.get(level, (0, 0))[1]
+
+    def get_exercises_by_level(self, level: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Decode the exercises of a level, or only `limit` of them from `offset`"""
+        view = self._current()
+        first, count = view.levels.get(level, (0, 0))
+        start = first + min(offset, count)
+        end = first + count if limit is None else min(first + count, start + limit)
+        return [view.exercise(record) for record in range(start, end)]
+
+    def get_random_exercise(self, level: Optional[str] = None) -> Optional[Dict]:
+        """Get a random exercise, from one level or from any level"""
+        view = self._current()
+        if level is None:
+            first, count = 0, view.record_count
+        else:
+            first, count = view.levels.get(level, (0, 0))
+        if count == 0:
+            return None
+        return view.exercise(first + random.randrange(count))
+
+
+def main(argv=None) -> None:
+    """Build an exercise catalog from a JSON exercises file"""
+    parser = argparse.ArgumentParser(description="Build a KasongoType exercise catalog")
+    parser.add_argument("source", help="exercises JSON file to read")
+    parser.add_argument("target", nargs="?", help=f"catalog to write, defaults to the source with {CATALOG_SUFFIX}")
+    args = parser.parse_args(argv)
+
+    target = args.target or str(Path(args.source).with_suffix(CATALOG_SUFFIX))
+    with open(args.source, "r") as f:
+        exercises = json.load(f)
+    count = build_catalog(exercises, target)
+    print(f"Wrote {count} exercises to {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Leaderboards for KasongoType
+Ranks users by their best verified WPM, globally, per level and per exercise
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Users kept in each board's ranking
+DEFAULT_CAPACITY = 100
+
+# Percentile histogram: 1 WPM buckets, faster scores share the last one
+HISTOGRAM_BUCKETS = 300
+
+GLOBAL_BOARD = "global"
+
+
+def level_board(level: str) -> str:
+    """Name of the board for one level"""
+    return f"level:{level}"
+
+
+def exercise_board(level: str, exercise_id: str) -> str:
+    """Name of the board for one exercise, ids are only unique within a level"""
+    return f"exercise:{level}/{exercise_id}"
+
+
+def leaderboard_path_for(data_path: str) -> Path:
+    """Database file of the shared leaderboards for a profiles file"""
+    return Path(data_path).with_name("leaderboard.db")
+
+
+def _session_boards(session: Dict) -> List[str]:
+    """Boards a recorded session is ranked on, none unless verified"""
+    # Unverified and flagged sessions are never ranked
+    if not session.get("verified"):
+        return []
+
+    boards = [GLOBAL_BOARD]
+    level = session.get("level")
+    if level is not None:
+        boards.append(level_board(level))
+        boards.append(exercise_board(level, session["exercise_id"]))
+    return boards
+
+
+def _bucket_sql(wpm: str) -> str:
+    """SQL for the percentile bucket of a score"""
+    return f"MIN(MAX(CAST({wpm} AS INTEGER), 0), {HISTOGRAM_BUCKETS - 1})"
+
+
+class SQLiteLeaderboard:
+    """Leaderboards in a SQLite database, shared by worker processes
+
+    Each verified session is offered to the global board, and to the board
+    of its level and exercise when those are known. Every user's best on
+    each board is a row, indexed by board and score, so the top K is an
+    index range. Triggers keep a count of users per 1 WPM bucket of each
+    board, so a percentile sums a fixed number of buckets whatever the
+    number of users. A best only ever rises, so offers from any process
+    can land in any order.
+
+    A new database holds nothing until seeded from the stored profiles;
+    after that each recorded session updates it, with no startup cost.
+    """
+
+    SCHEMA = f"""
+        CREATE TABLE IF NOT EXISTS best_scores (
+            board TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            wpm REAL NOT NULL,
+            ts INTEGER NOT NULL,
+            PRIMARY KEY (board, user_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_best_scores_rank ON best_scores (board, wpm DESC, ts, user_id);
+        CREATE TABLE IF NOT EXISTS score_buckets (
+            board TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            users INTEGER NOT NULL,
+            PRIMARY KEY (board, bucket)
+        );
+        CREATE TRIGGER IF NOT EXISTS best_scores_insert AFTER INSERT ON best_scores BEGIN
+            INSERT INTO score_buckets (board, bucket, users) VALUES (NEW.board, {_bucket_sql("NEW.wpm")}, 1)
+                ON CONFLICT (board, bucket) DO UPDATE SET users = users + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS best_scores_update AFTER UPDATE OF wpm ON best_scores BEGIN
+            UPDATE score_buckets SET users = users - 1 WHERE board = OLD.board AND bucket = {_bucket_sql("OLD.wpm")};
+            INSERT INTO score_buckets (board, bucket, users) VALUES (NEW.board, {_bucket_sql("NEW.wpm")}, 1)
+                ON CONFLICT (board, bucket) DO UPDATE SET users = users + 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS best_scores_delete AFTER DELETE ON best_scores BEGIN
+            UPDATE score_buckets SET users = users - 1 WHERE board = OLD.board AND bucket = {_bucket_sql("OLD.wpm")};
+        END;
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    _OFFER = (
+        "INSERT INTO best_scores (board, user_id, wpm, ts) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (board, user_id) DO UPDATE SET wpm = excluded.wpm, ts = excluded.ts "
+        "WHERE excluded.wpm > best_scores.wpm"
+    )
+
+    def __init__(self, db_path: str, capacity: int = DEFAULT_CAPACITY):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity
+        self._local = threading.local()
+
+        self._connection().executescript(self.SCHEMA)
+        self._count_buckets()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection to the database"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in a single write transaction"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _count_buckets(self) -> None:
+        """Fill the bucket counts of a database written before they existed"""
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'buckets'").fetchone() is not None:
+                return
+            conn.execute("DELETE FROM score_buckets")
+            conn.execute(f"INSERT INTO score_buckets (board, bucket, users) "
+                         f"SELECT board, {_bucket_sql('wpm')} AS bucket, COUNT(*) FROM best_scores "
+                         f"GROUP BY board, bucket")
+            conn.execute("INSERT INTO meta (key, value) VALUES ('buckets', '1')")
+
+    @property
+    def seeded(self) -> bool:
+        """Whether the boards were filled from the stored profiles"""
+        return self._connection().execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone() is not None
+
+    def seed(self, profiles: Iterable[Tuple[str, Dict]]) -> None:
+        """Offer every stored session, once when the database is new
+
+        Several processes seeding at once is harmless, offers only keep
+        the best.
+        """
+        # Read everything before taking the write lock, keeping only bests
+        best = {}
+        for user_id, profile in profiles:
+            for session in profile.get("sessions", []):
+                for board in _session_boards(session):
+                    key = (board, user_id)
+                    if key not in best or session["wpm"] > best[key][0]:
+                        best[key] = (session["wpm"], session["ts"])
+
+        with self._transaction() as conn:
+            conn.executemany(self._OFFER, [(board, user_id, wpm, ts) for (board, user_id), (wpm, ts) in best.items()])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seeded', '1')")
+
+    def clear(self) -> None:
+        """Drop every board, so the next start seeds them again"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM best_scores")
+            conn.execute("DELETE FROM score_buckets")
+            conn.execute("DELETE FROM meta WHERE key = 'seeded'")
+
+    def add_session(self, user_id: str, session: Dict) -> None:
+        """Offer a recorded session to the boards it belongs to"""
+        boards = _session_boards(session)
+        if not boards:
+            return
+        with self._transaction() as conn:
+            conn.executemany(self._OFFER, [(board, user_id, session["wpm"], session["ts"]) for board in boards])
+
+    def top(self, board: str = GLOBAL_BOARD, limit: Optional[int] = None) -> List[Dict]:
+        """Best users of a board, fastest first"""
+        limit = self.capacity if limit is None else min(limit, self.capacity)
+        rows = self._connection().execute(
+            "SELECT user_id, wpm, ts FROM best_scores WHERE board = ? ORDER BY wpm DESC, ts, user_id LIMIT ?",
+            (board, limit)
+        )
+        return [
+            {"rank": rank, "user_id": user_id, "wpm": wpm, "ts": ts}
+            for rank, (user_id, wpm, ts) in enumerate(rows, 1)
+        ]
+
+    def percentile(self, user_id: str, board: str = GLOBAL_BOARD) -> Optional[Dict]:
+        """A user's best on a board and the share of users they beat, if ranked
+
+        Percentiles are exact to 1 WPM buckets. The rank is only given
+        within the board's top entries.
+        """
+        conn = self._connection()
+        row = conn.execute("SELECT wpm, ts FROM best_scores WHERE board = ? AND user_id = ?",
+                           (board, user_id)).fetchone()
+        if row is None:
+            return None
+        wpm, ts = row
+
+        bucket = min(max(int(wpm), 0), HISTOGRAM_BUCKETS - 1)
+        below = in_bucket = users = 0
+        for other, count in conn.execute("SELECT bucket, users FROM score_buckets WHERE board = ?", (board,)):
+            users += count
+            if other < bucket:
+                below += count
+            elif other == bucket:
+                in_bucket = count
+        # The rank only looks as far as the top entries
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM best_scores WHERE board = ? AND "
+            "(wpm > ? OR (wpm = ? AND (ts < ? OR (ts = ? AND user_id < ?)))) LIMIT ?)",
+            (board, wpm, wpm, ts, ts, user_id, self.capacity)
+        ).fetchone()[0]
+
+        # Users in the same bucket count as half below, half above
+        percentile = 100 * (below + in_bucket / 2) / users
+        return {
+            "wpm": wpm,
+            "percentile": round(percentile, 1),
+            "rank": ahead + 1 if ahead < self.capacity else None,
+            "users": users
+        }
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,230 @@
+"""
+Bulk re-scoring for KasongoType profiles
+Recomputes session scores and profile aggregates after a formula change
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from common.analytics import ROLLING_WINDOWS, UserProfile, _empty_stats
+from common.leaderboard import SQLiteLeaderboard, leaderboard_path_for
+from common.storage import STORE_BACKENDS, ProfileStore, _write_atomic, create_store
+from common.typing_engine import compute_accuracy, compute_wpm
+
+try:
+    import numpy as np
+except ImportError:
+    # Without NumPy each profile is replayed session by session instead
+    np = None
+
+# Profiles written back per batch, and between checkpoints
+DEFAULT_CHUNK_SIZE = 500
+
+
+def _rescore_sessions(sessions: List[Dict], wpm, accuracy) -> None:
+    """Recompute scores of sessions that kept their raw counts, in place"""
+    has_counts = np.fromiter(("char_count" in s and "total_keystrokes" in s for s in sessions),
+                             dtype=bool, count=len(sessions))
+    if not has_counts.any():
+        return
+
+    indices = np.flatnonzero(has_counts)
+    picked = [sessions[i] for i in indices]
+    char_count = np.fromiter((s["char_count"] for s in picked), dtype=np.float64, count=len(picked))
+    total = np.fromiter((s["total_keystrokes"] for s in picked), dtype=np.float64, count=len(picked))
+    errors = np.fromiter((s.get("errors", 0) for s in picked), dtype=np.float64, count=len(picked))
+    elapsed = np.fromiter((s["time_elapsed"] for s in picked), dtype=np.float64, count=len(picked))
+
+    new_wpm = np.round(compute_wpm(char_count, elapsed), 1)
+    new_accuracy = np.round(compute_accuracy(total, errors), 1)
+    wpm[indices] = new_wpm
+    accuracy[indices] = new_accuracy
+
+    # Only touch the dicts whose score actually moved
+    changed = np.flatnonzero((new_wpm != np.array([s["wpm"] for s in picked]))
+                             | (new_accuracy != np.array([s["accuracy"] for s in picked])))
+    for i in changed:
+        picked[i]["wpm"] = float(new_wpm[i])
+        picked[i]["accuracy"] = float(new_accuracy[i])
+
+
+def rescore_chunk(profiles: List[Dict]) -> None:
+    """Rescore the sessions and rebuild the aggregate stats of many profiles
+
+    Sessions of the whole chunk are laid end to end so every aggregate is
+    one vectorized reduction over all users at once.
+    """
+    if np is None:
+        for profile in profiles:
+            UserProfile._order_sessions(profile)
+            UserProfile.rebuild_stats(profile)
+        return
+
+    for profile in profiles:
+        UserProfile._order_sessions(profile)
+    sessions = [s for profile in profiles for s in profile["sessions"]]
+    counts = np.array([len(profile["sessions"]) for profile in profiles], dtype=np.int64)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+
+    count = len(sessions)
+    wpm = np.fromiter((s["wpm"] for s in sessions), dtype=np.float64, count=count)
+    accuracy = np.fromiter((s["accuracy"] for s in sessions), dtype=np.float64, count=count)
+    elapsed = np.fromiter((s["time_elapsed"] for s in sessions), dtype=np.float64, count=count)
+    flagged = np.fromiter((bool(s.get("flags")) for s in sessions), dtype=bool, count=count)
+    _rescore_sessions(sessions, wpm, accuracy)
+
+    # reduceat needs non-empty segments, profiles without sessions get defaults
+    active = np.flatnonzero(counts > 0)
+    offsets = starts[active]
+    sums = {}
+    if count:
+        sums["wpm"] = np.add.reduceat(wpm, offsets)
+        sums["wpm_sq"] = np.add.reduceat(wpm * wpm, offsets)
+        sums["accuracy"] = np.add.reduceat(accuracy, offsets)
+        sums["accuracy_sq"] = np.add.reduceat(accuracy * accuracy, offsets)
+        sums["time"] = np.add.reduceat(elapsed, offsets)
+        best = np.maximum.reduceat(np.where(flagged, 0.0, wpm), offsets)
+
+        # Trailing window sums as differences of prefix sums
+        wpm_prefix = np.concatenate(([0.0], np.cumsum(wpm)))
+        accuracy_prefix = np.concatenate(([0.0], np.cumsum(accuracy)))
+        rolling = {}
+        for window in ROLLING_WINDOWS:
+            window_starts = np.maximum(starts[active], ends[active] - window)
+            rolling[window] = (
+                wpm_prefix[ends[active]] - wpm_prefix[window_starts],
+                accuracy_prefix[ends[active]] - accuracy_prefix[window_starts],
+                ends[active] - window_starts
+            )
+
+    for profile in profiles:
+        profile["stats"].update(_empty_stats())
+
+    for row, index in enumerate(active):
+        n = int(counts[index])
+        mean_wpm = sums["wpm"][row] / n
+        mean_accuracy = sums["accuracy"][row] / n
+        stats = profiles[index]["stats"]
+        stats.update({
+            "best_wpm": float(max(best[row], 0.0)),
+            "exercises_completed": n,
+            "total_time": float(sums["time"][row]),
+            "session_count": n,
+            "wpm_sum": float(sums["wpm"][row]),
+            "wpm_sq_sum": float(sums["wpm_sq"][row]),
+            "accuracy_sum": float(sums["accuracy"][row]),
+            "accuracy_sq_sum": float(sums["accuracy_sq"][row]),
+            "average_wpm": round(float(mean_wpm), 2),
+            "accuracy": round(float(mean_accuracy), 2),
+            "wpm_stddev": round(float(max(sums["wpm_sq"][row] / n - mean_wpm * mean_wpm, 0.0) ** 0.5), 2),
+            "accuracy_stddev": round(
+                float(max(sums["accuracy_sq"][row] / n - mean_accuracy * mean_accuracy, 0.0) ** 0.5), 2)
+        })
+        for window in ROLLING_WINDOWS:
+            wpm_sum, accuracy_sum, window_count = (values[row] for values in rolling[window])
+            stats["rolling"][str(window)] = {
+                "wpm_sum": float(wpm_sum),
+                "accuracy_sum": float(accuracy_sum),
+                "average_wpm": round(float(wpm_sum / window_count), 2),
+                "accuracy": round(float(accuracy_sum / window_count), 2)
+            }
+
+
+def _read_checkpoint(path: Path) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _resume(profiles: Iterator[Tuple[str, Dict]], checkpoint: Optional[Dict]) -> Iterator[Tuple[str, Dict]]:
+    """Skip the profiles a previous run already wrote back"""
+    done = checkpoint["done"] if checkpoint else 0
+    for position, (user_id, profile) in enumerate(profiles):
+        if position < done:
+            if position == done - 1 and user_id != checkpoint["last_user_id"]:
+                raise RuntimeError("Profiles changed since the checkpoint was written, "
+                                   "rerun with --restart")
+            continue
+        yield user_id, profile
+
+
+def rescore_store(store: ProfileStore, checkpoint_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  restart: bool = False) -> int:
+    """Rescore every profile in a store, returning how many were written
+
+    Profiles are written back with save_many in chunks, and progress is
+    checkpointed after each chunk so an interrupted run picks up where it
+    stopped. Memory holds one chunk at a time when the store streams its
+    profiles, and the store's housekeeping, like the log store's
+    compaction, runs once at the end. Run it while the app is stopped, or
+    live writes may be lost.
+    """
+    checkpoint_path = Path(checkpoint_path)
+    checkpoint = None if restart else _read_checkpoint(checkpoint_path)
+    done = checkpoint["done"] if checkpoint else 0
+
+    written = 0
+    batch = []
+    with store.bulk_write():
+        for user_id, profile in _resume(store.iter_profiles(), checkpoint):
+            batch.append((user_id, profile))
+            if len(batch) >= chunk_size:
+                done, written = _write_chunk(store, batch, checkpoint_path, done, written)
+                batch = []
+        if batch:
+            done, written = _write_chunk(store, batch, checkpoint_path, done, written)
+
+    # A finished run leaves nothing to resume
+    if checkpoint_path.exists():
+        checkpoint_path.unlink()
+    return written
+
+
+def _write_chunk(store: ProfileStore, batch: List[Tuple[str, Dict]], checkpoint_path: Path,
+                 done: int, written: int) -> Tuple[int, int]:
+    rescore_chunk([profile for _, profile in batch])
+    store.save_many(batch)
+    done += len(batch)
+    _write_atomic(checkpoint_path, json.dumps({"done": done, "last_user_id": batch[-1][0]}).encode())
+    return done, written + len(batch)
+
+
+def main(argv=None) -> None:
+    """Rescore all stored profiles with the current formulas"""
+    parser = argparse.ArgumentParser(description="Recompute KasongoType session scores and profile stats")
+    parser.add_argument("--store", choices=STORE_BACKENDS,
+                        default=os.environ.get("KASONGOTYPE_PROFILE_STORE", "log"),
+                        help="profile storage backend")
+    parser.add_argument("data_path", nargs="?",
+                        default=os.path.join(os.environ.get("KASONGOTYPE_DATA_DIR",
+                                                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")),
+                                             "user_profiles.json"),
+                        help="profiles file the store is based on")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="profiles per write")
+    parser.add_argument("--checkpoint", help="progress file, defaults next to the profiles file")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args(argv)
+
+    checkpoint = args.checkpoint or str(Path(args.data_path).with_suffix(".rescore.json"))
+    store = create_store(args.store, args.data_path)
+    try:
+        count = rescore_store(store, checkpoint, args.chunk_size, args.restart)
+    finally:
+        store.close()
+
+    # Bests only ever rise on the boards, so have the app rank the new scores afresh
+    leaderboard_path = leaderboard_path_for(args.data_path)
+    if leaderboard_path.exists():
+        leaderboard = SQLiteLeaderboard(leaderboard_path)
+        leaderboard.clear()
+        leaderboard.close()
+    print(f"Rescored {count} profiles")
+
+
+if __name__ == "__main__":
+    main()
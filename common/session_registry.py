@@ -0,0 +1,461 @@
+"""
+Active session registry for KasongoType
+Keeps in-progress typing sessions bounded in time and memory
+"""
+
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+from common.typing_engine import TypingSession
+
+
+class MemorySessionBackend:
+    """Sessions held as live objects in this process
+
+    Fast, but sessions are lost when the process exits and are invisible to
+    other worker processes.
+    """
+
+    def __init__(self):
+        # session_id -> [session, last access, lock], least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clock(self) -> float:
+        return time.monotonic()
+
+    def put(self, session_id: str, typing_session, now: float) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = [typing_session, now, threading.Lock()]
+
+    def load(self, session_id: str):
+        """Get (session, last access) or None"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return (entry[0], entry[1]) if entry is not None else None
+
+    def last_access(self, session_id: str) -> Optional[float]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return entry[1] if entry is not None else None
+
+    def touch(self, session_id: str, now: float) -> None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry[1] = now
+                self._sessions.move_to_end(session_id)
+
+    def save(self, session_id: str, typing_session) -> None:
+        """Nothing to write back, callers mutate the stored object"""
+
+    @contextmanager
+    def locked(self, session_id: str):
+        """Hold a session exclusively"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None:
+            yield
+            return
+        with entry[2]:
+            yield
+
+    def delete(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        return entry[0] if entry is not None else None
+
+    def expire(self, cutoff: float) -> int:
+        removed = 0
+        with self._lock:
+            # Oldest access first, so stop at the first live session
+            while self._sessions:
+                session_id, entry = next(iter(self._sessions.items()))
+                if entry[1] > cutoff:
+                    break
+                del self._sessions[session_id]
+                removed += 1
+        return removed
+
+    def trim(self, max_sessions: int) -> int:
+        evicted = 0
+        with self._lock:
+            while len(self._sessions) > max_sessions:
+                self._sessions.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def count(self) -> int:
+        return len(self._sessions)
+
+    def approx_bytes(self) -> int:
+        with self._lock:
+            sessions = [entry[0] for entry in self._sessions.values()]
+        return sum(typing_session.approx_size() for typing_session in sessions)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteSessionBackend:
+    """Sessions serialized into a SQLite database shared by worker processes
+
+    Any worker can pick up a session started by another, and sessions survive
+    worker restarts. Access times are wall-clock so every process agrees on
+    expiry. Counters on the registry stay per process.
+
+    A session is held through a lease on its own row, so workers updating
+    different sessions never wait for each other. New keystrokes are
+    appended to the stored session and only every `max_tail` keystrokes is
+    it written whole again.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS active_sessions (
+            session_id TEXT PRIMARY KEY,
+            state BLOB NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_active_sessions_last_access ON active_sessions (last_access);
+        CREATE TABLE IF NOT EXISTS session_keystrokes (
+            session_id TEXT NOT NULL REFERENCES active_sessions (session_id) ON DELETE CASCADE,
+            tail BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_session_keystrokes ON session_keystrokes (session_id);
+    """
+
+    # Columns added since the first version of the table
+    COLUMNS = {
+        "lease": "TEXT",
+        "lease_until": "REAL"
+    }
+
+    # Seconds a lease lasts, so one left by a crashed worker runs out
+    LEASE_SECONDS = 10.0
+
+    # Interval between attempts to take a leased session
+    LEASE_POLL = 0.002
+
+    def __init__(self, db_path: str, max_tail: int = 512):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_tail = max_tail
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(active_sessions)")}
+        for name, definition in self.COLUMNS.items():
+            if name not in existing:
+                try:
+                    conn.execute(f"ALTER TABLE active_sessions ADD COLUMN {name} {definition}")
+                except sqlite3.OperationalError:
+                    # Another worker added it first
+                    pass
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection to the database"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            # session_id -> (keystrokes when loaded, of which in the tail)
+            self._local.loaded = {}
+            # session_id -> lease held by this thread
+            self._local.leases = {}
+        return conn
+
+    def clock(self) -> float:
+        return time.time()
+
+    def put(self, session_id: str, typing_session, now: float) -> None:
+        # Replacing the row drops any appended keystrokes with it
+        self._connection().execute(
+            "INSERT OR REPLACE INTO active_sessions (session_id, state, last_access) VALUES (?, ?, ?)",
+            (session_id, typing_session.to_bytes(), now))
+
+    def _restore(self, session_id: str, state: bytes):
+        """Rebuild a stored session with its appended keystrokes"""
+        conn = self._connection()
+        typing_session = TypingSession.from_bytes(state)
+        stored = typing_session.keystroke_count
+        for (tail,) in conn.execute("SELECT tail FROM session_keystrokes WHERE session_id = ? ORDER BY rowid",
+                                    (session_id,)):
+            typing_session.apply_tail(tail)
+        if session_id in self._local.leases:
+            self._local.loaded[session_id] = (typing_session.keystroke_count,
+                                              typing_session.keystroke_count - stored)
+        return typing_session
+
+    def load(self, session_id: str):
+        row = self._connection().execute(
+            "SELECT state, last_access FROM active_sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return self._restore(session_id, row[0]), row[1]
+        except (ValueError, struct.error):
+            # Written by an incompatible version, treat it as gone
+            self.delete(session_id)
+            return None
+
+    def last_access(self, session_id: str) -> Optional[float]:
+        row = self._connection().execute(
+            "SELECT last_access FROM active_sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def touch(self, session_id: str, now: float) -> None:
+        self._connection().execute(
+            "UPDATE active_sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+
+    def save(self, session_id: str, typing_session) -> None:
+        """Write back a mutated session unless it was removed or taken over meanwhile
+
+        Only keystrokes recorded since it was loaded are written, unless the
+        appended ones grow past max_tail or there are none.
+        """
+        conn = self._connection()
+        lease = self._local.leases.get(session_id)
+        count, tail = self._local.loaded.pop(session_id, (0, None))
+        added = typing_session.keystroke_count - count
+        if tail is not None and 0 < added and tail + added <= self.max_tail:
+            conn.execute(
+                "INSERT INTO session_keystrokes (session_id, tail) SELECT ?, ? "
+                "WHERE EXISTS (SELECT 1 FROM active_sessions WHERE session_id = ? AND lease IS ?)",
+                (session_id, typing_session.tail_bytes(count), session_id, lease))
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute("UPDATE active_sessions SET state = ? WHERE session_id = ? AND lease IS ?",
+                                  (typing_session.to_bytes(), session_id, lease))
+            if cursor.rowcount:
+                conn.execute("DELETE FROM session_keystrokes WHERE session_id = ?", (session_id,))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @contextmanager
+    def locked(self, session_id: str):
+        """Hold a lease on the session, so no other worker updates it
+
+        Waits while another worker holds it, up to the lease's lifetime.
+        """
+        conn = self._connection()
+        if session_id in self._local.leases:
+            yield
+            return
+
+        lease = uuid.uuid4().hex
+        while True:
+            now = time.time()
+            cursor = conn.execute(
+                "UPDATE active_sessions SET lease = ?, lease_until = ? "
+                "WHERE session_id = ? AND (lease IS NULL OR lease_until < ?)",
+                (lease, now + self.LEASE_SECONDS, session_id, now))
+            if cursor.rowcount:
+                break
+            if self.last_access(session_id) is None:
+                # No such session, nothing to hold
+                yield
+                return
+            time.sleep(self.LEASE_POLL)
+
+        self._local.leases[session_id] = lease
+        try:
+            yield
+        finally:
+            del self._local.leases[session_id]
+            conn.execute("UPDATE active_sessions SET lease = NULL WHERE session_id = ? AND lease = ?",
+                         (session_id, lease))
+
+    def delete(self, session_id: str):
+        conn = self._connection()
+        row = conn.execute("SELECT state FROM active_sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        try:
+            typing_session = self._restore(session_id, row[0])
+        except (ValueError, struct.error):
+            typing_session = None
+        conn.execute("DELETE FROM active_sessions WHERE session_id = ?", (session_id,))
+        return typing_session
+
+    def expire(self, cutoff: float) -> int:
+        return self._connection().execute(
+            "DELETE FROM active_sessions WHERE last_access <= ?", (cutoff,)).rowcount
+
+    def trim(self, max_sessions: int) -> int:
+        return self._connection().execute(
+            """DELETE FROM active_sessions WHERE session_id IN (
+                   SELECT session_id FROM active_sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)""",
+            (max_sessions,)).rowcount
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM active_sessions").fetchone()[0]
+
+    def approx_bytes(self) -> int:
+        """Bytes of serialized state held in the database"""
+        conn = self._connection()
+        return (conn.execute("SELECT COALESCE(SUM(LENGTH(state)), 0) FROM active_sessions").fetchone()[0]
+                + conn.execute("SELECT COALESCE(SUM(LENGTH(tail)), 0) FROM session_keystrokes").fetchone()[0])
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+SESSION_BACKENDS = ("memory", "sqlite")
+
+
+def create_session_backend(backend: str, db_path: Optional[str] = None):
+    """Create the named session backend, the SQLite one at ``db_path``"""
+    if backend == "memory":
+        return MemorySessionBackend()
+    if backend == "sqlite":
+        if db_path is None:
+            raise ValueError("The sqlite session backend needs a database path")
+        return SQLiteSessionBackend(db_path)
+    raise ValueError(f"Unknown session backend: {backend}")
+
+
+class SessionRegistry:
+    """Active typing sessions with idle expiry and a hard size cap
+
+    Sessions untouched for `ttl` seconds are dropped, both lazily on access
+    and by a background reaper every `reap_interval` seconds. Once
+    `max_sessions` are live, adding another evicts the least recently used.
+    Supports the dict operations the web app uses on active sessions.
+
+    Sessions live in `backend`, in process memory by default. With a shared
+    backend, changes must go through `checkout` to be written back.
+    """
+
+    def __init__(self, ttl: float = 900, max_sessions: int = 10000, reap_interval: float = 60,
+                 start_reaper: bool = True, backend=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.reap_interval = reap_interval
+        self._backend = backend if backend is not None else MemorySessionBackend()
+        self._lock = threading.Lock()
+
+        # Lifetime counters
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+        self._stop = threading.Event()
+        self._reaper = None
+        if start_reaper:
+            self._reaper = threading.Thread(target=self._reap_loop, name="session-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        """Expire idle sessions until the registry is closed"""
+        while not self._stop.wait(self.reap_interval):
+            self.reap()
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """Drop every session idle for longer than the ttl, returning how many"""
+        if now is None:
+            now = self._backend.clock()
+
+        removed = self._backend.expire(now - self.ttl)
+        with self._lock:
+            self.expired += removed
+        return removed
+
+    def __setitem__(self, session_id: str, typing_session) -> None:
+        self._backend.put(session_id, typing_session, self._backend.clock())
+        evicted = self._backend.trim(self.max_sessions)
+        with self._lock:
+            self.created += 1
+            self.evicted += evicted
+
+    def get(self, session_id: str, default=None):
+        """Get a live session and mark it as recently used"""
+        now = self._backend.clock()
+        entry = self._backend.load(session_id)
+        if entry is None:
+            return default
+
+        typing_session, last_access = entry
+        if now - last_access >= self.ttl:
+            if self._backend.delete(session_id) is not None:
+                with self._lock:
+                    self.expired += 1
+            return default
+
+        self._backend.touch(session_id, now)
+        return typing_session
+
+    @contextmanager
+    def checkout(self, session_id: str):
+        """Hold a live session exclusively while updating it
+
+        Yields the session, or None when there is no live session. On a clean
+        exit the session is written back to the backend, unless it was popped
+        in the meantime.
+        """
+        with self._backend.locked(session_id):
+            typing_session = self.get(session_id)
+            yield typing_session
+            if typing_session is not None:
+                self._backend.save(session_id, typing_session)
+
+    def __getitem__(self, session_id: str):
+        typing_session = self.get(session_id)
+        if typing_session is None:
+            raise KeyError(session_id)
+        return typing_session
+
+    def __contains__(self, session_id: str) -> bool:
+        last_access = self._backend.last_access(session_id)
+        return last_access is not None and self._backend.clock() - last_access < self.ttl
+
+    def pop(self, session_id: str, default=None):
+        """Remove a session and return it"""
+        typing_session = self._backend.delete(session_id)
+        return typing_session if typing_session is not None else default
+
+    def __delitem__(self, session_id: str) -> None:
+        if self._backend.delete(session_id) is None:
+            raise KeyError(session_id)
+
+    def __len__(self) -> int:
+        return self._backend.count()
+
+    def approx_bytes(self) -> int:
+        """Approximate memory held by all live sessions"""
+        return self._backend.approx_bytes()
+
+    def stats(self) -> Dict:
+        """Counters for monitoring"""
+        return {
+            "live_sessions": len(self),
+            "approx_bytes": self.approx_bytes(),
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
+
+    def close(self) -> None:
+        """Stop the background reaper and release the backend"""
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+        self._backend.close()
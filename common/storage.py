@@ -0,0 +1,885 @@
+"""
+Profile storage backends for KasongoType
+Persists user profiles and their typing sessions
+"""
+
+import argparse
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, only threads of one process are serialized there
+    fcntl = None
+
+
+class FileLock:
+    """Lock shared by the threads of this process and by other processes"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def hold(self):
+        """Hold the lock for the duration of a with block"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+
+            with open(self.path, 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _profile_fields(profile: Dict) -> Dict:
+    """Everything in a profile except its session list"""
+    return {key: value for key, value in profile.items() if key != "sessions"}
+
+
+def _file_sig(path: Path) -> Optional[Tuple]:
+    """Identify a file version so replacements are noticed"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _write_atomic(path: Path, data: Union[bytes, Iterable[bytes]]) -> None:
+    """Replace a file in one step so readers never see a partial write
+
+    `data` may also be an iterable of chunks, written as they come.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.writelines((data,) if isinstance(data, bytes) else data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ProfileStore:
+    """Base class for profile storage backends"""
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        """Load a user's profile, or None if the user is unknown"""
+        raise NotImplementedError
+
+    def save(self, user_id: str, profile: Dict) -> None:
+        """Store a user's complete profile"""
+        raise NotImplementedError
+
+    def save_many(self, profiles: Iterable[Tuple[str, Dict]]) -> None:
+        """Store several complete profiles"""
+        for user_id, profile in profiles:
+            self.save(user_id, profile)
+
+    def append_session(self, user_id: str, session: Dict, profile: Dict) -> None:
+        """Store a newly recorded session along with the updated profile"""
+        self.save(user_id, profile)
+
+    def append_sessions(self, batch: List[Tuple[str, List[Dict], Dict]]) -> None:
+        """Store new sessions for several users in one write
+
+        Each entry is (user_id, new sessions, profile fields other than
+        "sessions"), the fields replacing the stored ones.
+        """
+        raise NotImplementedError
+
+    def iter_profiles(self) -> Iterator[Tuple[str, Dict]]:
+        """Iterate over all stored (user_id, profile) pairs"""
+        raise NotImplementedError
+
+    @contextmanager
+    def bulk_write(self):
+        """Hold back housekeeping while a with block rewrites many profiles"""
+        yield
+
+    def version(self, user_id: str) -> Hashable:
+        """A token that changes whenever a user's stored profile may have
+
+        Cheaper than a load, so cached profiles can be revalidated. Stores
+        that cannot tell return the same token every time.
+        """
+        return None
+
+    def close(self) -> None:
+        """Release any resources held by the store"""
+
+
+class JsonFileStore(ProfileStore):
+    """All profiles in a single JSON file, rewritten on every save"""
+
+    def __init__(self, data_path: str):
+        self.data_path = Path(data_path)
+
+    def _read_all(self) -> Dict:
+        """Read every profile from the file"""
+        if not self.data_path.exists():
+            # Create directory if it doesn't exist
+            self.data_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Create empty profiles file
+            with open(self.data_path, 'w') as f:
+                json.dump({}, f)
+            return {}
+
+        try:
+            with open(self.data_path, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            # Treat a corrupted or unreadable file as empty
+            return {}
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        return self._read_all().get(user_id)
+
+    def save(self, user_id: str, profile: Dict) -> None:
+        self.save_many([(user_id, profile)])
+
+    def save_many(self, profiles: Iterable[Tuple[str, Dict]]) -> None:
+        all_profiles = self._read_all()
+        all_profiles.update(profiles)
+
+        with open(self.data_path, 'w') as f:
+            json.dump(all_profiles, f, indent=2)
+
+    def append_sessions(self, batch: List[Tuple[str, List[Dict], Dict]]) -> None:
+        all_profiles = self._read_all()
+        for user_id, sessions, fields in batch:
+            profile = all_profiles.setdefault(user_id, {"sessions": []})
+            profile.setdefault("sessions", []).extend(sessions)
+            profile.update(fields)
+
+        with open(self.data_path, 'w') as f:
+            json.dump(all_profiles, f, indent=2)
+
+    def iter_profiles(self) -> Iterator[Tuple[str, Dict]]:
+        return iter(self._read_all().items())
+
+    def version(self, user_id: str) -> Hashable:
+        # Any save rewrites the whole file
+        return _file_sig(self.data_path)
+
+
+def _apply_record(profile: Optional[Dict], record: Dict) -> Optional[Dict]:
+    """Apply one log record to a user's profile, returning the result"""
+    if record.get("op") == "profile":
+        return record["profile"]
+    if record.get("op") == "session":
+        if profile is None:
+            profile = {"sessions": []}
+        profile.setdefault("sessions", []).append(record["session"])
+        profile.update(record.get("updates", {}))
+    return profile
+
+
+class SessionLogStore(ProfileStore):
+    """Append-only session log with periodic snapshots
+
+    Each recorded session appends one JSON line to ``<name>.log``, so the cost
+    of a write does not depend on how many users or sessions exist. Profiles
+    are read from ``<name>.snapshot.json`` plus the log. Once the log holds
+    ``compact_every`` records and has grown to ``compact_ratio`` times the
+    size of the snapshot, it is folded into a new snapshot, so compaction
+    costs a bounded amount per byte written however many users there are.
+
+    The snapshot holds one user per line. Only the offset of each user's
+    line and of their log records since are kept in memory, and a profile
+    is parsed when it is loaded.
+
+    Snapshot and log carry a generation number in their first line. A log
+    whose header does not match the snapshot generation was already folded
+    in by a compaction that was interrupted, and is ignored. Writers from
+    several processes are serialized with a lock file; on platforms without
+    ``fcntl`` only threads of a single process are.
+
+    An existing JSON profiles file at ``data_path``, or a snapshot written
+    as a single JSON object by an earlier version, is converted into the
+    first snapshot.
+    """
+
+    def __init__(self, data_path: str, compact_every: Optional[int] = 1000, compact_ratio: float = 1.0):
+        self.data_path = Path(data_path)
+        self.snapshot_path = self.data_path.with_name(self.data_path.stem + ".snapshot.json")
+        self.log_path = self.data_path.with_name(self.data_path.stem + ".log")
+        self.compact_every = compact_every
+        self.compact_ratio = compact_ratio
+
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = FileLock(self.data_path.with_name(self.data_path.stem + ".lock"))
+
+        # Index of snapshot + log, caught up on each access
+        self._generation = 0
+        self._loaded = False
+        self._snapshot_sig = None
+        # user_id -> offset of the user's snapshot line
+        self._snapshot_index = {}
+        self._log_sig = None
+        self._log_offset = 0
+        self._log_records = 0
+        self._log_stale = False
+        # user_id -> (whether the first is a full profile, (offset, length) of
+        # each log record since the user's last full profile)
+        self._log_index = {}
+        # user_id -> log records read since the snapshot was
+        self._versions = {}
+
+    @staticmethod
+    def _encode_line(user_id: str, profile: Dict) -> bytes:
+        # JSON never holds a raw tab, so it splits the user id from the profile
+        return json.dumps(user_id).encode() + b"\t" + json.dumps(profile).encode() + b"\n"
+
+    @staticmethod
+    def _decode_line(line: bytes) -> Dict:
+        return json.loads(line[line.index(b"\t") + 1:])
+
+    @staticmethod
+    def _read_lines(snapshot_file) -> Iterator[Tuple[str, bytes]]:
+        """(user_id, line) of each user in an open snapshot, past its header"""
+        with snapshot_file:
+            for line in snapshot_file:
+                yield json.loads(line[:line.index(b"\t")]), line
+
+    def _read_snapshot(self) -> Optional[Dict]:
+        """Index the snapshot, returning profiles still to be converted into one"""
+        self._generation = 0
+        self._snapshot_index = {}
+        self._log_sig = None
+        self._log_offset = 0
+        self._log_records = 0
+        self._log_index = {}
+        self._versions = {}
+
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, 'rb') as f:
+                header = json.loads(f.readline())
+                self._generation = header.get("generation", 0)
+                if "profiles" in header:
+                    return header["profiles"]
+                offset = f.tell()
+                for line in f:
+                    self._snapshot_index[json.loads(line[:line.index(b"\t")])] = offset
+                    offset += len(line)
+        elif self.data_path.exists():
+            try:
+                with open(self.data_path, 'r') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, IOError):
+                pass
+        return None
+
+    def _refresh(self) -> None:
+        """Catch up with writes made by other processes (lock must be held)"""
+        snapshot_sig = _file_sig(self.snapshot_path)
+        if self._loaded and snapshot_sig == self._snapshot_sig:
+            self._read_log()
+            return
+
+        legacy = self._read_snapshot()
+        self._snapshot_sig = snapshot_sig
+        self._loaded = True
+        self._read_log()
+        if legacy:
+            self._compact(self._encode_line(user_id, profile) for user_id, profile in legacy.items())
+
+    def _read_log(self) -> None:
+        """Index log records written since the last read (lock must be held)"""
+        log_sig = _file_sig(self.log_path)
+        if log_sig is None:
+            self._log_stale = True
+            return
+
+        # A replaced log has to be read again from the start
+        if self._log_sig is None or log_sig[0] != self._log_sig[0]:
+            self._log_offset = 0
+            self._log_records = 0
+            self._log_index = {}
+        self._log_sig = log_sig
+
+        with open(self.log_path, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read()
+
+        # Only complete lines are consumed
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].split(b"\n")[:-1]
+        offset = self._log_offset
+
+        if self._log_offset == 0:
+            if not lines:
+                self._log_stale = True
+                return
+
+            try:
+                header = json.loads(lines[0])
+            except ValueError:
+                header = {}
+
+            self._log_stale = header.get("generation") != self._generation
+            if self._log_stale:
+                return
+            offset += len(lines[0]) + 1
+            lines = lines[1:]
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Skip a line torn by a crash mid-write
+                record = None
+            if record is not None:
+                self._index_record(record, offset, len(line))
+                self._log_records += 1
+            offset += len(line) + 1
+
+        self._log_offset += end
+
+    def _index_record(self, record: Dict, offset: int, length: int) -> None:
+        user_id = record.get("user_id")
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        if record.get("op") == "profile":
+            # A full profile makes everything logged for the user before it moot
+            self._log_index[user_id] = (True, ((offset, length),))
+        else:
+            replaced, positions = self._log_index.get(user_id, (False, ()))
+            self._log_index[user_id] = (replaced, positions + ((offset, length),))
+
+    def _merge(self, log_file, line: Optional[bytes], entry: Tuple) -> Optional[Dict]:
+        """A user's profile from their snapshot line and log index entry"""
+        replaced, positions = entry
+        profile = self._decode_line(line) if line is not None and not replaced else None
+        for offset, length in positions:
+            log_file.seek(offset)
+            profile = _apply_record(profile, json.loads(log_file.read(length)))
+        return profile
+
+    def _open_files(self) -> Tuple:
+        """Open snapshot and log as indexed, for reading after the lock is released (lock must be held)"""
+        snapshot_file = open(self.snapshot_path, 'rb') if self._snapshot_index else None
+        if snapshot_file is not None:
+            snapshot_file.readline()
+        log_file = open(self.log_path, 'rb') if self._log_index else None
+        return snapshot_file, log_file
+
+    def _stream(self, snapshot_file, log_file, log_index: Dict) -> Iterator[Tuple[str, Dict]]:
+        """Yield each stored profile, parsing one at a time"""
+        try:
+            lines = self._read_lines(snapshot_file) if snapshot_file is not None else ()
+            for user_id, line in lines:
+                yield user_id, self._merge(log_file, line, log_index.pop(user_id, (False, ())))
+            # Users created since the snapshot
+            for user_id, entry in log_index.items():
+                profile = self._merge(log_file, None, entry)
+                if profile is not None:
+                    yield user_id, profile
+        finally:
+            if log_file is not None:
+                log_file.close()
+
+    def _start_log(self) -> None:
+        """Begin a fresh log for the current generation (lock must be held)"""
+        header = json.dumps({"generation": self._generation}).encode() + b"\n"
+        _write_atomic(self.log_path, header)
+        self._log_sig = _file_sig(self.log_path)
+        self._log_offset = len(header)
+        self._log_records = 0
+        self._log_index = {}
+        self._versions = {}
+        self._log_stale = False
+
+    def _append(self, records: List[Dict]) -> None:
+        """Durably append records to the log in a single write"""
+        lines = [json.dumps(record).encode() + b"\n" for record in records]
+        data = b"".join(lines)
+
+        with self._lock.hold():
+            self._refresh()
+            if self._log_stale:
+                self._start_log()
+
+            with open(self.log_path, 'ab') as f:
+                offset = f.tell()
+                # Keep a torn trailing line from swallowing these records
+                if offset != self._log_offset:
+                    data = b"\n" + data
+                    offset += 1
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                self._log_offset = f.tell()
+            self._log_sig = _file_sig(self.log_path)
+
+            for record, line in zip(records, lines):
+                self._index_record(record, offset, len(line) - 1)
+                offset += len(line)
+            self._log_records += len(records)
+
+            snapshot_size = self._snapshot_sig[2] if self._snapshot_sig else 0
+            if (self.compact_every and self._log_records >= self.compact_every
+                    and self._log_offset >= self.compact_ratio * snapshot_size):
+                self._compact()
+
+    def _compact(self, lines: Optional[Iterable[bytes]] = None) -> None:
+        """Fold the log into a new snapshot (lock must be held)
+
+        Streams the current snapshot, or the given snapshot lines, through
+        to the new one, parsing only users with log records.
+        """
+        snapshot_file, log_file = self._open_files()
+        if lines is None:
+            lines = (line for _, line in self._read_lines(snapshot_file)) if snapshot_file is not None else ()
+        log_index = dict(self._log_index)
+        index = {}
+        header = json.dumps({"generation": self._generation + 1}).encode() + b"\n"
+
+        def write():
+            offset = len(header)
+            yield header
+            for line in lines:
+                user_id = json.loads(line[:line.index(b"\t")])
+                entry = log_index.pop(user_id, None)
+                if entry is not None:
+                    line = self._encode_line(user_id, self._merge(log_file, line, entry))
+                index[user_id] = offset
+                offset += len(line)
+                yield line
+            # Users created since the snapshot
+            for user_id, entry in log_index.items():
+                profile = self._merge(log_file, None, entry)
+                if profile is not None:
+                    line = self._encode_line(user_id, profile)
+                    index[user_id] = offset
+                    offset += len(line)
+                    yield line
+
+        try:
+            _write_atomic(self.snapshot_path, write())
+        finally:
+            if snapshot_file is not None:
+                snapshot_file.close()
+            if log_file is not None:
+                log_file.close()
+
+        self._generation += 1
+        self._snapshot_sig = _file_sig(self.snapshot_path)
+        self._snapshot_index = index
+        self._start_log()
+
+    def compact(self) -> None:
+        """Fold the current log into a new snapshot"""
+        with self._lock.hold():
+            self._refresh()
+            self._compact()
+
+    @contextmanager
+    def bulk_write(self):
+        # Compacting once at the end beats folding in a log that grows with
+        # every profile rewritten
+        compact_every = self.compact_every
+        self.compact_every = None
+        try:
+            yield
+        finally:
+            self.compact_every = compact_every
+        self.compact()
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        with self._lock.hold():
+            self._refresh()
+            offset = self._snapshot_index.get(user_id)
+            entry = self._log_index.get(user_id, (False, ()))
+            line = None
+            if offset is not None and not entry[0]:
+                with open(self.snapshot_path, 'rb') as f:
+                    f.seek(offset)
+                    line = f.readline()
+            if not entry[1]:
+                return self._decode_line(line) if line is not None else None
+            with open(self.log_path, 'rb') as f:
+                return self._merge(f, line, entry)
+
+    def save(self, user_id: str, profile: Dict) -> None:
+        self.save_many([(user_id, profile)])
+
+    def save_many(self, profiles: Iterable[Tuple[str, Dict]]) -> None:
+        self._append([{"op": "profile", "user_id": user_id, "profile": profile} for user_id, profile in profiles])
+
+    def append_session(self, user_id: str, session: Dict, profile: Dict) -> None:
+        # Everything but the session list is small, so ship it with the record
+        self.append_sessions([(user_id, [session], _profile_fields(profile))])
+
+    def append_sessions(self, batch: List[Tuple[str, List[Dict], Dict]]) -> None:
+        self._append([
+            {"op": "session", "user_id": user_id, "session": session, "updates": fields}
+            for user_id, sessions, fields in batch
+            for session in sessions
+        ])
+
+    def iter_profiles(self) -> Iterator[Tuple[str, Dict]]:
+        """Stream the profiles as of the call, parsed one at a time"""
+        with self._lock.hold():
+            self._refresh()
+            snapshot_file, log_file = self._open_files()
+            log_index = dict(self._log_index)
+        return self._stream(snapshot_file, log_file, log_index)
+
+    def version(self, user_id: str) -> Hashable:
+        with self._lock.hold():
+            self._refresh()
+            return self._generation, self._versions.get(user_id, 0)
+
+
+class SQLiteProfileStore(ProfileStore):
+    """Profiles in a SQLite database, one row per session
+
+    Sessions are indexed on ``(user_id, timestamp)`` so loading a profile only
+    reads that user's rows. The database runs in WAL mode, which lets several
+    worker processes read while one of them writes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            user_id TEXT PRIMARY KEY,
+            created_at TEXT,
+            last_active TEXT,
+            data TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE TABLE IF NOT EXISTS stats (
+            user_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            exercise_id TEXT,
+            wpm REAL,
+            accuracy REAL,
+            time_elapsed REAL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_user_timestamp ON sessions (user_id, timestamp);
+    """
+
+    # Profile fields kept in their own columns or tables
+    _COLUMNS = ("created_at", "last_active", "stats", "sessions")
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection to the database"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in a single write transaction"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT created_at, last_active, data FROM profiles WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        profile = json.loads(row[2])
+        profile["created_at"] = row[0]
+        profile["last_active"] = row[1]
+
+        stats_row = conn.execute("SELECT data FROM stats WHERE user_id = ?", (user_id,)).fetchone()
+        profile["stats"] = json.loads(stats_row[0]) if stats_row else {}
+
+        profile["sessions"] = [
+            json.loads(data) for (data,) in conn.execute(
+                "SELECT data FROM sessions WHERE user_id = ? ORDER BY timestamp, id", (user_id,)
+            )
+        ]
+        return profile
+
+    def _write_profile(self, conn: sqlite3.Connection, user_id: str, profile: Dict) -> None:
+        """Write everything except the sessions of a profile"""
+        extra = {key: value for key, value in profile.items() if key not in self._COLUMNS}
+        conn.execute(
+            "INSERT OR REPLACE INTO profiles (user_id, created_at, last_active, data) VALUES (?, ?, ?, ?)",
+            (user_id, profile.get("created_at"), profile.get("last_active"), json.dumps(extra))
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO stats (user_id, data) VALUES (?, ?)",
+            (user_id, json.dumps(profile.get("stats", {})))
+        )
+
+    @staticmethod
+    def _insert_session(conn: sqlite3.Connection, user_id: str, session: Dict) -> None:
+        """Insert one session row"""
+        conn.execute(
+            "INSERT INTO sessions (user_id, timestamp, exercise_id, wpm, accuracy, time_elapsed, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, session.get("timestamp", ""), session.get("exercise_id"), session.get("wpm"),
+             session.get("accuracy"), session.get("time_elapsed"), json.dumps(session))
+        )
+
+    def save(self, user_id: str, profile: Dict) -> None:
+        self.save_many([(user_id, profile)])
+
+    def save_many(self, profiles: Iterable[Tuple[str, Dict]]) -> None:
+        with self._transaction() as conn:
+            for user_id, profile in profiles:
+                self._write_profile(conn, user_id, profile)
+                conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+                for session in profile.get("sessions", []):
+                    self._insert_session(conn, user_id, session)
+
+    def append_session(self, user_id: str, session: Dict, profile: Dict) -> None:
+        self.append_sessions([(user_id, [session], _profile_fields(profile))])
+
+    def append_sessions(self, batch: List[Tuple[str, List[Dict], Dict]]) -> None:
+        with self._transaction() as conn:
+            for user_id, sessions, fields in batch:
+                self._write_profile(conn, user_id, fields)
+                for session in sessions:
+                    self._insert_session(conn, user_id, session)
+
+    def iter_profiles(self) -> Iterator[Tuple[str, Dict]]:
+        user_ids = [row[0] for row in self._connection().execute("SELECT user_id FROM profiles ORDER BY user_id")]
+        for user_id in user_ids:
+            profile = self.load(user_id)
+            if profile is not None:
+                yield user_id, profile
+
+    def version(self, user_id: str) -> Hashable:
+        # Sessions are only ever inserted, and a full save inserts them anew
+        return self._connection().execute(
+            "SELECT MAX(id) FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class WriteBehindStore(ProfileStore):
+    """Buffer recorded sessions in memory and flush them to another store in batches
+
+    A background thread flushes every ``flush_interval`` seconds, or sooner
+    once ``max_pending`` sessions are waiting, so a burst of completions
+    becomes one durable write. Loads see buffered sessions immediately.
+    Sessions still buffered when the process dies without ``close()`` are
+    lost, so call it (or ``flush()``) on shutdown.
+    """
+
+    def __init__(self, store: ProfileStore, flush_interval: float = 1.0, max_pending: int = 1000):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        # user_id -> [new sessions, latest profile fields]
+        self._pending = {}
+        self._pending_count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="profile-write-behind", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """Flush pending sessions until the store is closed"""
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Sessions stay queued and are retried on the next flush
+                logger.exception("Failed to flush buffered profile writes")
+
+    def flush(self) -> None:
+        """Write all buffered sessions to the underlying store"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                inflight = self._pending
+                self._pending = {}
+                self._pending_count = 0
+
+            try:
+                self.store.append_sessions([
+                    (user_id, sessions, fields) for user_id, (sessions, fields) in inflight.items()
+                ])
+            except Exception:
+                with self._lock:
+                    # Put the batch back in front of anything queued meanwhile
+                    for user_id, (sessions, fields) in self._pending.items():
+                        entry = inflight.setdefault(user_id, [[], fields])
+                        entry[0].extend(sessions)
+                        entry[1] = fields
+                    self._pending = inflight
+                    self._pending_count = sum(len(sessions) for sessions, _ in inflight.values())
+                raise
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        # Keep a flush from landing between the read and the merge below
+        with self._flush_lock:
+            profile = self.store.load(user_id)
+
+            with self._lock:
+                entry = self._pending.get(user_id)
+                if entry is not None:
+                    if profile is None:
+                        profile = {"sessions": []}
+                    profile["sessions"].extend(copy.deepcopy(entry[0]))
+                    profile.update(copy.deepcopy(entry[1]))
+        return profile
+
+    def save(self, user_id: str, profile: Dict) -> None:
+        self.save_many([(user_id, profile)])
+
+    def save_many(self, profiles: Iterable[Tuple[str, Dict]]) -> None:
+        profiles = list(profiles)
+
+        # A full save supersedes anything buffered for the same users
+        with self._flush_lock:
+            with self._lock:
+                for user_id, _ in profiles:
+                    entry = self._pending.pop(user_id, None)
+                    if entry is not None:
+                        self._pending_count -= len(entry[0])
+            self.store.save_many(profiles)
+
+    def append_session(self, user_id: str, session: Dict, profile: Dict) -> None:
+        self.append_sessions([(user_id, [session], _profile_fields(profile))])
+
+    def append_sessions(self, batch: List[Tuple[str, List[Dict], Dict]]) -> None:
+        with self._lock:
+            for user_id, sessions, fields in batch:
+                entry = self._pending.setdefault(user_id, [[], None])
+                entry[0].extend(copy.deepcopy(sessions))
+                entry[1] = copy.deepcopy(fields)
+                self._pending_count += len(sessions)
+            full = self._pending_count >= self.max_pending
+
+        if full:
+            self._wake.set()
+
+    def iter_profiles(self) -> Iterator[Tuple[str, Dict]]:
+        self.flush()
+        return self.store.iter_profiles()
+
+    def version(self, user_id: str) -> Hashable:
+        return self.store.version(user_id)
+
+    def close(self) -> None:
+        """Stop the flusher, write everything still buffered and close the store"""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self.store.close()
+
+
+# Storage backends selectable by name
+STORE_BACKENDS = ("json", "log", "sqlite")
+
+
+def sqlite_path_for(data_path: str) -> Path:
+    """Database file used by the SQLite backend for a profiles file"""
+    return Path(data_path).with_suffix(".db")
+
+
+def migrate_profiles(source: ProfileStore, target: ProfileStore, batch_size: int = 500) -> int:
+    """Copy every profile from one store into another, returning the count"""
+    count = 0
+    batch = []
+    for user_id, profile in source.iter_profiles():
+        batch.append((user_id, profile))
+        if len(batch) >= batch_size:
+            target.save_many(batch)
+            count += len(batch)
+            batch = []
+
+    if batch:
+        target.save_many(batch)
+        count += len(batch)
+    return count
+
+
+def create_store(backend: str, data_path: str) -> ProfileStore:
+    """Create the named storage backend for a profiles file
+
+    The SQLite database lives next to ``data_path``. When it is first
+    created, existing profiles from the JSON file and session log are
+    migrated into it once.
+    """
+    if backend == "json":
+        return JsonFileStore(data_path)
+    if backend == "log":
+        return SessionLogStore(data_path)
+    if backend == "sqlite":
+        db_path = sqlite_path_for(data_path)
+        is_new = not db_path.exists()
+        store = SQLiteProfileStore(db_path)
+        if is_new and Path(data_path).exists():
+            migrate_profiles(SessionLogStore(data_path), store)
+        return store
+    raise ValueError(f"Unknown profile store: {backend}")
+
+
+def main(argv=None) -> None:
+    """Command line entry point for migrating profiles between backends"""
+    parser = argparse.ArgumentParser(description="Migrate KasongoType profiles between storage backends")
+    parser.add_argument("source", choices=STORE_BACKENDS, help="backend to read profiles from")
+    parser.add_argument("target", choices=STORE_BACKENDS, help="backend to write profiles to")
+    parser.add_argument("data_path", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/user_profiles.json"),
+                        help="profiles file the backends are based on")
+    args = parser.parse_args(argv)
+
+    if args.source == args.target:
+        parser.error("source and target backends must differ")
+
+    count = migrate_profiles(create_store(args.source, args.data_path),
+                             create_store(args.target, args.data_path))
+    print(f"Migrated {count} profiles from {args.source} to {args.target}")
+
+
+if __name__ == "__main__":
+    main()
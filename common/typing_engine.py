@@ -3,30 +3,228 @@ Core typing engine for KasongoType
 Handles typing sessions, statistics, and exercise management
 """
 
+import sys
 import json
 import time
 import random
+import struct
+import threading
+from array import array
+from bisect import bisect_left
 from pathlib import Path
-from dataclasses import dataclass
 from typing import List, Dict, Optional, Tuple
 
-@dataclass
-class TypingMetrics:
-    wpm: float = 0.0
-    accuracy: float = 0.0
-    errors: int = 0
-    time_elapsed: float = 0.0
-    time_remaining: float = 0.0
-    characters_typed: int = 0
+from common.catalog import CATALOG_SUFFIX, ExerciseCatalog
+
+def _at_least(value, floor):
+    """max(value, floor) for numbers, elementwise for NumPy arrays"""
+    if isinstance(value, (int, float)):
+        return max(value, floor)
+    return value.clip(min=floor)
+
+def compute_wpm(char_count, time_elapsed):
+    """Words per minute: (characters typed / 5) / minutes elapsed
+    
+    Elapsed time has a floor of 0.01 minutes to prevent division by zero.
+    Accepts numbers or NumPy arrays, for bulk rescoring.
+    """
+    minutes = _at_least(time_elapsed / 60, 0.01)
+    return (char_count / 5) / minutes
+
+def compute_accuracy(total_keystrokes, errors):
+    """Share of keystrokes that were correct, in percent, 100 before any
+    
+    Accepts numbers or NumPy arrays, for bulk rescoring.
+    """
+    return (1 - errors / _at_least(total_keystrokes, 1)) * 100
+
+class MetricsSnapshot:
+    """Metrics of a typing session as of its latest keystroke
+    
+    Built at most once per keystroke and shared by everything that reads
+    the session's metrics until the next one arrives.
+    """
+    
+    __slots__ = ('wpm', 'accuracy', 'errors', 'time_elapsed', 'time_remaining',
+                 'characters_typed', 'total_keystrokes', '_dict')
+    
+    def __init__(self, wpm=0.0, accuracy=100.0, errors=0, time_elapsed=0.0, time_remaining=0.0,
+                 characters_typed=0, total_keystrokes=0):
+        self.wpm = wpm
+        self.accuracy = accuracy
+        self.errors = errors
+        self.time_elapsed = time_elapsed
+        self.time_remaining = time_remaining
+        self.characters_typed = characters_typed
+        self.total_keystrokes = total_keystrokes
+        self._dict = None
+    
+    def to_dict(self) -> Dict:
+        """JSON-ready metrics, built once per snapshot"""
+        if self._dict is None:
+            self._dict = {
+                'wpm': self.wpm,
+                'accuracy': self.accuracy,
+                'time_elapsed': self.time_elapsed,
+                'time_remaining': self.time_remaining,
+                'errors': self.errors,
+                'char_count': self.characters_typed,
+                'total_keystrokes': self.total_keystrokes
+            }
+        return self._dict
+
+# Earlier name of the metrics object
+TypingMetrics = MetricsSnapshot
+    
+# Code point stored for keys that are not a single character
+_OTHER_KEY = 0xFFFFFFFF
+
+# Serialized session: version, start time, estimated duration, client
+# clock offset (NaN until known), position, errors, then byte lengths of
+# text and user id, the keystroke count and the byte length of the
+# interval stats
+_STATE_HEADER = struct.Struct('<BdddIIIIII')
+_STATE_VERSION = 3
+
+# Keystrokes appended to a serialized session: client clock offset (NaN
+# until known) and keystroke count, then key codes, timestamps and any
+# multi-character keys by position in the tail
+_TAIL_HEADER = struct.Struct('<dI')
+
+# Upper edges of the inter-key interval histogram buckets, in ms
+INTERVAL_EDGES_MS = (50, 75, 100, 125, 150, 175, 200, 250, 300, 400, 500, 750, 1000, 1500, 2000)
+
+# Gaps longer than this are pauses: they stay out of the rhythm stats, the
+# verifier's steadiness check and per-key latencies
+PAUSE_MS = INTERVAL_EDGES_MS[-1]
+
+# Correct keystrokes in the sliding window that measures burst speed
+BURST_WINDOW = 10
+
+
+class IntervalStats:
+    """Streaming inter-key interval analytics for one session
     
+    Memory stays constant whatever the text length: a fixed histogram,
+    running sums, one latency sum per distinct character and a ring of the
+    last BURST_WINDOW correct keystroke times.
+    """
+    
+    __slots__ = ('count', 'interval_sum', 'interval_sq_sum', 'histogram', 'pauses', 'active_time',
+                 'correct', 'best_burst_wpm', 'char_latency', '_last_time', '_ring', '_ring_pos')
+    
+    def __init__(self):
+        self.count = 0
+        self.interval_sum = 0.0
+        self.interval_sq_sum = 0.0
+        self.histogram = [0] * len(INTERVAL_EDGES_MS)
+        self.pauses = 0
+        # Seconds spent typing, pauses excluded
+        self.active_time = 0.0
+        self.correct = 0
+        self.best_burst_wpm = 0.0
+        # Expected character -> [count, summed latency in ms]
+        self.char_latency = {}
+        self._last_time = None
+        self._ring = []
+        self._ring_pos = 0
+    
+    def add(self, expected, correct, timestamp) -> None:
+        """Account for one character keystroke"""
+        if self._last_time is not None:
+            interval_ms = max(timestamp - self._last_time, 0.0) * 1000
+            if interval_ms > PAUSE_MS:
+                self.pauses += 1
+            else:
+                self.count += 1
+                self.interval_sum += interval_ms
+                self.interval_sq_sum += interval_ms * interval_ms
+                self.histogram[bisect_left(INTERVAL_EDGES_MS, interval_ms)] += 1
+                self.active_time += interval_ms / 1000
+                if correct:
+                    latency = self.char_latency.get(expected)
+                    if latency is None:
+                        latency = self.char_latency[expected] = [0, 0.0]
+                    latency[0] += 1
+                    latency[1] += interval_ms
+        self._last_time = timestamp
+        
+        if correct:
+            self.correct += 1
+            if len(self._ring) < BURST_WINDOW:
+                self._ring.append(timestamp)
+                return
+            
+            # The oldest of the window is overwritten by the newest keystroke
+            span = timestamp - self._ring[self._ring_pos]
+            if span > 0:
+                self.best_burst_wpm = max(self.best_burst_wpm, (BURST_WINDOW / 5) / (span / 60))
+            self._ring[self._ring_pos] = timestamp
+            self._ring_pos = (self._ring_pos + 1) % BURST_WINDOW
+    
+    def summary(self) -> Dict:
+        """Rhythm of the session, with the sums needed to merge it into totals"""
+        mean = self.interval_sum / self.count if self.count else 0.0
+        stddev = max(self.interval_sq_sum / self.count - mean * mean, 0.0) ** 0.5 if self.count else 0.0
+        return {
+            "interval_count": self.count,
+            "interval_sum_ms": self.interval_sum,
+            "interval_sq_sum_ms": self.interval_sq_sum,
+            "mean_interval_ms": round(mean, 1),
+            "stddev_interval_ms": round(stddev, 1),
+            # Coefficient of variation, lower is steadier
+            "consistency": round(stddev / mean, 3) if mean else 0.0,
+            "histogram": list(self.histogram),
+            "histogram_edges_ms": list(INTERVAL_EDGES_MS),
+            "pauses": self.pauses,
+            "active_time": self.active_time,
+            "correct_keystrokes": self.correct,
+            "burst_wpm": round(self.best_burst_wpm, 1),
+            "sustained_wpm": round((self.correct / 5) / (self.active_time / 60), 1) if self.active_time else 0.0,
+            "char_latency_ms": {char: round(total / count, 1) for char, (count, total) in self.char_latency.items()}
+        }
+    
+    def to_state(self) -> List:
+        """JSON-ready state, restored by from_state"""
+        ring = self._ring[self._ring_pos:] + self._ring[:self._ring_pos]
+        return [self.count, self.interval_sum, self.interval_sq_sum, self.histogram, self.pauses,
+                self.active_time, self.correct, self.best_burst_wpm, self.char_latency, self._last_time, ring]
+    
+    @classmethod
+    def from_state(cls, state: List) -> 'IntervalStats':
+        stats = cls()
+        (stats.count, stats.interval_sum, stats.interval_sq_sum, stats.histogram, stats.pauses,
+         stats.active_time, stats.correct, stats.best_burst_wpm, stats.char_latency,
+         stats._last_time, stats._ring) = state
+        return stats
+
 class TypingSession:
+    # Sessions are held in bulk by the web app, so keep instances compact
+    __slots__ = ('text', 'user_id', 'start_time', 'current_position', 'errors',
+                 'estimated_duration', 'intervals', '_key_codes', '_timestamps', '_other_keys',
+                 '_clock_offset', '_metrics')
+    
     def __init__(self, text, user_id):
         self.text = text
         self.user_id = user_id
+        # Creation time until the first keystroke moves it
         self.start_time = time.time()
         self.current_position = 0
         self.errors = 0
-        self.keystrokes = []
+        
+        # Keystroke log as parallel arrays: code points and timestamps,
+        # about 12 bytes per keystroke instead of a dict each
+        self._key_codes = array('I')
+        self._timestamps = array('d')
+        # Rare multi-character keys, by keystroke index
+        self._other_keys = None
+        # Seconds from the client's keystroke clock to server time
+        self._clock_offset = None
+        
+        # Rhythm analytics, updated as keystrokes arrive
+        self.intervals = IntervalStats()
+        # Cached metrics, dropped whenever a keystroke is applied
+        self._metrics = None
         
         # Calculate estimated completion time based on text length
         # Average typing speed is ~40 WPM = ~200 CPM
@@ -36,23 +234,163 @@ class TypingSession:
         # Minimum 20 seconds, maximum 5 minutes
         self.estimated_duration = max(20, min(300, word_count * 1.5))
     
-    def process_keystroke(self, keystroke):
+    def process_keystroke(self, keystroke, timestamp=None):
         # Record the keystroke
+        if timestamp is None:
+            timestamp = time.time()
+        correct = self._apply_keystroke(keystroke, timestamp)
+        return self._build_result(correct, timestamp)
+    
+    def process_keystrokes(self, batch):
+        """Process an ordered batch of keystrokes and return one aggregated result
+        
+        Each entry is a dict with a single-character 'key' and an optional
+        client 'timestamp' in milliseconds. The whole batch is validated before
+        any of it is applied, so a malformed batch leaves the session untouched.
+        """
+        keys, timestamps = self._validate_batch(batch)
+        
+        processed = 0
+        batch_errors = 0
+        correct = None
         timestamp = time.time()
-        self.keystrokes.append({
-            'key': keystroke,
-            'timestamp': timestamp
-        })
+        
+        for key, timestamp in zip(keys, timestamps):
+            correct = self._apply_keystroke(key, timestamp)
+            processed += 1
+            if not correct:
+                batch_errors += 1
+            
+            # Anything typed after the exercise finished is ignored
+            if self._is_complete(timestamp):
+                break
+        
+        result = self._build_result(correct, timestamp)
+        result["processed"] = processed
+        result["ignored"] = len(keys) - processed
+        result["batch_errors"] = batch_errors
+        return result
+    
+    def _validate_batch(self, batch) -> Tuple[List[str], List[float]]:
+        """Validate a keystroke batch and map client timestamps onto server time"""
+        if not isinstance(batch, list):
+            raise ValueError("Keystrokes must be a list")
+        
+        keys = []
+        client_times = []
+        previous = None
+        for entry in batch:
+            if not isinstance(entry, dict):
+                raise ValueError("Each keystroke must be an object")
+            
+            key = entry.get('key')
+            if not isinstance(key, str) or len(key) != 1:
+                raise ValueError("Each keystroke must be a single character")
+            
+            client_time = entry.get('timestamp')
+            if client_time is not None:
+                if isinstance(client_time, bool) or not isinstance(client_time, (int, float)):
+                    raise ValueError("Keystroke timestamps must be numbers")
+                if previous is not None and client_time < previous:
+                    raise ValueError("Keystroke timestamps must be in order")
+                previous = client_time
+            
+            keys.append(key)
+            client_times.append(client_time)
+        
+        # Map the client clock onto server time with one offset for the whole
+        # session, so the client's spacing between keys is kept. A late batch
+        # shows the offset is smaller than its arrival time suggests, so only
+        # a batch that would otherwise land after its arrival lowers it. The
+        # batch moves as a whole, and never before earlier input
+        now = time.time()
+        floor = self._last_timestamp()
+        offset = 0.0
+        if previous is not None:
+            first = next(client_time for client_time in client_times if client_time is not None)
+            offset = now - previous / 1000
+            if self._clock_offset is not None:
+                offset = min(offset, self._clock_offset)
+            offset = max(offset, floor - first / 1000)
+            self._clock_offset = offset
+        timestamps = []
+        for client_time in client_times:
+            timestamp = now if client_time is None else client_time / 1000 + offset
+            floor = max(floor, timestamp)
+            timestamps.append(floor)
+        
+        return keys, timestamps
+    
+    @property
+    def keystrokes(self) -> List[Dict]:
+        """Recorded keystrokes as {'key', 'timestamp'} dicts"""
+        return list(self.iter_keystrokes())
+    
+    def keystroke_arrays(self) -> Tuple[array, array]:
+        """The raw key code and timestamp arrays, for bulk analysis
+        
+        Multi-character keys appear as a code point no text contains. The
+        arrays are the session's own, callers must not modify them.
+        """
+        return self._key_codes, self._timestamps
+    
+    @property
+    def keystroke_count(self) -> int:
+        """Number of recorded keystrokes"""
+        return len(self._timestamps)
+    
+    def iter_keystrokes(self):
+        """Yield recorded keystrokes as {'key', 'timestamp'} dicts"""
+        for index, (code, timestamp) in enumerate(zip(self._key_codes, self._timestamps)):
+            if code == _OTHER_KEY:
+                key = self._other_keys[index]
+            else:
+                key = chr(code)
+            yield {'key': key, 'timestamp': timestamp}
+    
+    def _last_timestamp(self) -> float:
+        """Timestamp of the latest recorded keystroke, or the session start"""
+        if self._timestamps:
+            return self._timestamps[-1]
+        return self.start_time
+    
+    def _apply_keystroke(self, keystroke, timestamp) -> bool:
+        """Record a keystroke and advance the position if it was correct"""
+        # The clock starts at the first keystroke, not while the text is read
+        if not self._timestamps:
+            self.start_time = timestamp
+        
+        if len(keystroke) == 1:
+            self._key_codes.append(ord(keystroke))
+        else:
+            if self._other_keys is None:
+                self._other_keys = {}
+            self._other_keys[len(self._key_codes)] = keystroke
+            self._key_codes.append(_OTHER_KEY)
+        self._timestamps.append(timestamp)
+        self._metrics = None
         
         # Check if correct
         expected = self.text[self.current_position] if self.current_position < len(self.text) else None
         correct = expected == keystroke
         
+        if len(keystroke) == 1 and expected is not None:
+            self.intervals.add(expected, correct, timestamp)
+        
         if correct:
             self.current_position += 1
         else:
             self.errors += 1
         
+        return correct
+    
+    def _is_complete(self, timestamp) -> bool:
+        """Check if the exercise is complete by text or time"""
+        time_elapsed = timestamp - self.start_time
+        return self.current_position >= len(self.text) or time_elapsed >= self.estimated_duration
+    
+    def _build_result(self, correct, timestamp) -> Dict:
+        """Build the keystroke result payload at the given time"""
         # Calculate time values
         time_elapsed = timestamp - self.start_time
         
@@ -75,39 +413,211 @@ class TypingSession:
             "text_completed": text_completed
         }
     
-    def get_metrics(self):
-        # Calculate time elapsed
-        time_elapsed = time.time() - self.start_time
+    def to_bytes(self) -> bytes:
+        """Serialize the session compactly, keystroke arrays included"""
+        text = self.text.encode('utf-8')
+        user_id = self.user_id.encode('utf-8')
+        key_codes = self._key_codes
+        timestamps = self._timestamps
+        if sys.byteorder != 'little':
+            key_codes = array('I', key_codes)
+            key_codes.byteswap()
+            timestamps = array('d', timestamps)
+            timestamps.byteswap()
         
-        # Calculate WPM: (characters / 5) / (minutes)
-        char_count = self.current_position
-        minutes = max(time_elapsed / 60, 0.01)  # Prevent division by zero, minimum 0.01 minutes
+        intervals = json.dumps(self.intervals.to_state()).encode('utf-8')
+        parts = [
+            _STATE_HEADER.pack(_STATE_VERSION, self.start_time, self.estimated_duration,
+                               float('nan') if self._clock_offset is None else self._clock_offset,
+                               self.current_position, self.errors, len(text), len(user_id),
+                               len(self._timestamps), len(intervals)),
+            text,
+            user_id,
+            key_codes.tobytes(),
+            timestamps.tobytes(),
+            intervals
+        ]
+        if self._other_keys:
+            parts.append(json.dumps(self._other_keys).encode('utf-8'))
+        return b''.join(parts)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TypingSession':
+        """Restore a session serialized with to_bytes"""
+        if len(data) < _STATE_HEADER.size or data[0] != _STATE_VERSION:
+            raise ValueError("Unsupported session state")
+        (_, start_time, estimated_duration, clock_offset, position, errors,
+         text_len, user_len, count, intervals_len) = _STATE_HEADER.unpack_from(data)
         
-        # Standard formula: (characters typed / 5) / minutes elapsed
-        wpm = (char_count / 5) / minutes
+        offset = _STATE_HEADER.size
+        text = data[offset:offset + text_len].decode('utf-8')
+        offset += text_len
+        user_id = data[offset:offset + user_len].decode('utf-8')
+        offset += user_len
         
-        # Calculate accuracy - account for zero division
-        total_keystrokes = len(self.keystrokes)
-        if total_keystrokes > 0:
-            accuracy = ((total_keystrokes - self.errors) / total_keystrokes) * 100
-        else:
-            accuracy = 100.0
+        session = cls(text, user_id)
+        session.start_time = start_time
+        session.estimated_duration = estimated_duration
+        session._clock_offset = None if clock_offset != clock_offset else clock_offset
+        session.current_position = position
+        session.errors = errors
         
-        return {
-            'wpm': round(wpm, 1),
-            'accuracy': round(accuracy, 1),
-            'time_elapsed': time_elapsed,
-            'errors': self.errors,
-            'char_count': char_count,
-            'total_keystrokes': total_keystrokes
-        }
+        session._key_codes.frombytes(data[offset:offset + 4 * count])
+        offset += 4 * count
+        session._timestamps.frombytes(data[offset:offset + 8 * count])
+        offset += 8 * count
+        if sys.byteorder != 'little':
+            session._key_codes.byteswap()
+            session._timestamps.byteswap()
+        
+        session.intervals = IntervalStats.from_state(json.loads(data[offset:offset + intervals_len].decode('utf-8')))
+        offset += intervals_len
+        
+        if offset < len(data):
+            session._other_keys = {int(i): key for i, key in json.loads(data[offset:].decode('utf-8')).items()}
+        return session
+    
+    def tail_bytes(self, start: int) -> bytes:
+        """Serialize the keystrokes recorded from index `start` on, for apply_tail
+        
+        Lets a stored session grow by its new keystrokes instead of being
+        written whole.
+        """
+        key_codes = self._key_codes[start:]
+        timestamps = self._timestamps[start:]
+        if sys.byteorder != 'little':
+            key_codes.byteswap()
+            timestamps.byteswap()
+        
+        parts = [
+            _TAIL_HEADER.pack(float('nan') if self._clock_offset is None else self._clock_offset, len(timestamps)),
+            key_codes.tobytes(),
+            timestamps.tobytes()
+        ]
+        if self._other_keys:
+            other_keys = {index - start: key for index, key in self._other_keys.items() if index >= start}
+            if other_keys:
+                parts.append(json.dumps(other_keys).encode('utf-8'))
+        return b''.join(parts)
+    
+    def apply_tail(self, data: bytes) -> None:
+        """Replay keystrokes serialized with tail_bytes"""
+        clock_offset, count = _TAIL_HEADER.unpack_from(data)
+        offset = _TAIL_HEADER.size
+        key_codes = array('I', data[offset:offset + 4 * count])
+        offset += 4 * count
+        timestamps = array('d', data[offset:offset + 8 * count])
+        offset += 8 * count
+        if sys.byteorder != 'little':
+            key_codes.byteswap()
+            timestamps.byteswap()
+        other_keys = json.loads(data[offset:].decode('utf-8')) if offset < len(data) else {}
+        
+        for index, (code, timestamp) in enumerate(zip(key_codes, timestamps)):
+            key = other_keys[str(index)] if code == _OTHER_KEY else chr(code)
+            self._apply_keystroke(key, timestamp)
+        if clock_offset == clock_offset:
+            self._clock_offset = clock_offset
+    
+    def approx_size(self) -> int:
+        """Approximate bytes held by this session, for memory accounting"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.text)
+        size += sys.getsizeof(self._key_codes) + sys.getsizeof(self._timestamps)
+        size += sys.getsizeof(self.intervals) + sys.getsizeof(self.intervals.char_latency)
+        if self._other_keys:
+            size += sys.getsizeof(self._other_keys) + sum(sys.getsizeof(k) for k in self._other_keys.values())
+        return size
+    
+    def get_metrics(self) -> MetricsSnapshot:
+        """Get metrics as of the latest keystroke
+        
+        The snapshot is cached until the next keystroke, so polling or
+        pushing metrics repeatedly costs nothing extra.
+        """
+        if self._metrics is not None:
+            return self._metrics
+        
+        # Time up to the latest keystroke, so idle polling does not move it
+        time_elapsed = self._last_timestamp() - self.start_time
+        
+        char_count = self.current_position
+        total_keystrokes = self.keystroke_count
+        
+        self._metrics = MetricsSnapshot(
+            wpm=round(compute_wpm(char_count, time_elapsed), 1),
+            accuracy=round(compute_accuracy(total_keystrokes, self.errors), 1),
+            errors=self.errors,
+            time_elapsed=time_elapsed,
+            time_remaining=max(0, self.estimated_duration - time_elapsed),
+            characters_typed=char_count,
+            total_keystrokes=total_keystrokes
+        )
+        return self._metrics
 
 
 
 class ExerciseManager:
-    def __init__(self, data_path: str = "../common/data/exercises.json"):
+    """Exercises from a JSON file, or from a memory-mapped catalog
+    
+    A data path ending in .kcat is served from an ExerciseCatalog, and then
+    the `exercises` dict is not loaded. Either source is checked for changes
+    at most every `check_interval` seconds and reloaded in place; `version`
+    increases with every reload.
+    """
+    
+    def __init__(self, data_path: str = "../common/data/exercises.json", check_interval: float = 2.0):
         self.data_path = Path(data_path)
-        self.exercises = self._load_exercises()
+        self.check_interval = check_interval
+        self.catalog = None
+        self.exercises = None
+        self._version = 1
+        self._reload_lock = threading.Lock()
+        
+        if self.data_path.suffix == CATALOG_SUFFIX:
+            self.catalog = ExerciseCatalog(self.data_path, check_interval)
+        else:
+            self.exercises = self._load_exercises()
+            self._index = self._build_index(self.exercises)
+        self._stat_key = self._file_stat_key()
+        self._checked_at = time.monotonic()
+    
+    @property
+    def version(self) -> int:
+        """Counter that changes whenever the exercises are reloaded"""
+        self._refresh()
+        if self.catalog is not None:
+            return self.catalog.version
+        return self._version
+    
+    def _file_stat_key(self):
+        """What identifies the current version of the exercises file"""
+        try:
+            stat = self.data_path.stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+    
+    def _refresh(self) -> None:
+        """Reload a changed JSON exercises file, swapping in a new index"""
+        if self.catalog is not None:
+            self.catalog.refresh()
+            return
+        
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        
+        with self._reload_lock:
+            self._checked_at = now
+            stat_key = self._file_stat_key()
+            if stat_key is None or stat_key == self._stat_key:
+                return
+            
+            exercises = self._load_exercises()
+            self._index = self._build_index(exercises)
+            self.exercises = exercises
+            self._stat_key = stat_key
+            self._version += 1
         
     def _load_exercises(self) -> Dict:
         """Load exercises from JSON file"""
@@ -149,24 +659,70 @@ class ExerciseManager:
             # Return empty structure if file is corrupted or unreadable
             return {"levels": {}}
     
+    @staticmethod
+    def _build_index(exercises: Dict) -> Tuple[Dict, List[Dict], Dict]:
+        """Index exercises for constant time lookup and random selection
+        
+        Returns the (level, id) lookup, all exercises flattened and the
+        exercises of each level, swapped in together on reload.
+        """
+        # (level, id) -> exercise, the first one wins on duplicate IDs
+        by_key = {}
+        all_exercises = []
+        by_level = {}
+        
+        for level, level_exercises in exercises.get("levels", {}).items():
+            level_exercises = list(level_exercises)
+            by_level[level] = level_exercises
+            all_exercises.extend(level_exercises)
+            for exercise in level_exercises:
+                by_key.setdefault((level, exercise.get("id")), exercise)
+        return by_key, all_exercises, by_level
+    
+    def get_levels(self) -> List[str]:
+        """Get the names of all levels"""
+        self._refresh()
+        if self.catalog is not None:
+            return self.catalog.get_levels()
+        return list(self._index[2])
+    
     def get_exercise(self, level: str, exercise_id: str) -> Dict:
         """Get a specific exercise by level and ID"""
-        if level in self.exercises["levels"]:
-            for exercise in self.exercises["levels"][level]:
-                if exercise["id"] == exercise_id:
-                    return exercise
+        self._refresh()
+        if self.catalog is not None:
+            exercise = self.catalog.get_exercise(level, exercise_id)
+        else:
+            exercise = self._index[0].get((level, exercise_id))
+        if exercise is not None:
+            return exercise
         return {"id": "not_found", "title": "Exercise Not Found", "text": ""}
     
-    def get_exercises_by_level(self, level: str) -> List[Dict]:
-        """Get all exercises for a specific level"""
-        return self.exercises["levels"].get(level, [])
+    def get_exercises_by_level(self, level: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Get all exercises for a specific level, or a page of `limit` from `offset`"""
+        self._refresh()
+        if self.catalog is not None:
+            return self.catalog.get_exercises_by_level(level, offset, limit)
+        exercises = self._index[2].get(level, [])
+        if offset or limit is not None:
+            return exercises[offset:None if limit is None else offset + limit]
+        return exercises
     
-    def get_random_exercise(self) -> Dict:
-        """Get a random exercise from any level"""
-        all_exercises = []
-        for level in self.exercises["levels"].values():
-            all_exercises.extend(level)
-            
-        if all_exercises:
-            return random.choice(all_exercises)
+    def count_exercises(self, level: str) -> int:
+        """Number of exercises in a level"""
+        self._refresh()
+        if self.catalog is not None:
+            return self.catalog.count_exercises(level)
+        return len(self._index[2].get(level, []))
+    
+    def get_random_exercise(self, level: Optional[str] = None) -> Dict:
+        """Get a random exercise, from one level or from any level"""
+        self._refresh()
+        if self.catalog is not None:
+            exercise = self.catalog.get_random_exercise(level)
+        else:
+            _, all_exercises, by_level = self._index
+            exercises = all_exercises if level is None else by_level.get(level, [])
+            exercise = exercises[random.randrange(len(exercises))] if exercises else None
+        if exercise is not None:
+            return exercise
         return {"id": "empty", "title": "No Exercises Available", "text": ""}
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Session verification for KasongoType
+Replays recorded keystrokes on the server to score and vet completed sessions
+"""
+
+import logging
+import threading
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from common.typing_engine import PAUSE_MS, compute_accuracy, compute_wpm
+
+try:
+    import numpy as np
+except ImportError:
+    # Verification falls back to a plain Python replay
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Intervals faster than this are not typed by hand
+MIN_HUMAN_INTERVAL_MS = 8
+
+# Impossible intervals tolerated before a session is flagged: the larger of
+# a count and a share of all intervals, to forgive key rollover
+MAX_FAST_INTERVALS = 3
+MAX_FAST_INTERVAL_SHARE = 0.05
+
+# Faster than any recorded human sustains
+MAX_HUMAN_WPM = 250
+
+# Interval coefficient of variation below this is machine-steady, judged
+# only over enough intervals to be meaningful
+MIN_INTERVAL_VARIATION = 0.05
+MIN_VARIATION_SAMPLES = 50
+
+# Replay compares keystrokes against the text in windows that double while
+# they match, from the first size up to the last
+MIN_REPLAY_WINDOW = 16
+MAX_REPLAY_WINDOW = 4096
+
+
+def _replay_python(text: str, key_codes: Sequence[int]) -> Tuple[int, int]:
+    position = 0
+    errors = 0
+    length = len(text)
+    for code in key_codes:
+        if position < length and code == ord(text[position]):
+            position += 1
+        else:
+            errors += 1
+    return position, errors
+
+
+def _replay_numpy(text: str, key_codes: Sequence[int]) -> Tuple[int, int]:
+    expected = np.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+    keys = np.frombuffer(key_codes, dtype=np.uint32) if isinstance(key_codes, array) \
+        else np.asarray(key_codes, dtype=np.uint32)
+
+    count = len(keys)
+    length = len(expected)
+    index = position = errors = 0
+    window = MIN_REPLAY_WINDOW
+    while index < count:
+        if position >= length:
+            # Everything typed past the end of the text is an error
+            errors += count - index
+            break
+
+        size = min(window, count - index, length - position)
+        mismatches = np.flatnonzero(keys[index:index + size] != expected[position:position + size])
+        if mismatches.size == 0:
+            index += size
+            position += size
+            window = min(window * 2, MAX_REPLAY_WINDOW)
+        else:
+            # Keys before the first mismatch were correct, it was an error
+            # and the same character is expected again after it
+            first = int(mismatches[0])
+            index += first + 1
+            position += first
+            errors += 1
+            window = MIN_REPLAY_WINDOW
+    return position, errors
+
+
+def replay_keystrokes(text: str, key_codes: Sequence[int]) -> Tuple[int, int]:
+    """Replay key codes against a text, returning (position, errors)
+
+    Follows TypingSession: a correct key advances the position, anything
+    else counts as an error and leaves it in place.
+    """
+    if np is not None:
+        return _replay_numpy(text, key_codes)
+    return _replay_python(text, key_codes)
+
+
+def _interval_stats(timestamps: Sequence[float]) -> Tuple[int, int, float]:
+    """Count intervals, impossibly fast ones and the variation of typing ones"""
+    if len(timestamps) < 2:
+        return 0, 0, 0.0
+
+    if np is not None:
+        stamps = np.frombuffer(timestamps, dtype=np.float64) if isinstance(timestamps, array) \
+            else np.asarray(timestamps, dtype=np.float64)
+        intervals = np.diff(stamps) * 1000
+        fast = int(np.count_nonzero(intervals < MIN_HUMAN_INTERVAL_MS))
+        typing = intervals[intervals <= PAUSE_MS]
+        mean = float(typing.mean()) if typing.size else 0.0
+        variation = float(typing.std()) / mean if mean else 0.0
+        return len(intervals), fast, variation
+
+    intervals = [(later - earlier) * 1000 for earlier, later in zip(timestamps, timestamps[1:])]
+    fast = sum(1 for interval in intervals if interval < MIN_HUMAN_INTERVAL_MS)
+    typing = [interval for interval in intervals if interval <= PAUSE_MS]
+    if not typing:
+        return len(intervals), fast, 0.0
+    mean = sum(typing) / len(typing)
+    variance = sum((interval - mean) ** 2 for interval in typing) / len(typing)
+    return len(intervals), fast, (variance ** 0.5) / mean if mean else 0.0
+
+
+def verify_keystrokes(text: str, start_time: float, key_codes: Sequence[int], timestamps: Sequence[float]) -> Dict:
+    """Score a session from its keystrokes and flag anything implausible
+
+    Metrics use the same formulas as TypingSession.get_metrics, timed from
+    the session's start_time. Client-reported metrics are not consulted.
+    """
+    position, errors = replay_keystrokes(text, key_codes)
+    total = len(key_codes)
+    time_elapsed = (timestamps[-1] if total else start_time) - start_time
+    wpm = round(compute_wpm(position, time_elapsed), 1)
+    accuracy = round(compute_accuracy(total, errors), 1)
+
+    flags = []
+    if total == 0:
+        flags.append("no_keystrokes")
+    if wpm > MAX_HUMAN_WPM:
+        flags.append("wpm_too_high")
+
+    interval_count, fast, variation = _interval_stats(timestamps)
+    if fast > max(MAX_FAST_INTERVALS, MAX_FAST_INTERVAL_SHARE * interval_count):
+        flags.append("impossible_intervals")
+    if interval_count >= MIN_VARIATION_SAMPLES and variation < MIN_INTERVAL_VARIATION:
+        flags.append("too_regular")
+
+    return {
+        "wpm": wpm,
+        "accuracy": accuracy,
+        "time_elapsed": time_elapsed,
+        "errors": errors,
+        "char_count": position,
+        "total_keystrokes": total,
+        "fast_intervals": fast,
+        "interval_variation": round(variation, 3),
+        "flags": flags,
+        "verified": not flags
+    }
+
+
+class SessionVerifier:
+    """Worker pool that verifies completed sessions off the request thread
+
+    A submitted session must no longer change. The verification result is
+    passed to `on_verified` in the worker, which is where it gets recorded.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session-verify")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _run(self, typing_session, on_verified: Optional[Callable[[Dict], None]]) -> Dict:
+        key_codes, timestamps = typing_session.keystroke_arrays()
+        result = verify_keystrokes(typing_session.text, typing_session.start_time, key_codes, timestamps)
+        if on_verified is not None:
+            on_verified(result)
+        return result
+
+    def submit(self, typing_session, on_verified: Optional[Callable[[Dict], None]] = None) -> Future:
+        """Queue a finished session for verification"""
+        future = self._executor.submit(self._run, typing_session, on_verified)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Session verification failed", exc_info=future.exception())
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait for every queued verification to finish"""
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        """Finish queued verifications and stop the workers"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,61 @@
+/**
+ * Desktop fetch shim
+ * Sends the page's same-origin requests to the app over the QWebChannel
+ * bridge instead of the network. Runs before the page's own scripts.
+ */
+(function () {
+    const nativeFetch = window.fetch.bind(window);
+
+    // Replies arrive asynchronously, matched to requests by id. The page
+    // prefix keeps a reply meant for a page navigated away from out
+    const pagePrefix = Date.now().toString(36) + Math.random().toString(36).slice(2);
+    const pending = new Map();
+    let nextId = 0;
+
+    const bridgeReady = new Promise(resolve => {
+        new QWebChannel(qt.webChannelTransport, channel => {
+            const api = channel.objects.api;
+            api.replied.connect((id, reply) => {
+                const deliver = pending.get(id);
+                if (deliver) {
+                    pending.delete(id);
+                    deliver(reply);
+                }
+            });
+            resolve(api);
+        });
+    });
+
+    // Keystroke batches already reach the app in-process, so the page
+    // skips the session stream
+    window.WebSocket = undefined;
+
+    /**
+     * Rebuild a fetch Response from the bridge's JSON reply
+     */
+    function toResponse(reply) {
+        const data = JSON.parse(reply);
+        // Statuses like 204 and 304 must not carry a body
+        const body = data.body === '' ? null : data.body;
+        return new Response(body, { status: data.status, headers: data.headers });
+    }
+
+    window.fetch = function (input, init) {
+        const request = new Request(input, init);
+        const url = new URL(request.url);
+        if (url.protocol !== window.location.protocol || url.host !== window.location.host) {
+            return nativeFetch(input, init);
+        }
+
+        const headers = {};
+        request.headers.forEach((value, name) => {
+            headers[name] = value;
+        });
+
+        return Promise.all([bridgeReady, request.text()]).then(([api, body]) => new Promise(resolve => {
+            const id = `${pagePrefix}:${nextId++}`;
+            pending.set(id, reply => resolve(toResponse(reply)));
+            api.request(id, request.method, url.pathname + url.search, JSON.stringify(headers), body);
+        }));
+    };
+})();
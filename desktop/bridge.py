@@ -0,0 +1,236 @@
+"""
+In-process transport for the KasongoType desktop app
+Serves the web app to the web view without a socket or an HTTP server
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QBuffer, QFile, QIODevice, QObject, QUrl, pyqtSignal, pyqtSlot
+from PyQt5.QtWebChannel import QWebChannel
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestJob, QWebEngineUrlScheme, QWebEngineUrlSchemeHandler
+from PyQt5.QtWebEngineWidgets import QWebEngineScript
+
+SCHEME = b"kasongo"
+BASE_URL = "kasongo://app"
+
+# Page-side half of the bridge, loaded after qwebchannel.js
+BRIDGE_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bridge.js")
+
+# Response headers that only describe the HTTP transfer
+HOP_HEADERS = {"content-length", "set-cookie", "transfer-encoding", "connection"}
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessClient:
+    """Calls a WSGI app directly, keeping its cookies between calls
+
+    The app sees ordinary requests, so every route, the session cookie and
+    error handling behave exactly as over HTTP. The async variants run on
+    one worker thread, keeping the GUI thread free and requests in the
+    order the page sent them.
+    """
+
+    def __init__(self, app):
+        from werkzeug.test import Client
+        self._client = Client(app)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kasongotype-request")
+
+    def request(self, method, path, headers=None, body=None):
+        """Run one request, returning (status, headers, body bytes)"""
+        with self._lock:
+            response = self._client.open(path, method=method, headers=headers or {}, data=body)
+            try:
+                return response.status_code, list(response.headers.items()), response.get_data()
+            finally:
+                response.close()
+
+    def request_json(self, method, path, headers_json="{}", body=""):
+        """Run a request described by the page's fetch shim and encode the reply"""
+        headers = json.loads(headers_json) if headers_json else {}
+        return self._encode(self.request(method, path, headers, body.encode("utf-8") if body else None))
+
+    @staticmethod
+    def _encode(result):
+        status, response_headers, data = result
+        return json.dumps({
+            "status": status,
+            "headers": [[name, value] for name, value in response_headers if name.lower() not in HOP_HEADERS],
+            "body": data.decode("utf-8", errors="replace")
+        })
+
+    def _run(self, callback, request, *args):
+        try:
+            result = request(*args)
+        except Exception:
+            # Answer anyway, so the page is never left waiting
+            logger.exception("In-process request failed")
+            result = (500, [], b"")
+        callback(result)
+
+    def request_async(self, callback, method, path, headers=None, body=None):
+        """Queue a request, passing (status, headers, body bytes) to callback on the worker thread"""
+        self._executor.submit(self._run, callback, self.request, method, path, headers, body)
+
+    def request_json_async(self, callback, method, path, headers_json="{}", body=""):
+        """Queue a fetch shim request, passing the encoded reply to callback on the worker thread"""
+        self.request_async(lambda result: callback(self._encode(result)), method, path,
+                           json.loads(headers_json) if headers_json else {}, body.encode("utf-8") if body else None)
+
+    def close(self):
+        """Finish queued requests and stop the worker thread"""
+        self._executor.shutdown(wait=True)
+
+
+class InProcessServer(threading.Thread):
+    """Loads the web app on a daemon thread and serves it in-process
+
+    A drop-in for WebServer: `ready`, `error`, `url` and `ready_at` mean
+    the same, but pages load from the kasongo:// scheme and API calls go
+    through a QWebChannel bridge, so no port is bound.
+    """
+
+    def __init__(self, load_app):
+        super().__init__(name="kasongotype-app", daemon=True)
+        self._load_app = load_app
+        self.client = None
+        self.url = None
+        self.error = None
+        self.ready = threading.Event()
+        self.ready_at = None
+        self._installed = []
+
+    def run(self):
+        try:
+            self.client = InProcessClient(self._load_app())
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            return
+
+        self.url = BASE_URL
+        self.ready_at = time.perf_counter()
+        self.ready.set()
+
+    def install(self, web_view):
+        """Serve the scheme and expose the bridge to a web view's pages"""
+        page = web_view.page()
+        handler = SchemeHandler(self, page)
+        page.profile().installUrlSchemeHandler(SCHEME, handler)
+
+        bridge = ApiBridge(self, page)
+        channel = QWebChannel(page)
+        channel.registerObject("api", bridge)
+        page.setWebChannel(channel)
+        page.scripts().insert(bridge_script())
+
+        # Qt does not own these through Python, keep them alive with the view
+        self._installed.extend((handler, bridge, channel))
+
+    def shutdown(self):
+        """Nothing listens, only wait for a load and requests still in progress"""
+        if self.is_alive():
+            self.join(timeout=5)
+        if self.client is not None:
+            self.client.close()
+
+
+def register_scheme():
+    """Register the kasongo:// scheme, before the QApplication is created"""
+    scheme = QWebEngineUrlScheme(SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme.setFlags(QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+def bridge_script():
+    """qwebchannel.js and the fetch shim, run in each page before its own scripts"""
+    channel_file = QFile(":/qtwebchannel/qwebchannel.js")
+    channel_file.open(QIODevice.ReadOnly)
+    source = bytes(channel_file.readAll()).decode("utf-8")
+    channel_file.close()
+    with open(BRIDGE_SCRIPT_PATH, "r", encoding="utf-8") as f:
+        source += "\n" + f.read()
+
+    script = QWebEngineScript()
+    script.setName("kasongotype-bridge")
+    script.setSourceCode(source)
+    script.setInjectionPoint(QWebEngineScript.DocumentCreation)
+    script.setWorldId(QWebEngineScript.MainWorld)
+    script.setRunsOnSubFrames(False)
+    return script
+
+
+class SchemeHandler(QWebEngineUrlSchemeHandler):
+    """Answers kasongo:// page, script, style and audio loads from the app
+
+    The app runs on the client's worker thread and each job is answered
+    back on the GUI thread.
+    """
+
+    # Emitted on the worker thread, queued to this handler's thread
+    _finished = pyqtSignal(object, object)
+
+    def __init__(self, server, parent=None):
+        super().__init__(parent)
+        self.server = server
+        self._finished.connect(self._reply)
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        path = url.path() or "/"
+        if url.hasQuery():
+            path += "?" + url.query()
+
+        self.server.client.request_async(lambda result: self._finished.emit(job, result),
+                                         bytes(job.requestMethod()).decode(), path)
+
+    def _reply(self, job, result):
+        try:
+            url = job.requestUrl()
+        except RuntimeError:
+            # The load was cancelled meanwhile and Qt deleted its job
+            return
+
+        status, headers, data = result
+        headers = dict((name.lower(), value) for name, value in headers)
+        if 300 <= status < 400 and "location" in headers:
+            job.redirect(url.resolved(QUrl(headers["location"])))
+        elif status == 404:
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+        elif status >= 400:
+            job.fail(QWebEngineUrlRequestJob.RequestFailed)
+        else:
+            # The job owns the buffer and frees it once the reply is read
+            buffer = QBuffer(job)
+            buffer.setData(data)
+            buffer.open(QIODevice.ReadOnly)
+            job.reply(headers.get("content-type", "application/octet-stream").encode(), buffer)
+
+
+class ApiBridge(QObject):
+    """Object the page's fetch shim sends every same-origin request to
+
+    Requests return at once and run on the client's worker thread. Each
+    reply comes back through `replied` with the page's request id.
+    """
+
+    replied = pyqtSignal(str, str)
+    # Emitted on the worker thread, queued to this object's thread
+    _finished = pyqtSignal(str, str)
+
+    def __init__(self, server, parent=None):
+        super().__init__(parent)
+        self.server = server
+        self._finished.connect(self.replied)
+
+    @pyqtSlot(str, str, str, str, str)
+    def request(self, request_id, method, path, headers_json, body):
+        self.server.client.request_json_async(lambda reply: self._finished.emit(request_id, reply),
+                                              method, path, headers_json, body)
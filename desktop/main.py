@@ -3,35 +3,102 @@ KasongoType Desktop Application
 Cross-platform desktop app built with PyQt5 WebEngine
 """
 
+import time
+
+# Cold start is measured from here, before any heavy import
+STARTED_AT = time.perf_counter()
+
 import os
 import sys
-import json
-import signal
+import logging
 import threading
-import webbrowser
-from pathlib import Path
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from PyQt5.QtCore import QUrl, Qt, QSize
+from PyQt5.QtCore import QUrl, Qt, QSize, QTimer
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QWidget, 
                            QAction, QToolBar, QStatusBar, QSystemTrayIcon, 
-                           QMenu, QDialog, QDialogButtonBox, QMessageBox)
-from PyQt5.QtGui import QIcon, QDesktopServices
+                           QMenu, QMessageBox, QSplashScreen)
+from PyQt5.QtGui import QIcon, QPixmap
 from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineSettings
 
-from web.app import app as flask_app
+from desktop.bridge import InProcessServer, register_scheme
+
+logger = logging.getLogger(__name__)
+
+ASSETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# The Flask app with its stores and exercises, imported by the server thread
+# so the splash and web view come up while it loads
+flask_app = None
+
+# How often the window checks whether the server is up, in ms
+SERVER_POLL_INTERVAL = 10
+
+def load_flask_app():
+    """Import the web app on first use"""
+    global flask_app
+    if flask_app is None:
+        from web.app import app
+        flask_app = app
+    return flask_app
+
+class WebServer(threading.Thread):
+    """Serves the web app from a daemon thread on a free local port
+    
+    `ready` is set as soon as the socket is listening, or when startup
+    failed, in which case `error` holds the reason. `url` is the base URL.
+    """
+    
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__(name="kasongotype-web", daemon=True)
+        self.host = host
+        self.port = port
+        self.url = None
+        self.error = None
+        self.ready = threading.Event()
+        self.ready_at = None
+        self._server = None
+    
+    def run(self):
+        try:
+            from werkzeug.serving import make_server
+            self._server = make_server(self.host, self.port, load_flask_app(), threaded=True)
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            return
+        
+        # Port 0 lets the OS pick a free port, so look up which
+        self.port = self._server.server_port
+        self.url = f"http://{self.host}:{self.port}"
+        self.ready_at = time.perf_counter()
+        self.ready.set()
+        self._server.serve_forever()
+    
+    def install(self, web_view):
+        """Nothing to set up, pages load over HTTP"""
+    
+    def shutdown(self):
+        """Stop serving and wait for the thread to finish"""
+        if self._server is not None:
+            self._server.shutdown()
+        if self.is_alive():
+            self.join(timeout=5)
 
 class KasongoTypeDesktop(QMainWindow):
-    def __init__(self):
+    def __init__(self, server, splash=None, exit_when_ready=False):
         super().__init__()
-        self.web_app_thread = None
+        self.server = server
+        self.splash = splash
+        self.exit_when_ready = exit_when_ready
+        self.interactive = False
         self.setWindowTitle("KasongoType - Cyberpunk Typing Trainer")
         self.setMinimumSize(1024, 768)
         
         # Set application icon
-        icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets/icon.ico")
+        icon_path = os.path.join(ASSETS_PATH, "icon.ico")
         if os.path.exists(icon_path):
             self.setWindowIcon(QIcon(icon_path))
         
@@ -51,6 +118,7 @@ class KasongoTypeDesktop(QMainWindow):
         
         # Add web view to layout
         layout.addWidget(self.web_view)
+        self.server.install(self.web_view)
         
         # Create toolbar
         self.create_toolbar()
@@ -66,11 +134,10 @@ class KasongoTypeDesktop(QMainWindow):
         # Connect signals and slots
         self.web_view.loadFinished.connect(self.on_load_finished)
         
-        # Start Flask server in a separate thread
-        self.start_web_server()
-        
-        # Load the local URL
-        self.web_view.load(QUrl("http://localhost:5000"))
+        # Load the first page as soon as the server listens
+        self.server_timer = QTimer(self)
+        self.server_timer.timeout.connect(self.check_server)
+        self.server_timer.start(SERVER_POLL_INTERVAL)
         
     def create_toolbar(self):
         """Create application toolbar"""
@@ -109,15 +176,15 @@ class KasongoTypeDesktop(QMainWindow):
         view_menu = menu_bar.addMenu("View")
         
         typing_action = QAction("Typing", self)
-        typing_action.triggered.connect(lambda: self.web_view.load(QUrl("http://localhost:5000/")))
+        typing_action.triggered.connect(lambda: self.load_page("/"))
         view_menu.addAction(typing_action)
         
         exercises_action = QAction("Exercises", self)
-        exercises_action.triggered.connect(lambda: self.web_view.load(QUrl("http://localhost:5000/exercises")))
+        exercises_action.triggered.connect(lambda: self.load_page("/exercises"))
         view_menu.addAction(exercises_action)
         
         dashboard_action = QAction("Dashboard", self)
-        dashboard_action.triggered.connect(lambda: self.web_view.load(QUrl("http://localhost:5000/dashboard")))
+        dashboard_action.triggered.connect(lambda: self.load_page("/dashboard"))
         view_menu.addAction(dashboard_action)
         
         # Help menu
@@ -133,7 +200,7 @@ class KasongoTypeDesktop(QMainWindow):
         self.tray_icon = QSystemTrayIcon(self)
         
         # Set icon
-        icon_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets/icon.ico")
+        icon_path = os.path.join(ASSETS_PATH, "icon.ico")
         if os.path.exists(icon_path):
             self.tray_icon.setIcon(QIcon(icon_path))
         
@@ -186,9 +253,28 @@ class KasongoTypeDesktop(QMainWindow):
         # Close the application
         QApplication.quit()
     
+    def load_page(self, path):
+        """Load a page of the local web app"""
+        if self.server.url is not None:
+            self.web_view.load(QUrl(self.server.url + path))
+    
     def go_home(self):
         """Navigate to home page"""
-        self.web_view.load(QUrl("http://localhost:5000/"))
+        self.load_page("/")
+    
+    def check_server(self):
+        """Load the home page once the server is ready"""
+        if not self.server.ready.is_set():
+            return
+        self.server_timer.stop()
+        
+        if self.server.error is not None:
+            if self.splash is not None:
+                self.splash.close()
+            QMessageBox.critical(self, "KasongoType", f"The local server failed to start:\n{self.server.error}")
+            QApplication.quit()
+            return
+        self.go_home()
         
     def on_load_finished(self, success):
         """Handle page load completion"""
@@ -196,6 +282,27 @@ class KasongoTypeDesktop(QMainWindow):
             self.statusBar.showMessage("Page loaded successfully")
         else:
             self.statusBar.showMessage("Error loading page")
+        
+        # The first page ends startup: swap the splash for the window
+        if not self.interactive:
+            self.interactive = True
+            self.show()
+            if self.splash is not None:
+                self.splash.finish(self)
+            if success:
+                self.report_startup()
+            elif self.exit_when_ready:
+                self.close_application()
+    
+    def report_startup(self):
+        """Log how long the cold start took and show it in the status bar"""
+        total_ms = (time.perf_counter() - STARTED_AT) * 1000
+        server_ms = (self.server.ready_at - STARTED_AT) * 1000
+        logger.info("Window interactive after %.0f ms, server ready after %.0f ms", total_ms, server_ms)
+        self.statusBar.showMessage(f"Ready in {total_ms / 1000:.2f} s")
+        if self.exit_when_ready:
+            print(f"startup_ms={total_ms:.0f} server_ready_ms={server_ms:.0f}")
+            self.close_application()
             
     def show_about_dialog(self):
         """Show about dialog"""
@@ -205,30 +312,44 @@ class KasongoTypeDesktop(QMainWindow):
         msg_box.setIcon(QMessageBox.Information)
         msg_box.exec_()
     
-    def start_web_server(self):
-        """Start Flask web server in a separate thread"""
-        def run_server():
-            flask_app.run(debug=False, use_reloader=False)
-        
-        self.web_app_thread = threading.Thread(target=run_server)
-        self.web_app_thread.daemon = True
-        self.web_app_thread.start()
-        
-        # Allow some time for the server to start
-        import time
-        time.sleep(0.5)
-    
     def stop_web_server(self):
-        """Stop the Flask web server"""
-        if self.web_app_thread and self.web_app_thread.is_alive():
-            # Send signal to stop the server
-            os.kill(os.getpid(), signal.SIGTERM)
+        """Stop the local web server"""
+        self.server.shutdown()
+
+def show_splash(app):
+    """Show the splash screen right away, if its image is there"""
+    splash_path = os.path.join(ASSETS_PATH, "splash.png")
+    if not os.path.exists(splash_path):
+        return None
+    splash = QSplashScreen(QPixmap(splash_path), Qt.WindowStaysOnTopHint)
+    splash.show()
+    app.processEvents()
+    return splash
 
 def main():
-    """Main function to start the application"""
+    """Main function to start the application
+    
+    Pages and API calls go straight to the web app in-process. With --http
+    it is served on a local port instead, which browser dev tools can
+    inspect. With --measure-startup the app prints its cold start time once
+    the first page is interactive, then exits.
+    """
+    logging.basicConfig(level=logging.INFO)
+    exit_when_ready = "--measure-startup" in sys.argv
+    
+    # The web app loads on its own thread while the window is built
+    if "--http" in sys.argv:
+        server = WebServer()
+    else:
+        # Custom schemes must be known before the application starts
+        register_scheme()
+        server = InProcessServer(load_flask_app)
+    
     app = QApplication(sys.argv)
-    window = KasongoTypeDesktop()
-    window.show()
+    splash = show_splash(app)
+    server.start()
+    
+    window = KasongoTypeDesktop(server, splash, exit_when_ready)
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
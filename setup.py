@@ -13,7 +13,12 @@ setup(
     long_description=open("README.md").read(),
     long_description_content_type="text/markdown",
     url="https://github.com/kasongoType/kasongoType",
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests", "benchmarks"]),
+    package_data={
+        "common": ["data/*.json"],
+        "web": ["templates/*.html", "static/*/*"],
+        "desktop": ["bridge.js", "assets/*"],
+    },
     include_package_data=True,
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -23,12 +28,24 @@ setup(
     python_requires=">=3.7",
     install_requires=[
         "flask>=2.0.0",
+        "flask-sock>=0.7.0",
         "PyQt5>=5.15.0",
         "pytest>=6.0.0",
     ],
+    extras_require={
+        "fast": [
+            "numpy>=1.21",
+        ],
+        "serve": [
+            "gunicorn>=21.2.0; sys_platform != 'win32'",
+            "waitress>=2.1.2",
+            "uvicorn>=0.29.0",
+        ],
+    },
     entry_points={
         "console_scripts": [
             "kasongoType-web=web.app:main",
+            "kasongoType-serve=web.serve:main",
             "kasongoType-desktop=desktop.main:main",
         ],
     },
@@ -0,0 +1,88 @@
+"""
+Unit tests for KasongoType adaptive practice
+"""
+
+import sys
+import os
+import random
+import unittest
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.adaptive import (AdaptiveGenerator, empty_key_stats, update_key_stats, weakness_scores,
+                             HITS, MISSES, LATENCY_COUNT)
+
+def keystrokes(keys, interval=0.1):
+    """Keystroke dicts typed at a steady pace"""
+    return [{"key": key, "timestamp": 100 + i * interval} for i, key in enumerate(keys)]
+
+class TestKeyStats(unittest.TestCase):
+    """Tests for incremental per-key stats"""
+
+    def test_update_counts_errors_and_latency(self):
+        """Test that misses land on the expected character and bigram"""
+        key_stats = empty_key_stats()
+        update_key_stats(key_stats, "abc", keystrokes(["a", "x", "Shift", "b", "c"]))
+
+        chars = key_stats["chars"]
+        self.assertEqual(chars["a"][HITS], 1)
+        self.assertEqual(chars["a"][LATENCY_COUNT], 0)
+        self.assertEqual(chars["b"][MISSES], 1)
+        self.assertEqual(chars["b"][HITS], 1)
+        self.assertAlmostEqual(chars["c"][2], 100.0)
+        self.assertEqual(key_stats["bigrams"]["ab"][MISSES], 1)
+        self.assertNotIn("Shift", chars)
+
+    def test_updates_accumulate(self):
+        """Test that a second session adds to the stored counts"""
+        key_stats = empty_key_stats()
+        update_key_stats(key_stats, "ab", keystrokes("ab"))
+        update_key_stats(key_stats, "ab", keystrokes("ab"))
+
+        self.assertEqual(key_stats["chars"]["b"][HITS], 2)
+        self.assertEqual(key_stats["bigrams"]["ab"][HITS], 2)
+
+    def test_weak_keys_score_high(self):
+        """Test that a frequently missed key scores above the average"""
+        key_stats = empty_key_stats()
+        for _ in range(20):
+            update_key_stats(key_stats, "asdf", keystrokes(["a", "s", "x", "d", "f"]))
+
+        scores = weakness_scores(key_stats)
+        self.assertGreater(scores["d"], 1.0)
+        self.assertLess(scores["a"], 1.0)
+        self.assertEqual(weakness_scores(empty_key_stats()), {})
+
+class TestAdaptiveGenerator(unittest.TestCase):
+    """Tests for drill generation"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.generator = AdaptiveGenerator([
+            "the quick brown fox jumps over the lazy dog",
+            "pack my box with five dozen liquor jugs"
+        ])
+
+    def test_drill_targets_weak_keys(self):
+        """Test that most drill words contain the weakest key"""
+        key_stats = empty_key_stats()
+        for _ in range(20):
+            update_key_stats(key_stats, "the quick", keystrokes(list("the q") + ["x", "u", "i", "c", "k"]))
+
+        drill = self.generator.generate(key_stats, word_count=200, rng=random.Random(1))
+        words = drill["text"].split()
+        self.assertEqual(len(words), 200)
+        self.assertIn("u", drill["focus"])
+        self.assertGreater(sum("u" in word for word in words), 100)
+
+    def test_drill_without_stats(self):
+        """Test that a new user gets words from the whole vocabulary"""
+        drill = self.generator.generate(empty_key_stats(), word_count=10)
+
+        self.assertEqual(len(drill["text"].split()), 10)
+        self.assertEqual(drill["focus"], [])
+        self.assertEqual(AdaptiveGenerator([]).generate(empty_key_stats())["text"], "")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,460 @@
+"""
+Unit tests for KasongoType analytics and profile storage
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.analytics import UserProfile, ProfileCache, downsample_lttb, DAY_MS
+from common.storage import JsonFileStore, SessionLogStore, SQLiteProfileStore, WriteBehindStore, create_store
+
+class TestUserProfile(unittest.TestCase):
+    """Tests for UserProfile with the default JSON file store"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.profiles_path = os.path.join(self.tmp_dir, "user_profiles.json")
+    
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.tmp_dir)
+    
+    def test_new_profile(self):
+        """Test that a new profile is created and saved"""
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        
+        self.assertEqual(profile.get_stats()["exercises_completed"], 0)
+        with open(self.profiles_path) as f:
+            self.assertIn("test_user", json.load(f))
+    
+    def test_record_session(self):
+        """Test recording sessions updates aggregate stats"""
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        profile.record_session("b1", 40.0, 90.0, 30.0)
+        profile.record_session("b2", 60.0, 100.0, 20.0)
+        
+        reloaded = UserProfile("test_user", data_path=self.profiles_path)
+        stats = reloaded.get_stats()
+        self.assertEqual(stats["best_wpm"], 60.0)
+        self.assertEqual(stats["average_wpm"], 50.0)
+        self.assertEqual(stats["accuracy"], 95.0)
+        self.assertEqual(stats["exercises_completed"], 2)
+        self.assertEqual(len(reloaded.get_recent_sessions()), 2)
+
+    def test_record_session_key_stats(self):
+        """Test that keystrokes given with a session update persisted key stats"""
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        keystrokes = [{"key": key, "timestamp": 1 + i * 0.2} for i, key in enumerate("axb")]
+        profile.record_session("b1", 40.0, 66.7, 1.0, text="ab", keystrokes=keystrokes)
+        profile.record_session("b1", 40.0, 100.0, 1.0, text="ab", keystrokes=keystrokes[::2])
+        
+        key_stats = UserProfile("test_user", data_path=self.profiles_path).get_key_stats()
+        self.assertEqual(key_stats["chars"]["b"][:2], [2, 1])
+        self.assertEqual(key_stats["bigrams"]["ab"][:2], [2, 1])
+    
+    def test_record_session_rhythm(self):
+        """Test that session rhythm summaries add up in the profile"""
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        summary = {
+            "interval_count": 4, "interval_sum_ms": 400.0, "interval_sq_sum_ms": 42000.0,
+            "histogram": [0, 0, 4], "histogram_edges_ms": [50, 75, 100], "pauses": 1,
+            "active_time": 0.4, "correct_keystrokes": 5, "burst_wpm": 80.0,
+            "sustained_wpm": 150.0, "consistency": 0.22
+        }
+        profile.record_session("b1", 40.0, 90.0, 30.0, rhythm=summary)
+        profile.record_session("b1", 40.0, 90.0, 30.0, rhythm=dict(summary, burst_wpm=90.0))
+        
+        reloaded = UserProfile("test_user", data_path=self.profiles_path)
+        rhythm = reloaded.get_rhythm()
+        self.assertEqual(rhythm["sessions"], 2)
+        self.assertEqual(rhythm["histogram"], [0, 0, 8])
+        self.assertEqual(rhythm["mean_interval_ms"], 100.0)
+        self.assertEqual(rhythm["best_burst_wpm"], 90.0)
+        self.assertEqual(rhythm["sustained_wpm"], 150.0)
+        self.assertEqual(reloaded.get_recent_sessions()[-1]["consistency"], 0.22)
+    
+    def test_running_aggregates(self):
+        """Test running sums, deviation and rolling windows"""
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        for i in range(12):
+            profile.record_session("b1", float(i), 90.0 + i % 2, 10.0)
+        
+        stats = profile.get_stats()
+        self.assertEqual(stats["session_count"], 12)
+        self.assertEqual(stats["average_wpm"], 5.5)
+        self.assertAlmostEqual(stats["wpm_stddev"], 3.45, places=2)
+        
+        # Last 10 sessions are wpm 2..11
+        self.assertEqual(stats["rolling"]["10"]["average_wpm"], 6.5)
+        self.assertEqual(stats["rolling"]["10"]["accuracy"], 90.5)
+        self.assertEqual(stats["rolling"]["50"]["average_wpm"], 5.5)
+    
+    def test_rebuild_legacy_stats(self):
+        """Test that profiles without running sums get them rebuilt"""
+        legacy = {
+            "test_user": {
+                "created_at": "2025-04-16T09:00:00",
+                "last_active": "2025-04-16T09:00:00",
+                "sessions": [
+                    {"timestamp": "2025-04-16T09:10:23", "exercise_id": "b1", "wpm": 40.0, "accuracy": 90.0, "time_elapsed": 30.0},
+                    {"timestamp": "2025-04-16T09:20:23", "exercise_id": "b2", "wpm": 60.0, "accuracy": 100.0, "time_elapsed": 20.0}
+                ],
+                "stats": {"best_wpm": 60.0, "average_wpm": 50.0, "total_time": 50.0, "exercises_completed": 2, "accuracy": 95.0}
+            }
+        }
+        with open(self.profiles_path, 'w') as f:
+            json.dump(legacy, f)
+        
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        profile.record_session("b3", 80.0, 80.0, 10.0)
+        
+        stats = profile.get_stats()
+        self.assertEqual(stats["session_count"], 3)
+        self.assertEqual(stats["average_wpm"], 60.0)
+        self.assertEqual(stats["best_wpm"], 80.0)
+        self.assertEqual(stats["rolling"]["10"]["accuracy"], 90.0)
+
+    def test_sessions_in_time_order(self):
+        """Test recent sessions and progress data come from the ordered index"""
+        legacy = {
+            "test_user": {
+                "created_at": "2025-04-16T09:00:00",
+                "last_active": "2025-04-16T09:30:00",
+                "sessions": [
+                    {"timestamp": "2025-04-16T09:20:00", "exercise_id": "b2", "wpm": 20.0, "accuracy": 90.0, "time_elapsed": 30.0},
+                    {"timestamp": "2025-04-16T09:10:00", "exercise_id": "b1", "wpm": 10.0, "accuracy": 80.0, "time_elapsed": 30.0}
+                ],
+                "stats": {"best_wpm": 20.0, "average_wpm": 15.0, "total_time": 60.0, "exercises_completed": 2, "accuracy": 85.0}
+            }
+        }
+        with open(self.profiles_path, 'w') as f:
+            json.dump(legacy, f)
+        
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        profile.record_session("b3", 30.0, 100.0, 10.0)
+        
+        recent = profile.get_recent_sessions(2)
+        self.assertEqual([s["exercise_id"] for s in recent], ["b3", "b2"])
+        
+        progress = profile.get_progress_data()
+        self.assertEqual([p["y"] for p in progress["wpm"]], [10.0, 20.0, 30.0])
+        xs = [p["x"] for p in progress["wpm"]]
+        self.assertEqual(xs, sorted(xs))
+        
+        # Only the requested window is returned
+        windowed = profile.get_progress_data(limit=2)
+        self.assertEqual([p["y"] for p in windowed["accuracy"]], [90.0, 100.0])
+
+    def test_downsampled_progress(self):
+        """Test bucketed and LTTB-downsampled progress series"""
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        profile.record_session("b1", 10.0, 80.0, 10.0)
+        profile.record_session("b1", 30.0, 100.0, 10.0)
+        
+        # Move the first session a day back, as if recorded yesterday
+        profile._progress_x[0] -= DAY_MS
+        
+        daily = profile.get_progress_data(resolution="day")
+        self.assertEqual([p["y"] for p in daily["wpm"]], [10.0, 30.0])
+        self.assertEqual(daily["wpm"][1]["count"], 1)
+        
+        # Buckets stay up to date as sessions are recorded
+        profile.record_session("b1", 50.0, 90.0, 10.0)
+        daily = profile.get_progress_data(resolution="day")
+        self.assertEqual(daily["wpm"][1]["y"], 40.0)
+        self.assertEqual(daily["wpm"][1]["min"], 30.0)
+        self.assertEqual(daily["wpm"][1]["max"], 50.0)
+        self.assertEqual(daily["accuracy"][1]["y"], 95.0)
+        
+        self.assertEqual(len(profile.get_progress_data(max_points=2)["wpm"]), 2)
+        with self.assertRaises(ValueError):
+            profile.get_progress_data(resolution="month")
+    
+    def test_lttb(self):
+        """Test that LTTB keeps endpoints and peaks"""
+        xs = list(range(100))
+        ys = [0.0] * 100
+        ys[37] = 50.0
+        
+        indices = downsample_lttb(xs, ys, 10)
+        self.assertEqual(len(indices), 10)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 99)
+        self.assertIn(37, indices)
+        self.assertEqual(indices, sorted(indices))
+
+class TestSessionLogStore(unittest.TestCase):
+    """Tests for the append-only session log store"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.profiles_path = os.path.join(self.tmp_dir, "user_profiles.json")
+    
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.tmp_dir)
+    
+    def test_sessions_are_appended(self):
+        """Test that recording a session appends one log line"""
+        store = SessionLogStore(self.profiles_path)
+        profile = UserProfile("test_user", store=store)
+        profile.record_session("b1", 40.0, 90.0, 30.0)
+        profile.record_session("b2", 60.0, 100.0, 20.0)
+        
+        with open(store.log_path) as f:
+            lines = f.read().splitlines()
+        # Header, profile creation and two sessions
+        self.assertEqual(len(lines), 4)
+        
+        # A second store, as another process would, sees the same profile
+        other = UserProfile("test_user", store=SessionLogStore(self.profiles_path))
+        self.assertEqual(other.get_stats()["exercises_completed"], 2)
+        self.assertEqual(len(other.profile["sessions"]), 2)
+    
+    def test_seeds_from_json_file(self):
+        """Test that an existing JSON profiles file is picked up"""
+        UserProfile("old_user", data_path=self.profiles_path).record_session("b1", 30.0, 80.0, 10.0)
+        
+        profile = UserProfile("old_user", store=SessionLogStore(self.profiles_path))
+        self.assertEqual(profile.get_stats()["best_wpm"], 30.0)
+    
+    def test_compaction(self):
+        """Test that the log is folded into a snapshot"""
+        store = SessionLogStore(self.profiles_path, compact_every=3)
+        profile = UserProfile("test_user", store=store)
+        for i in range(5):
+            profile.record_session("b1", 40.0 + i, 90.0, 30.0)
+        
+        self.assertTrue(store.snapshot_path.exists())
+        other = SessionLogStore(self.profiles_path)
+        self.assertEqual(len(other.load("test_user")["sessions"]), 5)
+    
+    def test_interrupted_compaction(self):
+        """Test that a log already folded into the snapshot is not replayed"""
+        store = SessionLogStore(self.profiles_path)
+        profile = UserProfile("test_user", store=store)
+        profile.record_session("b1", 40.0, 90.0, 30.0)
+        
+        # Simulate a crash after the snapshot was written but before the log was reset
+        stale_log = store.log_path.read_bytes()
+        store.compact()
+        store.log_path.write_bytes(stale_log)
+        
+        other = SessionLogStore(self.profiles_path)
+        self.assertEqual(len(other.load("test_user")["sessions"]), 1)
+        
+        UserProfile("test_user", store=other).record_session("b2", 50.0, 90.0, 30.0)
+        self.assertEqual(len(SessionLogStore(self.profiles_path).load("test_user")["sessions"]), 2)
+    
+    def test_streamed_profiles(self):
+        """Test that iterating merges snapshot and log the way loads do"""
+        store = SessionLogStore(self.profiles_path)
+        store.save_many([("user_a", {"sessions": [], "stats": {}}), ("user_b", {"sessions": [], "stats": {}})])
+        store.compact()
+        store.append_session("user_a", {"wpm": 1}, {"stats": {"best_wpm": 1}})
+        store.save("user_b", {"sessions": [{"wpm": 2}], "stats": {}})
+        store.append_session("user_c", {"wpm": 3}, {"stats": {}})
+        
+        writer = SessionLogStore(self.profiles_path)
+        writer.append_session("user_a", {"wpm": 4}, {"stats": {"best_wpm": 4}})
+        profiles = dict(writer.iter_profiles())
+        
+        self.assertEqual(list(profiles), ["user_a", "user_b", "user_c"])
+        self.assertEqual(profiles["user_a"], {"sessions": [{"wpm": 1}, {"wpm": 4}], "stats": {"best_wpm": 4}})
+        reader = SessionLogStore(self.profiles_path)
+        for user_id, profile in profiles.items():
+            self.assertEqual(reader.load(user_id), profile)
+        
+        writer.compact()
+        self.assertEqual(dict(SessionLogStore(self.profiles_path).iter_profiles()), profiles)
+    
+    def test_compaction_follows_log_size(self):
+        """Test that the log is only folded in once it outgrows the snapshot"""
+        store = SessionLogStore(self.profiles_path, compact_every=2)
+        store.save_many([(f"user{i}", {"sessions": [{"wpm": i}] * 20}) for i in range(10)])
+        snapshot = store.snapshot_path.read_bytes()
+        
+        for i in range(5):
+            store.append_session("user0", {"wpm": i}, {})
+        self.assertEqual(store.snapshot_path.read_bytes(), snapshot)
+        
+        store.save_many([(f"user{i}", {"sessions": [{"wpm": i}] * 21}) for i in range(10)])
+        self.assertNotEqual(store.snapshot_path.read_bytes(), snapshot)
+        self.assertEqual(len(store.log_path.read_bytes().splitlines()), 1)
+        self.assertEqual(len(SessionLogStore(self.profiles_path).load("user3")["sessions"]), 21)
+    
+    def test_reads_whole_snapshot(self):
+        """Test that a snapshot written as one JSON object is still read"""
+        with open(os.path.join(self.tmp_dir, "user_profiles.snapshot.json"), "w") as f:
+            json.dump({"generation": 2, "profiles": {"old_user": {"sessions": [{"wpm": 1}]}}}, f)
+        store = SessionLogStore(self.profiles_path)
+        store.append_session("old_user", {"wpm": 2}, {})
+        
+        self.assertEqual(len(SessionLogStore(self.profiles_path).load("old_user")["sessions"]), 2)
+        self.assertEqual(dict(store.iter_profiles()), {"old_user": {"sessions": [{"wpm": 1}, {"wpm": 2}]}})
+        # Converted into a snapshot with one user per line
+        self.assertEqual(len(store.snapshot_path.read_bytes().splitlines()), 2)
+    
+    def test_concurrent_writers(self):
+        """Test that concurrent writers do not lose sessions"""
+        stores = [SessionLogStore(self.profiles_path, compact_every=7) for _ in range(4)]
+        
+        def write(store, user_id):
+            for i in range(10):
+                store.append_session(user_id, {"wpm": i}, {"stats": {}})
+        
+        threads = [threading.Thread(target=write, args=(store, f"user_{n}")) for n, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        reader = SessionLogStore(self.profiles_path)
+        for n in range(4):
+            self.assertEqual(len(reader.load(f"user_{n}")["sessions"]), 10)
+
+    def test_aggregates_of_concurrent_profiles(self):
+        """Test that stats cover every session when two processes record them"""
+        UserProfile("test_user", store=SessionLogStore(self.profiles_path)).record_session("b1", 40.0, 90.0, 30.0)
+        
+        # Two workers load the profile, then each records a session
+        first = UserProfile("test_user", store=SessionLogStore(self.profiles_path))
+        second = UserProfile("test_user", store=SessionLogStore(self.profiles_path))
+        first.record_session("b2", 60.0, 100.0, 20.0)
+        second.record_session("b3", 50.0, 95.0, 25.0)
+        
+        stats = UserProfile("test_user", store=SessionLogStore(self.profiles_path)).get_stats()
+        self.assertEqual(stats["session_count"], 3)
+        self.assertEqual(stats["best_wpm"], 60.0)
+        self.assertEqual(stats["total_time"], 75.0)
+
+class TestSQLiteProfileStore(unittest.TestCase):
+    """Tests for the SQLite profile store"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.profiles_path = os.path.join(self.tmp_dir, "user_profiles.json")
+    
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.tmp_dir)
+    
+    def test_record_and_load(self):
+        """Test that sessions and stats round-trip through SQLite"""
+        store = SQLiteProfileStore(os.path.join(self.tmp_dir, "profiles.db"))
+        profile = UserProfile("test_user", store=store)
+        profile.record_session("b1", 40.0, 90.0, 30.0)
+        profile.record_session("b2", 60.0, 100.0, 20.0)
+        UserProfile("other_user", store=store).record_session("b1", 10.0, 50.0, 30.0)
+        
+        loaded = store.load("test_user")
+        self.assertEqual([s["exercise_id"] for s in loaded["sessions"]], ["b1", "b2"])
+        self.assertEqual(loaded["stats"]["best_wpm"], 60.0)
+        self.assertEqual(loaded["created_at"], profile.profile["created_at"])
+        self.assertIsNone(store.load("missing_user"))
+        self.assertEqual(sorted(user_id for user_id, _ in store.iter_profiles()), ["other_user", "test_user"])
+    
+    def test_migration_from_json(self):
+        """Test that existing JSON profiles are migrated once"""
+        UserProfile("old_user", data_path=self.profiles_path).record_session("b1", 30.0, 80.0, 10.0)
+        
+        store = create_store("sqlite", self.profiles_path)
+        profile = UserProfile("old_user", store=store)
+        self.assertEqual(profile.get_stats()["best_wpm"], 30.0)
+        self.assertEqual(len(profile.profile["sessions"]), 1)
+
+class TestProfileCache(unittest.TestCase):
+    """Tests for the profile cache and write-behind store"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.profiles_path = os.path.join(self.tmp_dir, "user_profiles.json")
+        self.inner = JsonFileStore(self.profiles_path)
+        # Long interval so only explicit flushes write
+        self.store = WriteBehindStore(self.inner, flush_interval=60)
+    
+    def tearDown(self):
+        """Clean up after each test"""
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+    
+    def test_burst_is_one_write(self):
+        """Test that a burst of sessions is flushed in a single write"""
+        cache = ProfileCache(self.store)
+        profiles = [cache.get(f"user_{n}") for n in range(3)]
+        
+        with patch.object(self.inner, 'append_sessions', wraps=self.inner.append_sessions) as append:
+            for profile in profiles:
+                profile.record_session("b1", 40.0, 90.0, 30.0)
+                profile.record_session("b2", 50.0, 90.0, 30.0)
+            
+            # Buffered sessions are already visible to fresh loads
+            self.assertEqual(len(self.store.load("user_0")["sessions"]), 2)
+            self.assertEqual(append.call_count, 0)
+            
+            self.store.flush()
+            self.assertEqual(append.call_count, 1)
+        
+        for n in range(3):
+            stored = self.inner.load(f"user_{n}")
+            self.assertEqual(len(stored["sessions"]), 2)
+            self.assertEqual(stored["stats"]["session_count"], 2)
+    
+    def test_close_flushes(self):
+        """Test that closing the store writes buffered sessions"""
+        UserProfile("test_user", store=self.store).record_session("b1", 40.0, 90.0, 30.0)
+        self.store.close()
+        
+        self.assertEqual(len(self.inner.load("test_user")["sessions"]), 1)
+    
+    def test_lru_eviction(self):
+        """Test that the cache keeps hot profiles and evicts the least recent"""
+        cache = ProfileCache(self.store, capacity=2)
+        first = cache.get("user_a")
+        cache.get("user_b")
+        self.assertIs(cache.get("user_a"), first)
+        
+        cache.get("user_c")
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.get("user_a"), first)
+        
+        # user_b was evicted and comes back as a fresh load
+        first.record_session("b1", 40.0, 90.0, 30.0)
+        reloaded = cache.get("user_b")
+        self.assertEqual(reloaded.get_stats()["exercises_completed"], 0)
+
+    def test_revalidate(self):
+        """Test that a shared store's changes reach cached profiles"""
+        stores = {
+            "log": lambda: SessionLogStore(self.profiles_path),
+            "sqlite": lambda: SQLiteProfileStore(os.path.join(self.tmp_dir, "profiles.db"))
+        }
+        for name, open_store in stores.items():
+            with self.subTest(store=name):
+                UserProfile("test_user", store=open_store())
+                cache = ProfileCache(open_store(), revalidate=True)
+                cached = cache.get("test_user")
+                self.assertIs(cache.get("test_user"), cached)
+                
+                # Another process records a session
+                UserProfile("test_user", store=open_store()).record_session("b1", 40.0, 90.0, 30.0)
+                reloaded = cache.get("test_user")
+                self.assertIsNot(reloaded, cached)
+                self.assertEqual(reloaded.get_stats()["session_count"], 1)
+                self.assertIs(cache.get("test_user"), reloaded)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+"""
+Unit tests for the KasongoType ASGI application
+"""
+
+import sys
+import os
+import json
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Whatever the app opens on import stays out of the shipped common/data
+_data_dir = tempfile.TemporaryDirectory()
+os.environ['KASONGOTYPE_DATA_DIR'] = _data_dir.name
+
+from web import asgi
+from web.app import app as flask_app, active_sessions, session_verifier
+from common.analytics import ProfileCache
+from common.leaderboard import SQLiteLeaderboard, leaderboard_path_for
+from common.storage import create_store
+
+def tearDownModule():
+    _data_dir.cleanup()
+
+def session_cookie(user_id):
+    """A Flask session cookie header for a user"""
+    value = asgi._session_serializer.dumps({'user_id': user_id})
+    return (b"cookie", f"{flask_app.config['SESSION_COOKIE_NAME']}={value}".encode())
+
+async def http_request(method, path, body=None, user_id=None, query=b""):
+    """Call the ASGI app with one request, returning (status, headers, body)"""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query,
+        "headers": [session_cookie(user_id)] if user_id else []
+    }
+    data = json.dumps(body).encode() if body is not None else b""
+    received = []
+
+    async def receive():
+        return {"type": "http.request", "body": data, "more_body": False}
+
+    async def send(message):
+        received.append(message)
+
+    await asgi.app(scope, receive, send)
+    return received[0]["status"], dict(received[0]["headers"]), b"".join(m.get("body", b"") for m in received[1:])
+
+class FakeSocket:
+    """Both ends of an ASGI WebSocket connection"""
+
+    def __init__(self, path, user_id):
+        self.scope = {"type": "websocket", "path": path, "headers": [session_cookie(user_id)]}
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.incoming.put_nowait({"type": "websocket.connect"})
+
+    def run(self):
+        return asyncio.ensure_future(asgi.app(self.scope, self.incoming.get, self.outgoing.put))
+
+    async def send_text(self, data):
+        await self.incoming.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_text(self):
+        message = await self.outgoing.get()
+        return json.loads(message["text"]) if message["type"] == "websocket.send" else message
+
+class TestAsgiApp(unittest.TestCase):
+    """Tests for the asyncio session API"""
+
+    def setUp(self):
+        # Give each test its own profiles and leaderboards
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        profiles_path = os.path.join(data_dir.name, 'user_profiles.json')
+        profile_store = create_store(flask_app.config['PROFILE_STORE'], profiles_path)
+        self.addCleanup(profile_store.close)
+        leaderboard = SQLiteLeaderboard(leaderboard_path_for(profiles_path))
+        self.addCleanup(leaderboard.close)
+        stores = patch.multiple('web.app', profile_store=profile_store, leaderboard=leaderboard,
+                                profile_cache=ProfileCache(profile_store, data_path=profiles_path))
+        stores.start()
+        self.addCleanup(stores.stop)
+        # Finish recording sessions before their store goes away
+        self.addCleanup(session_verifier.drain)
+
+    def start(self, user_id='asgi_user'):
+        status, _, body = asyncio.run(http_request(
+            "POST", "/api/session/start", {'exercise_id': 'b1', 'level': 'beginner'}, user_id))
+        self.assertEqual(status, 200)
+        return json.loads(body)
+
+    def test_start_session(self):
+        """Test starting a session with and without a user cookie"""
+        status, _, _ = asyncio.run(http_request("POST", "/api/session/start", {}))
+        self.assertEqual(status, 401)
+
+        data = self.start()
+        self.assertEqual(data['stream_url'], f"/ws/session/{data['session_id']}")
+        self.assertIn(data['session_id'], active_sessions)
+
+        status, _, body = asyncio.run(http_request(
+            "GET", "/api/session/status", query=f"session_id={data['session_id']}".encode()))
+        self.assertTrue(json.loads(body)['started'])
+
+    def test_keystrokes_and_complete(self):
+        """Test typing and completing a session over HTTP"""
+        data = self.start()
+        session_id = data['session_id']
+
+        batch = {
+            'keystrokes': [{'key': 'a', 'timestamp': 1000}, {'key': 's', 'timestamp': 1100}],
+            'exercise_id': 'b1'
+        }
+        status, _, body = asyncio.run(http_request("POST", f"/api/session/{session_id}/keystrokes", batch,
+                                                   'asgi_user'))
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['result']['position'], 2)
+
+        # Only the session's owner types into it
+        status, _, _ = asyncio.run(http_request("POST", f"/api/session/{session_id}/keystrokes", batch,
+                                                'someone_else'))
+        self.assertEqual(status, 404)
+
+        status, _, _ = asyncio.run(http_request("POST", f"/api/session/{session_id}/keystrokes",
+                                                {'keystrokes': [{'key': 'too long'}]}, 'asgi_user'))
+        self.assertEqual(status, 400)
+
+        # Only the session's owner completes it
+        status, _, body = asyncio.run(http_request("POST", f"/api/session/{session_id}/complete",
+                                                   {'exercise_id': 'b1'}, 'someone_else'))
+        self.assertEqual(json.loads(body)['message'], "Session already completed")
+        self.assertIn(session_id, active_sessions)
+
+        status, _, body = asyncio.run(http_request("POST", f"/api/session/{session_id}/complete",
+                                                   {'exercise_id': 'b1'}, 'asgi_user'))
+        self.assertEqual(json.loads(body)['metrics']['char_count'], 2)
+        self.assertNotIn(session_id, active_sessions)
+
+    def test_user_stats(self):
+        """Test the dashboard data, with malformed query arguments ignored"""
+        status, _, _ = asyncio.run(http_request("GET", "/api/user/stats"))
+        self.assertEqual(status, 401)
+
+        status, _, body = asyncio.run(http_request("GET", "/api/user/stats", user_id='asgi_user',
+                                                   query=b"window=abc&max_points=10"))
+        self.assertEqual(status, 200)
+        self.assertIn('progress_data', json.loads(body))
+
+    def test_stream_session(self):
+        """Test typing a whole exercise over a session stream"""
+        data = self.start()
+        text = data['exercise']['text']
+
+        async def stream():
+            socket = FakeSocket(data['stream_url'], 'asgi_user')
+            task = socket.run()
+            self.assertEqual((await socket.outgoing.get())["type"], "websocket.accept")
+
+            await socket.send_text({'type': 'ping'})
+            self.assertEqual((await socket.receive_text())['type'], 'pong')
+
+            await socket.send_text({
+                'type': 'keystrokes',
+                'keystrokes': [{'key': char, 'timestamp': 1000 + i * 100} for i, char in enumerate(text)],
+                'exercise_id': 'b1'
+            })
+            reply = await socket.receive_text()
+            closed = await socket.receive_text()
+            await task
+            return reply, closed
+
+        reply, closed = asyncio.run(stream())
+        self.assertEqual(reply['type'], 'complete')
+        self.assertEqual(reply['metrics']['char_count'], len(text))
+        self.assertEqual(closed['type'], 'websocket.close')
+
+    def test_stream_of_another_user(self):
+        """Test that a stream is refused for someone else's session"""
+        data = self.start()
+
+        async def stream():
+            socket = FakeSocket(data['stream_url'], 'someone_else')
+            await socket.run()
+            return [await socket.receive_text() for _ in range(3)]
+
+        accepted, error, closed = asyncio.run(stream())
+        self.assertEqual(error, {"type": "error", "message": "Session not found"})
+        self.assertEqual(closed['type'], 'websocket.close')
+
+    def test_idle_streams(self):
+        """Test that many idle streams are held by one event loop"""
+        data = self.start()
+
+        async def streams(count):
+            sockets = [FakeSocket(data['stream_url'], 'asgi_user') for _ in range(count)]
+            tasks = [socket.run() for socket in sockets]
+            await asyncio.sleep(0.1)
+            waiting = sum(not task.done() for task in tasks)
+            for socket in sockets:
+                await socket.incoming.put({"type": "websocket.disconnect"})
+            await asyncio.gather(*tasks)
+            return waiting
+
+        self.assertEqual(asyncio.run(streams(2000)), 2000)
+
+    def test_fallback_and_limits(self):
+        """Test that other routes are served by Flask and large bodies refused"""
+        status, headers, body = asyncio.run(http_request("GET", "/api/leaderboard"))
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['board'], 'global')
+
+        status, _, _ = asyncio.run(http_request("POST", "/api/session/start",
+                                                {'text': 'x' * asgi.MAX_BODY_BYTES}, 'asgi_user'))
+        self.assertEqual(status, 413)
+
+if __name__ == "__main__":
+    unittest.main()
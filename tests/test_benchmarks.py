@@ -0,0 +1,102 @@
+"""
+Unit tests for the KasongoType benchmark runner
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import run
+
+def results(scale=1.0, **times):
+    """A results document with the given best times"""
+    return {
+        "meta": {"scale": scale},
+        "results": {label: {"min": value, "median": value, "relative": value} for label, value in times.items()}
+    }
+
+class TestBenchmarks(unittest.TestCase):
+    """Tests for running benchmarks and comparing them with a baseline"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_every_benchmark_runs(self):
+        """Test that each benchmark runs on a tiny workload"""
+        document = run.run_benchmarks(scale=0.0001, rounds=1)
+
+        self.assertEqual(set(document["results"]), set(run.BENCHMARKS))
+        for result in document["results"].values():
+            self.assertGreater(result["ops"], 0)
+            self.assertGreater(result["min"], 0)
+            self.assertLessEqual(result["min"], result["median"])
+            self.assertGreater(result["relative"], 0)
+        self.assertEqual(document["meta"]["scale"], 0.0001)
+
+    def test_compare(self):
+        """Test flagging slower and faster benchmarks"""
+        baseline = results(a=1.0, b=1.0, c=1.0, gone=1.0)
+        current = results(a=1.1, b=2.0, c=0.5, new=1.0)
+
+        rows = run.compare(current, baseline, threshold=0.25)
+        self.assertEqual([(label, verdict) for label, _, verdict in rows],
+                         [("a", "same"), ("b", "slower"), ("c", "faster")])
+        self.assertAlmostEqual(rows[1][1], 2.0)
+
+        # A machine running at half speed is not a regression
+        slow_machine = results(a=2.0)
+        slow_machine["results"]["a"]["relative"] = 1.0
+        self.assertEqual(run.compare(slow_machine, baseline)[0][2], "same")
+
+        # Benchmarks can carry a wider threshold of their own
+        noisy = results(b=1.5)
+        noisy["results"]["b"]["threshold"] = 0.6
+        self.assertEqual(run.compare(noisy, baseline)[0][2], "same")
+
+        # Results at another scale are not comparable
+        with self.assertRaises(ValueError):
+            run.compare(results(0.5, a=1.0), baseline)
+
+    def test_main_exit_status(self):
+        """Test that the runner fails on a regression against the baseline"""
+        baseline_path = os.path.join(self.tmp_dir, "baseline.json")
+        output_path = os.path.join(self.tmp_dir, "results.json")
+        label = "typing_session.get_metrics"
+        args = [label, "--scale", "0.001", "--rounds", "1", "--baseline", baseline_path]
+
+        with redirect_stderr(StringIO()), redirect_stdout(StringIO()):
+            run.main(args + ["--save-baseline"])
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+            self.assertEqual(list(baseline["results"]), [label + "[text_chars=20000]"])
+
+            # A baseline far faster than anything measurable
+            for result in baseline["results"].values():
+                result["relative"] = 1e-12
+            with open(baseline_path, "w") as f:
+                json.dump(baseline, f)
+            with self.assertRaises(SystemExit) as raised:
+                run.main(args + ["--output", output_path])
+            self.assertEqual(raised.exception.code, 1)
+
+            # A run at another scale skips the comparison instead of failing
+            run.main([label, "--scale", "0.0005", "--rounds", "1", "--baseline", baseline_path])
+
+        with open(output_path) as f:
+            self.assertIn(label + "[text_chars=20000]", json.load(f)["results"])
+
+if __name__ == "__main__":
+    unittest.main()
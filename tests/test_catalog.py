@@ -0,0 +1,116 @@
+"""
+Unit tests for the KasongoType exercise catalog
+"""
+
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.catalog import ExerciseCatalog, CatalogError, build_catalog
+from common.typing_engine import ExerciseManager
+
+class TestExerciseCatalog(unittest.TestCase):
+    """Tests for building, reading and reloading catalogs"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.catalog_path = Path(self.tmp_dir) / "exercises.kcat"
+        self.exercises = {"levels": {
+            "beginner": [
+                {"id": "b2", "title": "Top Row", "text": "qwer tyui"},
+                {"id": "b1", "title": "Home Row", "text": "asdf jkl;"},
+                {"id": "b10", "title": "Unicode", "text": "naïve café"}
+            ],
+            "advanced": [{"id": "a%d" % i, "title": "Generated", "text": "x" * i} for i in range(1000)],
+            "empty": []
+        }}
+        build_catalog(self.exercises, self.catalog_path)
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_lookups_match_source(self):
+        """Test that every exercise reads back as it was written"""
+        catalog = ExerciseCatalog(self.catalog_path)
+
+        self.assertEqual(len(catalog), 1003)
+        self.assertEqual(catalog.get_levels(), ["beginner", "advanced", "empty"])
+        self.assertEqual(catalog.get_exercises_by_level("beginner"), self.exercises["levels"]["beginner"])
+        for exercise in self.exercises["levels"]["advanced"]:
+            self.assertEqual(catalog.get_exercise("advanced", exercise["id"]), exercise)
+        self.assertEqual(catalog.get_exercise("beginner", "b10")["text"], "naïve café")
+        self.assertIsNone(catalog.get_exercise("beginner", "a1"))
+        self.assertIsNone(catalog.get_exercise("missing", "b1"))
+
+    def test_exercise_pages(self):
+        """Test that a page of a level decodes only that slice"""
+        catalog = ExerciseCatalog(self.catalog_path)
+        manager = ExerciseManager(str(self.catalog_path))
+        advanced = self.exercises["levels"]["advanced"]
+
+        for source in (catalog, manager):
+            self.assertEqual(source.get_exercises_by_level("advanced", 10, 5), advanced[10:15])
+            self.assertEqual(source.get_exercises_by_level("advanced", 998, 5), advanced[998:])
+            self.assertEqual(source.get_exercises_by_level("advanced", 2000, 5), [])
+            self.assertEqual(source.count_exercises("advanced"), 1000)
+            self.assertEqual(source.count_exercises("missing"), 0)
+
+    def test_random_exercise(self):
+        """Test random selection overall and within a level"""
+        catalog = ExerciseCatalog(self.catalog_path)
+
+        self.assertIn(catalog.get_random_exercise("beginner"), self.exercises["levels"]["beginner"])
+        self.assertIsNotNone(catalog.get_random_exercise())
+        self.assertIsNone(catalog.get_random_exercise("empty"))
+
+    def test_reload_on_change(self):
+        """Test that a rebuilt catalog is swapped in and bumps the version"""
+        catalog = ExerciseCatalog(self.catalog_path, check_interval=0)
+        self.assertFalse(catalog.refresh())
+
+        build_catalog({"levels": {"new": [{"id": "n1", "title": "New", "text": "new text"}]}}, self.catalog_path)
+
+        self.assertEqual(catalog.get_levels(), ["new"])
+        self.assertEqual(catalog.version, 2)
+
+    def test_invalid_file(self):
+        """Test that a file of the wrong format is rejected"""
+        bad_path = Path(self.tmp_dir) / "bad.kcat"
+        bad_path.write_bytes(b"not a catalog at all, just some bytes that are long enough")
+
+        with self.assertRaises(CatalogError):
+            ExerciseCatalog(bad_path)
+
+    def test_exercise_manager_over_catalog(self):
+        """Test that ExerciseManager serves a .kcat path from the catalog"""
+        manager = ExerciseManager(str(self.catalog_path))
+
+        self.assertEqual(manager.get_levels(), ["beginner", "advanced", "empty"])
+        self.assertEqual(manager.get_exercise("beginner", "b1")["title"], "Home Row")
+        self.assertEqual(manager.get_exercise("beginner", "zz")["id"], "not_found")
+        self.assertEqual(manager.get_random_exercise("empty")["id"], "empty")
+
+    def test_exercise_manager_reloads_json(self):
+        """Test that a changed JSON exercises file is picked up"""
+        json_path = Path(self.tmp_dir) / "exercises.json"
+        json_path.write_text(json.dumps(self.exercises))
+        manager = ExerciseManager(str(json_path), check_interval=0)
+        self.assertEqual(manager.version, 1)
+
+        json_path.write_text(json.dumps({"levels": {"new": [{"id": "n1", "title": "New", "text": "abc"}]}}))
+        os.utime(json_path, ns=(0, 10 ** 9))
+
+        self.assertEqual(manager.get_levels(), ["new"])
+        self.assertEqual(manager.version, 2)
+
+if __name__ == "__main__":
+    unittest.main()
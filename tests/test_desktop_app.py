@@ -4,7 +4,10 @@ Unit tests for KasongoType desktop application
 
 import sys
 import os
+import json
+import threading
 import unittest
+from urllib.request import urlopen
 from unittest.mock import MagicMock, patch
 
 # Add parent directory to path for imports
@@ -16,53 +19,146 @@ sys.modules['PyQt5.QtCore'] = MagicMock()
 sys.modules['PyQt5.QtWidgets'] = MagicMock()
 sys.modules['PyQt5.QtGui'] = MagicMock()
 sys.modules['PyQt5.QtWebEngineWidgets'] = MagicMock()
+sys.modules['PyQt5.QtWebEngineCore'] = MagicMock()
+sys.modules['PyQt5.QtWebChannel'] = MagicMock()
 
 # Import after mocking
-from desktop.main import WebServer, check_server_status
+from desktop.bridge import BASE_URL, InProcessClient, InProcessServer
+from desktop.main import WebServer
+
+def hello_app(environ, start_response):
+    """Minimal WSGI app standing in for Flask"""
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"hello"]
+
+def echo_app(environ, start_response):
+    """WSGI app that sets a cookie and echoes the request back"""
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+    body = json.dumps({
+        "method": environ["REQUEST_METHOD"],
+        "path": environ["PATH_INFO"],
+        "query": environ["QUERY_STRING"],
+        "cookie": environ.get("HTTP_COOKIE", ""),
+        "content_type": environ.get("CONTENT_TYPE", ""),
+        "body": environ["wsgi.input"].read(length).decode()
+    }).encode()
+    start_response("201 Created", [("Content-Type", "application/json"), ("Set-Cookie", "session=abc; Path=/"),
+                                   ("Content-Length", str(len(body)))])
+    return [body]
 
 class TestDesktopApp(unittest.TestCase):
     """Tests for the desktop application components"""
 
-    @patch('desktop.main.requests.get')
-    def test_check_server_status_success(self, mock_get):
-        """Test checking server status when server is running"""
-        # Configure mock to simulate successful connection
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_get.return_value = mock_response
-        
-        result = check_server_status()
-        self.assertTrue(result)
-        mock_get.assert_called_once()
-    
-    @patch('desktop.main.requests.get')
-    def test_check_server_status_failure(self, mock_get):
-        """Test checking server status when server is not running"""
-        # Configure mock to simulate connection failure
-        mock_get.side_effect = Exception("Connection failed")
-        
-        result = check_server_status()
-        self.assertFalse(result)
-        mock_get.assert_called_once()
-    
-    @patch('desktop.main.flask_app')
-    def test_web_server_initialization(self, mock_flask_app):
+    def test_web_server_initialization(self):
         """Test WebServer thread initialization"""
         server = WebServer()
         self.assertTrue(server.daemon)  # Should be a daemon thread
+        self.assertFalse(server.ready.is_set())
+        self.assertIsNone(server.url)
+    
+    @patch('desktop.main.flask_app', hello_app)
+    def test_web_server_run(self):
+        """Test that the server signals readiness on a free port and serves"""
+        server = WebServer()
+        server.start()
+        try:
+            self.assertTrue(server.ready.wait(5))
+            self.assertIsNone(server.error)
+            self.assertNotEqual(server.port, 0)
+            self.assertEqual(server.url, f"http://127.0.0.1:{server.port}")
+            
+            # Requests are answered as soon as readiness is signalled
+            with urlopen(server.url + "/", timeout=5) as response:
+                self.assertEqual(response.read(), b"hello")
+        finally:
+            server.shutdown()
+        self.assertFalse(server.is_alive())
     
-    @patch('desktop.main.flask_app')
-    def test_web_server_run(self, mock_flask_app):
-        """Test WebServer thread run method"""
+    @patch('desktop.main.load_flask_app', side_effect=RuntimeError("broken app"))
+    def test_web_server_failure(self, mock_load):
+        """Test that a failed startup still signals, with the error"""
         server = WebServer()
-        server.run()
+        server.start()
+        self.assertTrue(server.ready.wait(5))
+        self.assertIsInstance(server.error, RuntimeError)
+        self.assertIsNone(server.url)
+        server.shutdown()
+
+class TestInProcessBridge(unittest.TestCase):
+    """Tests for serving the app to the web view without a socket"""
+
+    def test_client_keeps_cookies(self):
+        """Test that requests reach the app and the session cookie sticks"""
+        client = InProcessClient(echo_app)
+        status, headers, data = client.request("GET", "/")
+        self.assertEqual(status, 201)
+        self.assertEqual(json.loads(data)["cookie"], "")
+        
+        status, headers, data = client.request("GET", "/api/user/stats?window=5")
+        echoed = json.loads(data)
+        self.assertEqual(echoed["query"], "window=5")
+        self.assertEqual(echoed["cookie"], "session=abc")
+    
+    def test_request_json(self):
+        """Test the reply encoding used by the page's fetch shim"""
+        client = InProcessClient(echo_app)
+        reply = json.loads(client.request_json("POST", "/api/session/start",
+                                               json.dumps({"content-type": "application/json"}), '{"level": "é"}'))
+        self.assertEqual(reply["status"], 201)
+        self.assertEqual(reply["headers"], [["Content-Type", "application/json"]])
+        
+        echoed = json.loads(reply["body"])
+        self.assertEqual(echoed["method"], "POST")
+        self.assertEqual(echoed["content_type"], "application/json")
+        self.assertEqual(echoed["body"], '{"level": "é"}')
+    
+    def test_async_requests(self):
+        """Test that async requests run in order off the calling thread"""
+        client = InProcessClient(echo_app)
+        self.addCleanup(client.close)
+        replies = []
+        done = threading.Event()
+        
+        def collect(reply):
+            replies.append((threading.current_thread(), json.loads(json.loads(reply)["body"])["path"]))
+            if len(replies) == 3:
+                done.set()
+        
+        for path in ("/a", "/b", "/c"):
+            client.request_json_async(collect, "GET", path)
+        self.assertTrue(done.wait(5))
+        self.assertEqual([path for _, path in replies], ["/a", "/b", "/c"])
+        self.assertNotIn(threading.current_thread(), [thread for thread, _ in replies])
+    
+    def test_async_request_error(self):
+        """Test that an app error still answers, so the page is not left waiting"""
+        def broken_app(environ, start_response):
+            raise RuntimeError("broken app")
+        
+        client = InProcessClient(broken_app)
+        results = []
+        client.request_async(results.append, "GET", "/")
+        client.close()
+        self.assertEqual(results, [(500, [], b"")])
+    
+    def test_server_loads_app_in_background(self):
+        """Test that the in-process server signals readiness like WebServer"""
+        server = InProcessServer(lambda: echo_app)
+        server.start()
+        self.assertTrue(server.ready.wait(5))
+        self.assertIsNone(server.error)
+        self.assertEqual(server.url, BASE_URL)
+        self.assertEqual(server.client.request("GET", "/")[0], 201)
+        server.shutdown()
+        
+        def broken():
+            raise RuntimeError("broken app")
         
-        # Verify Flask app was run with correct parameters
-        mock_flask_app.run.assert_called_once_with(
-            host="127.0.0.1",
-            port=5678,
-            debug=False
-        )
+        server = InProcessServer(broken)
+        server.start()
+        self.assertTrue(server.ready.wait(5))
+        self.assertIsInstance(server.error, RuntimeError)
+        self.assertIsNone(server.url)
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
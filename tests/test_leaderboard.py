@@ -0,0 +1,174 @@
+"""
+Unit tests for KasongoType leaderboards
+"""
+
+import sys
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.analytics import UserProfile
+from common.leaderboard import GLOBAL_BOARD, SQLiteLeaderboard, exercise_board, level_board
+
+def verified(wpm, ts=0, exercise_id="b1", level=None, flags=None):
+    """A recorded session as record_session stores it"""
+    session = {"exercise_id": exercise_id, "wpm": wpm, "ts": ts, "verified": not flags}
+    if level is not None:
+        session["level"] = level
+    if flags:
+        session["flags"] = flags
+    return session
+
+class TestLeaderboard(unittest.TestCase):
+    """Tests for the leaderboards shared through SQLite"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.tmp_dir)
+
+    def make(self, capacity=100):
+        leaderboard = SQLiteLeaderboard(os.path.join(self.tmp_dir, "leaderboard.db"), capacity=capacity)
+        self.addCleanup(leaderboard.close)
+        return leaderboard
+
+    def test_top_matches_full_sort(self):
+        """Test that the capped ranking equals sorting every user's best"""
+        rng = random.Random(4)
+        leaderboard = self.make(capacity=10)
+        best = {}
+        for ts in range(2000):
+            user_id = f"user{rng.randrange(200)}"
+            wpm = round(rng.uniform(10, 150), 1)
+            leaderboard.add_session(user_id, verified(wpm, ts))
+            if wpm > best.get(user_id, (0,))[0]:
+                best[user_id] = (wpm, ts)
+
+        expected = sorted(best.items(), key=lambda item: (-item[1][0], item[1][1], item[0]))[:10]
+        top = leaderboard.top()
+        self.assertEqual([(entry["user_id"], entry["wpm"]) for entry in top],
+                         [(user_id, wpm) for user_id, (wpm, _) in expected])
+        self.assertEqual([entry["rank"] for entry in top], list(range(1, 11)))
+        self.assertEqual(len(leaderboard.top(limit=3)), 3)
+
+    def test_boards_and_eligibility(self):
+        """Test level and exercise boards, and that flagged sessions are skipped"""
+        leaderboard = self.make()
+        leaderboard.add_session("alice", verified(60, level="beginner"))
+        leaderboard.add_session("bob", verified(80))
+        leaderboard.add_session("carol", verified(200, flags=["wpm_too_high"]))
+        leaderboard.add_session("dave", {"exercise_id": "b1", "wpm": 90, "ts": 0})
+
+        self.assertEqual([entry["user_id"] for entry in leaderboard.top()], ["bob", "alice"])
+        self.assertEqual([entry["user_id"] for entry in leaderboard.top(level_board("beginner"))], ["alice"])
+        self.assertEqual(len(leaderboard.top(exercise_board("beginner", "b1"))), 1)
+        self.assertEqual(leaderboard.top(level_board("advanced")), [])
+
+    def test_percentile(self):
+        """Test percentile ranks, also for users outside the top entries"""
+        leaderboard = self.make(capacity=2)
+        for i in range(100):
+            leaderboard.add_session(f"user{i}", verified(i + 0.5))
+
+        slowest = leaderboard.percentile("user0")
+        self.assertEqual(slowest["percentile"], 0.5)
+        self.assertIsNone(slowest["rank"])
+        self.assertEqual(slowest["users"], 100)
+        self.assertEqual(leaderboard.percentile("user99")["rank"], 1)
+        self.assertEqual(leaderboard.percentile("user49")["percentile"], 49.5)
+
+        # Improving moves the user up in place rather than counting them twice
+        leaderboard.add_session("user0", verified(120))
+        self.assertEqual(leaderboard.percentile("user0")["rank"], 1)
+        self.assertEqual(leaderboard.percentile("user0")["users"], 100)
+        self.assertIsNone(leaderboard.percentile("nobody"))
+        self.assertIsNone(leaderboard.percentile("user0", level_board("beginner")))
+
+    def test_bucket_counts(self):
+        """Test that bucket counts follow every change to the scores"""
+        leaderboard = self.make()
+        rng = random.Random(20)
+        best = {}
+        for ts in range(500):
+            user_id = f"user{rng.randrange(50)}"
+            wpm = round(rng.uniform(0, 400), 1)
+            leaderboard.add_session(user_id, verified(wpm, ts))
+            best[user_id] = max(best.get(user_id, 0), wpm)
+
+        for user_id, wpm in best.items():
+            bucket = min(int(wpm), 299)
+            below = sum(1 for other in best.values() if min(int(other), 299) < bucket)
+            same = sum(1 for other in best.values() if min(int(other), 299) == bucket)
+            self.assertEqual(leaderboard.percentile(user_id)["percentile"],
+                             round(100 * (below + same / 2) / len(best), 1))
+
+        # A database from before the counts existed gets them on opening
+        conn = leaderboard._connection()
+        conn.execute("DELETE FROM score_buckets")
+        conn.execute("DELETE FROM meta WHERE key = 'buckets'")
+        reopened = SQLiteLeaderboard(leaderboard.db_path)
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.percentile("user0"), leaderboard.percentile("user0"))
+        self.assertEqual(reopened.percentile("user0")["users"], len(best))
+
+    def test_shared_between_processes(self):
+        """Test that boards opened on the same file agree"""
+        first = self.make()
+        second = self.make()
+        first.add_session("alice", verified(60))
+        second.add_session("bob", verified(80))
+        first.add_session("bob", verified(70))
+
+        self.assertEqual([(entry["user_id"], entry["wpm"]) for entry in first.top()], [("bob", 80), ("alice", 60)])
+        self.assertEqual(second.percentile("alice")["rank"], 2)
+
+class TestLeaderboardProfiles(unittest.TestCase):
+    """Tests for feeding leaderboards from recorded sessions"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.profiles_path = os.path.join(self.tmp_dir, "user_profiles.json")
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_record_session_feeds_leaderboard(self):
+        """Test that recording updates the boards and seeding from profiles agrees"""
+        leaderboard = SQLiteLeaderboard(os.path.join(self.tmp_dir, "leaderboard.db"))
+        self.addCleanup(leaderboard.close)
+        profile = UserProfile("test_user", data_path=self.profiles_path)
+        verification = {"verified": True, "flags": [], "char_count": 50, "errors": 0, "total_keystrokes": 50}
+        profile.record_session("b1", 55.0, 100.0, 10.0, verification=verification,
+                               level="beginner", leaderboard=leaderboard)
+        profile.record_session("b2", 70.0, 100.0, 10.0, leaderboard=leaderboard)
+
+        self.assertEqual(leaderboard.top()[0]["wpm"], 55.0)
+        self.assertEqual(leaderboard.top(exercise_board("beginner", "b1"))[0]["user_id"], "test_user")
+
+        seeded = SQLiteLeaderboard(os.path.join(self.tmp_dir, "seeded.db"))
+        self.addCleanup(seeded.close)
+        self.assertFalse(seeded.seeded)
+        seeded.seed(profile.store.iter_profiles())
+        self.assertTrue(seeded.seeded)
+        self.assertEqual(seeded.top(GLOBAL_BOARD), leaderboard.top(GLOBAL_BOARD))
+        self.assertEqual(seeded.top(level_board("beginner")), leaderboard.top(level_board("beginner")))
+        self.assertEqual(seeded.percentile("test_user", exercise_board("beginner", "b1")),
+                         leaderboard.percentile("test_user", exercise_board("beginner", "b1")))
+
+        seeded.clear()
+        self.assertFalse(seeded.seeded)
+        self.assertEqual(seeded.top(), [])
+        self.assertIsNone(seeded.percentile("test_user"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Unit tests for KasongoType bulk re-scoring
+"""
+
+import sys
+import os
+import copy
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import rescore
+from common.analytics import UserProfile, _empty_stats
+from common.rescore import rescore_chunk, rescore_store
+from common.storage import JsonFileStore, SessionLogStore
+
+def make_profile(session_count, rng):
+    """A profile with random sessions, some flagged and some with raw counts"""
+    sessions = []
+    for i in range(session_count):
+        session = {
+            "timestamp": "2026-01-01T00:00:00",
+            "ts": 1767225600000 + i * 1000,
+            "exercise_id": "b1",
+            "wpm": round(rng.uniform(20, 120), 1),
+            "accuracy": round(rng.uniform(80, 100), 1),
+            "time_elapsed": rng.uniform(10, 60)
+        }
+        if rng.random() < 0.2:
+            session["flags"] = ["too_regular"]
+        sessions.append(session)
+    return {"created_at": "2026-01-01T00:00:00", "sessions": sessions, "stats": _empty_stats()}
+
+class TestRescore(unittest.TestCase):
+    """Tests for recomputing scores and aggregates in bulk"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.profiles_path = os.path.join(self.tmp_dir, "user_profiles.json")
+        self.checkpoint_path = os.path.join(self.tmp_dir, "rescore.json")
+
+    def tearDown(self):
+        """Clean up after each test"""
+        shutil.rmtree(self.tmp_dir)
+
+    def assertStatsEqual(self, actual, expected):
+        for key, value in expected.items():
+            if key == "rolling":
+                for window, rolling in value.items():
+                    for field, number in rolling.items():
+                        self.assertAlmostEqual(actual[key][window][field], number, places=6)
+            else:
+                self.assertAlmostEqual(actual[key], value, places=6, msg=key)
+
+    def test_matches_rebuild_stats(self):
+        """Test that vectorized aggregates equal replaying each profile"""
+        rng = random.Random(3)
+        profiles = [make_profile(count, rng) for count in (0, 1, 9, 10, 11, 120, 3)]
+        expected = copy.deepcopy(profiles)
+        for profile in expected:
+            UserProfile.rebuild_stats(profile)
+
+        rescore_chunk(profiles)
+        for profile, reference in zip(profiles, expected):
+            self.assertStatsEqual(profile["stats"], reference["stats"])
+
+        with patch.object(rescore, "np", None):
+            fallback = copy.deepcopy(expected)
+            rescore_chunk(fallback)
+        self.assertEqual(fallback, expected)
+
+    def test_rescores_sessions_with_raw_counts(self):
+        """Test that sessions keeping raw counts get their score recomputed"""
+        profile = make_profile(2, random.Random(1))
+        session = profile["sessions"][0]
+        session.update({"wpm": 1.0, "accuracy": 1.0, "time_elapsed": 60.0,
+                        "char_count": 250, "total_keystrokes": 260, "errors": 13})
+        legacy = dict(profile["sessions"][1])
+
+        rescore_chunk([profile])
+        self.assertEqual(session["wpm"], 50.0)
+        self.assertEqual(session["accuracy"], 95.0)
+        self.assertEqual(profile["sessions"][1], legacy)
+        self.assertEqual(profile["stats"]["best_wpm"], max(50.0, legacy["wpm"]))
+
+    def test_resumes_from_checkpoint(self):
+        """Test that a run interrupted between chunks continues where it stopped"""
+        rng = random.Random(5)
+        store = JsonFileStore(self.profiles_path)
+        store.save_many([(f"user{i}", make_profile(5, rng)) for i in range(10)])
+
+        calls = []
+        real_save_many = store.save_many
+
+        def failing_save_many(batch):
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            calls.append(batch)
+            real_save_many(batch)
+
+        with patch.object(store, "save_many", failing_save_many):
+            with self.assertRaises(KeyboardInterrupt):
+                rescore_store(store, self.checkpoint_path, chunk_size=3)
+        with open(self.checkpoint_path) as f:
+            self.assertEqual(json.load(f)["done"], 6)
+
+        self.assertEqual(rescore_store(store, self.checkpoint_path, chunk_size=3), 4)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+        for _, profile in store.iter_profiles():
+            self.assertEqual(profile["stats"]["session_count"], 5)
+
+    def test_log_store_compacts_once(self):
+        """Test that a rescore of the log store folds its log in once, at the end"""
+        rng = random.Random(7)
+        store = SessionLogStore(self.profiles_path, compact_every=4)
+        store.save_many([(f"user{i}", make_profile(5, rng)) for i in range(10)])
+        generation = json.loads(store.snapshot_path.read_bytes().split(b"\n", 1)[0])["generation"]
+        
+        self.assertEqual(rescore_store(store, self.checkpoint_path, chunk_size=3), 10)
+        with open(store.snapshot_path, "rb") as f:
+            self.assertEqual(json.loads(f.readline())["generation"], generation + 1)
+        self.assertEqual(len(store.log_path.read_bytes().splitlines()), 1)
+        self.assertEqual(store.compact_every, 4)
+        
+        profiles = dict(SessionLogStore(self.profiles_path).iter_profiles())
+        self.assertEqual(len(profiles), 10)
+        for profile in profiles.values():
+            self.assertEqual(profile["stats"]["session_count"], 5)
+
+if __name__ == "__main__":
+    unittest.main()
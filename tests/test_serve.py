@@ -0,0 +1,133 @@
+"""
+Unit tests for the KasongoType production server launcher
+"""
+
+import sys
+import os
+import time
+import socket
+import argparse
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web import serve
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+def slow_app(environ, start_response):
+    """WSGI app that takes a while to answer"""
+    time.sleep(0.3)
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", "4")])
+    return [b"done"]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class TestServe(unittest.TestCase):
+    """Tests for choosing and configuring the production server"""
+
+    def test_worker_session_store(self):
+        """Test that several workers get a shared session store"""
+        with patch.dict(os.environ, {}, clear=True):
+            serve.configure_stores(1)
+            self.assertNotIn("KASONGOTYPE_SESSION_STORE", os.environ)
+            serve.configure_stores(4)
+            self.assertEqual(os.environ["KASONGOTYPE_SESSION_STORE"], "sqlite")
+
+        with patch.dict(os.environ, {"KASONGOTYPE_SESSION_STORE": "memory"}):
+            with self.assertRaises(ValueError):
+                serve.configure_stores(4)
+
+    def test_session_streams(self):
+        """Test that only uvicorn keeps WebSocket session streams"""
+        with patch.dict(os.environ, {}, clear=True):
+            serve.configure_streams("uvicorn")
+            self.assertNotIn("KASONGOTYPE_SESSION_STREAMS", os.environ)
+            for server in ("gunicorn", "waitress"):
+                serve.configure_streams(server)
+                self.assertEqual(os.environ["KASONGOTYPE_SESSION_STREAMS"], "off")
+
+    def test_gunicorn_config(self):
+        """Test that the launcher options reach gunicorn's settings"""
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            self.skipTest("gunicorn is not installed")
+
+        options = argparse.Namespace(host="127.0.0.1", port=8123, workers=3, threads=4, keep_alive=7,
+                                     graceful_timeout=11, timeout=60)
+        applications = []
+        with patch.object(BaseApplication, "run", lambda application: applications.append(application)):
+            serve.serve_gunicorn(options)
+
+        cfg = applications[0].cfg
+        self.assertEqual(cfg.bind, ["127.0.0.1:8123"])
+        self.assertEqual((cfg.workers, cfg.threads, cfg.keepalive, cfg.graceful_timeout), (3, 4, 7, 11))
+        self.assertEqual(cfg.worker_class_str, "gthread")
+        self.assertFalse(cfg.preload_app)
+
+    def test_uvicorn_config(self):
+        """Test that uvicorn serves the ASGI app with the launcher options"""
+        try:
+            import uvicorn
+        except ImportError:
+            self.skipTest("uvicorn is not installed")
+
+        options = argparse.Namespace(host="127.0.0.1", port=8123, workers=1, keep_alive=7, graceful_timeout=11)
+        with patch.object(uvicorn, "run") as run:
+            serve.serve_uvicorn(options)
+
+        args, kwargs = run.call_args
+        self.assertEqual(args, ("web.asgi:app",))
+        self.assertTrue(os.path.isfile(os.path.join(kwargs["app_dir"], "web", "asgi.py")))
+        self.assertEqual((kwargs["port"], kwargs["timeout_keep_alive"], kwargs["timeout_graceful_shutdown"]),
+                         (8123, 7, 11))
+
+    @unittest.skipIf(waitress is None, "waitress is not installed")
+    def test_waitress_drains_on_stop(self):
+        """Test that a request in flight when stopping still gets its response"""
+        options = argparse.Namespace(host="127.0.0.1", port=free_port(), threads=2, keep_alive=5, graceful_timeout=5)
+        stop = threading.Event()
+        thread = threading.Thread(target=serve.serve_waitress, args=(slow_app, options, stop))
+        thread.start()
+        try:
+            for _ in range(50):
+                try:
+                    client = socket.create_connection((options.host, options.port), timeout=5)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+            client.sendall(b"GET / HTTP/1.1\r\nHost: test\r\n\r\n")
+            time.sleep(0.1)
+            stop.set()
+
+            response = b""
+            while not response.endswith(b"done"):
+                chunk = client.recv(4096)
+                if not chunk:
+                    break
+                response += chunk
+            client.close()
+        finally:
+            stop.set()
+            thread.join(10)
+
+        self.assertTrue(response.startswith(b"HTTP/1.1 200"))
+        self.assertTrue(response.endswith(b"done"))
+        self.assertFalse(thread.is_alive())
+
+        # Nothing listens once the server has drained
+        with self.assertRaises(OSError):
+            socket.create_connection((options.host, options.port), timeout=1).close()
+
+if __name__ == "__main__":
+    unittest.main()
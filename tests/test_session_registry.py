@@ -0,0 +1,178 @@
+"""
+Unit tests for the KasongoType active session registry
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.session_registry import SessionRegistry, SQLiteSessionBackend
+from common.typing_engine import TypingSession
+
+class TestSessionRegistry(unittest.TestCase):
+    """Tests for expiry, eviction and accounting of active sessions"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.registry = SessionRegistry(ttl=60, max_sessions=2, start_reaper=False)
+    
+    def test_dict_operations(self):
+        """Test the dict-like interface used by the web app"""
+        typing_session = TypingSession("abc", "test_user")
+        self.registry["s1"] = typing_session
+        
+        self.assertIn("s1", self.registry)
+        self.assertIs(self.registry["s1"], typing_session)
+        self.assertIs(self.registry.pop("s1"), typing_session)
+        self.assertNotIn("s1", self.registry)
+        self.assertIsNone(self.registry.get("s1"))
+        with self.assertRaises(KeyError):
+            self.registry["s1"]
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used session is evicted at the cap"""
+        self.registry["s1"] = TypingSession("abc", "test_user")
+        self.registry["s2"] = TypingSession("abc", "test_user")
+        self.registry.get("s1")
+        self.registry["s3"] = TypingSession("abc", "test_user")
+        
+        self.assertIn("s1", self.registry)
+        self.assertNotIn("s2", self.registry)
+        self.assertEqual(self.registry.evicted, 1)
+    
+    def test_idle_expiry(self):
+        """Test that idle sessions are reaped"""
+        self.registry["s1"] = TypingSession("abc", "test_user")
+        
+        self.assertEqual(self.registry.reap(time.monotonic() + 30), 0)
+        self.assertEqual(self.registry.reap(time.monotonic() + 61), 1)
+        self.assertEqual(len(self.registry), 0)
+        self.assertEqual(self.registry.expired, 1)
+    
+    def test_memory_accounting(self):
+        """Test that approximate bytes grow with recorded keystrokes"""
+        typing_session = TypingSession("abc" * 100, "test_user")
+        self.registry["s1"] = typing_session
+        before = self.registry.stats()["approx_bytes"]
+        
+        for key in "abc" * 50:
+            typing_session.process_keystroke(key)
+        
+        stats = self.registry.stats()
+        self.assertEqual(stats["live_sessions"], 1)
+        self.assertGreater(stats["approx_bytes"], before)
+
+class TestSQLiteSessionBackend(unittest.TestCase):
+    """Tests for sessions shared between processes through SQLite"""
+
+    def setUp(self):
+        """Set up test environment before each test"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, "sessions.db")
+        self.registry = self.open_registry()
+    
+    def tearDown(self):
+        """Clean up after each test"""
+        self.registry.close()
+        shutil.rmtree(self.tmp_dir)
+    
+    def open_registry(self):
+        return SessionRegistry(ttl=60, max_sessions=2, start_reaper=False,
+                               backend=SQLiteSessionBackend(self.db_path))
+    
+    def test_checkout_writes_back(self):
+        """Test that changes made in a checkout are seen by another worker"""
+        self.registry["s1"] = TypingSession("abc", "test_user")
+        with self.registry.checkout("s1") as typing_session:
+            typing_session.process_keystroke("a")
+            typing_session.process_keystroke("b")
+        
+        other = self.open_registry()
+        try:
+            typing_session = other["s1"]
+            self.assertEqual(typing_session.current_position, 2)
+            self.assertEqual(typing_session.keystroke_count, 2)
+        finally:
+            other.close()
+    
+    def test_popped_session_is_not_written_back(self):
+        """Test that finishing a session inside a checkout removes it for good"""
+        self.registry["s1"] = TypingSession("abc", "test_user")
+        with self.registry.checkout("s1") as typing_session:
+            typing_session.process_keystroke("a")
+            self.registry.pop("s1")
+        
+        self.assertNotIn("s1", self.registry)
+        with self.registry.checkout("missing") as typing_session:
+            self.assertIsNone(typing_session)
+    
+    def test_keystrokes_are_appended(self):
+        """Test that a session grows by its new keystrokes and reads back whole"""
+        backend = SQLiteSessionBackend(self.db_path, max_tail=8)
+        registry = SessionRegistry(ttl=60, start_reaper=False, backend=backend)
+        self.addCleanup(registry.close)
+        expected = TypingSession("abcd" * 10, "test_user")
+        registry["s1"] = TypingSession("abcd" * 10, "test_user")
+        
+        for i, key in enumerate(list("abxcd" * 4) + ["Shift", "a"]):
+            expected.process_keystroke(key, timestamp=100 + i * 0.1)
+            with registry.checkout("s1") as typing_session:
+                typing_session.process_keystroke(key, timestamp=100 + i * 0.1)
+            tail_rows = backend._connection().execute("SELECT COUNT(*) FROM session_keystrokes").fetchone()[0]
+            self.assertLessEqual(tail_rows, 8)
+        
+        restored = self.registry["s1"]
+        self.assertEqual(restored.to_bytes(), expected.to_bytes())
+        self.assertEqual(list(restored.iter_keystrokes()), list(expected.iter_keystrokes()))
+        
+        self.registry.pop("s1")
+        self.assertEqual(backend._connection().execute("SELECT COUNT(*) FROM session_keystrokes").fetchone()[0], 0)
+    
+    def test_checkouts_hold_one_session(self):
+        """Test that a checkout only makes others wait for the same session"""
+        self.registry["s1"] = TypingSession("abc", "test_user")
+        self.registry["s2"] = TypingSession("abc", "test_user")
+        other = self.open_registry()
+        self.addCleanup(other.close)
+        waited = []
+        
+        def type_into(session_id):
+            started = time.monotonic()
+            with other.checkout(session_id) as typing_session:
+                typing_session.process_keystroke("a")
+            waited.append(time.monotonic() - started)
+        
+        with self.registry.checkout("s1") as typing_session:
+            typing_session.process_keystroke("a")
+            type_into("s2")
+            thread = threading.Thread(target=type_into, args=("s1",))
+            thread.start()
+            time.sleep(0.2)
+        thread.join()
+        
+        self.assertLess(waited[0], 0.1)
+        self.assertGreaterEqual(waited[1], 0.1)
+        self.assertEqual(self.registry["s1"].keystroke_count, 2)
+        self.assertEqual(self.registry["s2"].keystroke_count, 1)
+    
+    def test_expiry_and_eviction(self):
+        """Test the ttl and size cap on the shared table"""
+        self.registry["s1"] = TypingSession("abc", "test_user")
+        self.registry["s2"] = TypingSession("abc", "test_user")
+        self.registry["s3"] = TypingSession("abc", "test_user")
+        
+        self.assertEqual(len(self.registry), 2)
+        self.assertNotIn("s1", self.registry)
+        self.assertEqual(self.registry.evicted, 1)
+        self.assertEqual(self.registry.reap(time.time() + 61), 2)
+        self.assertEqual(len(self.registry), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,9 +4,12 @@ Unit tests for KasongoType typing engine
 
 import sys
 import os
+import json
+import random
 import unittest
 import time
 from pathlib import Path
+from unittest.mock import patch
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -81,28 +84,163 @@ class TestTypingEngine(unittest.TestCase):
         self.assertTrue(result["complete"])
         self.assertIsNotNone(session.end_time)
     
+    def test_process_keystroke_batch(self):
+        """Test processing an ordered batch of keystrokes"""
+        session = TypingSession("abc", "test_user")
+        session.start_time = time.time() - 10
+        now_ms = time.time() * 1000
+        
+        result = session.process_keystrokes([
+            {"key": "a", "timestamp": now_ms - 200},
+            {"key": "x", "timestamp": now_ms - 100},
+            {"key": "b", "timestamp": now_ms}
+        ])
+        
+        self.assertFalse(result["complete"])
+        self.assertEqual(result["position"], 2)
+        self.assertEqual(result["processed"], 3)
+        self.assertEqual(result["batch_errors"], 1)
+        self.assertEqual(session.errors, 1)
+        self.assertEqual(len(session.keystrokes), 3)
+        
+        # Client spacing is preserved on the server clock
+        timestamps = [k["timestamp"] for k in session.keystrokes]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertAlmostEqual(timestamps[2] - timestamps[0], 0.2, delta=0.05)
+    
+    def test_process_keystroke_batch_stops_on_completion(self):
+        """Test that keys after completion are ignored"""
+        session = TypingSession("ab", "test_user")
+        result = session.process_keystrokes([{"key": c} for c in "abcd"])
+        
+        self.assertTrue(result["complete"])
+        self.assertEqual(result["processed"], 2)
+        self.assertEqual(result["ignored"], 2)
+    
+    def test_invalid_keystroke_batch(self):
+        """Test that a malformed batch is rejected without side effects"""
+        session = TypingSession("abc", "test_user")
+        
+        with self.assertRaises(ValueError):
+            session.process_keystrokes([{"key": "a"}, {"key": "bc"}])
+        with self.assertRaises(ValueError):
+            session.process_keystrokes([{"key": "a", "timestamp": 20}, {"key": "b", "timestamp": 10}])
+        
+        self.assertEqual(session.current_position, 0)
+        self.assertEqual(len(session.keystrokes), 0)
+    
+    def test_compact_keystroke_log(self):
+        """Test that the compact keystroke log still yields the old dict shape"""
+        session = TypingSession("ab", "test_user")
+        session.process_keystroke("a", timestamp=1.5)
+        session.process_keystroke("Shift", timestamp=2.5)
+        
+        self.assertEqual(session.keystroke_count, 2)
+        self.assertEqual(session.keystrokes, [
+            {"key": "a", "timestamp": 1.5},
+            {"key": "Shift", "timestamp": 2.5}
+        ])
+        with self.assertRaises(AttributeError):
+            session.unexpected_attribute = True
+    
+    def test_serialized_state_round_trip(self):
+        """Test that a session restored from bytes matches the original"""
+        session = TypingSession("héllo", "test_user")
+        session.process_keystroke("h", timestamp=1.5)
+        session.process_keystroke("Shift", timestamp=2.5)
+        session.process_keystroke("x", timestamp=3.5)
+        
+        restored = TypingSession.from_bytes(session.to_bytes())
+        self.assertEqual(restored.text, session.text)
+        self.assertEqual(restored.user_id, session.user_id)
+        self.assertEqual(restored.start_time, session.start_time)
+        self.assertEqual(restored.current_position, 1)
+        self.assertEqual(restored.errors, session.errors)
+        self.assertEqual(restored.keystrokes, session.keystrokes)
+    
+    def test_interval_stats(self):
+        """Test streaming interval analytics as keystrokes arrive"""
+        session = TypingSession("abcdefghijklmnop", "test_user")
+        for i, key in enumerate("abcdefghijkl"):
+            session.process_keystroke(key, timestamp=100 + i * 0.1)
+        session.process_keystroke("x", timestamp=105.0)
+        session.process_keystroke("m", timestamp=105.2)
+        
+        summary = session.intervals.summary()
+        self.assertEqual(summary["interval_count"], 12)
+        self.assertEqual(summary["pauses"], 1)
+        self.assertEqual(sum(summary["histogram"]), 12)
+        self.assertEqual(summary["correct_keystrokes"], 13)
+        self.assertAlmostEqual(summary["burst_wpm"], 120.0, places=0)
+        self.assertAlmostEqual(summary["char_latency_ms"]["b"], 100.0, places=3)
+        self.assertGreater(summary["consistency"], 0)
+        
+        restored = TypingSession.from_bytes(session.to_bytes())
+        self.assertEqual(restored.intervals.summary(), summary)
+        restored.process_keystroke("n", timestamp=105.3)
+        self.assertEqual(restored.intervals.count, 13)
+    
+    def test_batches_keep_client_spacing(self):
+        """Test that batches arriving with jitter keep the client's key spacing"""
+        text = "asdf jkl; " * 100
+        session = TypingSession(text, "test_user")
+        rng = random.Random(16)
+        start = session.start_time + 1
+        
+        # Five keys 100 ms apart per batch, each arriving up to 200 ms late
+        for first in range(0, len(text), 5):
+            batch = [{"key": key, "timestamp": (first + i) * 100} for i, key in enumerate(text[first:first + 5])]
+            arrival = start + batch[-1]["timestamp"] / 1000 + rng.uniform(0, 0.2)
+            with patch.object(time, "time", return_value=arrival):
+                session.process_keystrokes(batch)
+            session = TypingSession.from_bytes(session.to_bytes())
+        
+        _, timestamps = session.keystroke_arrays()
+        intervals = [later - earlier for earlier, later in zip(timestamps, timestamps[1:])]
+        # Only a gap between batches shrinks, when one arrives less late than any before
+        shifted = [interval for interval in intervals if abs(interval - 0.1) > 1e-6]
+        self.assertLessEqual(len(shifted), 5)
+        self.assertGreater(min(intervals), 0.01)
+        self.assertLess(session.intervals.summary()["burst_wpm"], 150)
+    
     def test_metrics_calculation(self):
         """Test calculating typing metrics"""
         # Create a session with controlled timing
         session = TypingSession("test", "test_user")
-        session.start_time = time.time() - 60  # Started 60 seconds ago
+        start = time.time() - 60
         
-        # Simulate typing 'test' correctly
-        session.process_keystroke("t")
-        session.process_keystroke("e")
-        session.process_keystroke("s")
-        session.process_keystroke("t")
+        # Simulate typing 'test' correctly over 60 seconds, the clock
+        # starting at the first keystroke
+        for i, key in enumerate("test"):
+            session.process_keystroke(key, timestamp=start + i * 20)
         
         # Get metrics
         metrics = session.get_metrics()
         
         # 4 characters in 60 seconds = 4/5 words in 1 minute = 0.8 WPM
-        # With rounding, this should be 0.8 or 1.0 depending on exact timing
-        self.assertLessEqual(abs(metrics.wpm - 0.8), 0.3)
+        self.assertEqual(metrics.wpm, 0.8)
         self.assertEqual(metrics.accuracy, 100.0)
         self.assertEqual(metrics.errors, 0)
         self.assertEqual(metrics.characters_typed, 4)
     
+    def test_metrics_snapshot_cached(self):
+        """Test that metrics are reused until the next keystroke"""
+        session = TypingSession("test", "test_user")
+        session.process_keystroke("t", timestamp=session.start_time + 1)
+        
+        metrics = session.get_metrics()
+        self.assertIs(session.get_metrics(), metrics)
+        self.assertIs(metrics.to_dict(), metrics.to_dict())
+        self.assertEqual(metrics.to_dict()["char_count"], 1)
+        # Timed from the first keystroke
+        self.assertEqual(metrics.time_elapsed, 0)
+        
+        session.process_keystroke("x", timestamp=session.start_time + 1)
+        self.assertIsNot(session.get_metrics(), metrics)
+        self.assertEqual(session.get_metrics().errors, 1)
+        with self.assertRaises(AttributeError):
+            metrics.unexpected_attribute = True
+    
     def test_exercise_manager_initialization(self):
         """Test that ExerciseManager initializes correctly"""
         # Check that default exercises were created
@@ -130,6 +268,23 @@ class TestTypingEngine(unittest.TestCase):
         self.assertIn("id", exercise)
         self.assertIn("title", exercise)
         self.assertIn("text", exercise)
+    
+    def test_exercise_index(self):
+        """Test indexed lookups and random selection on a larger catalog"""
+        catalog = {"levels": {
+            "generated": [{"id": f"g{i}", "title": f"Generated {i}", "text": "abc"} for i in range(5000)],
+            "empty": []
+        }}
+        with open(self.test_exercises_path, "w") as f:
+            json.dump(catalog, f)
+        manager = ExerciseManager(str(self.test_exercises_path))
+        
+        self.assertEqual(manager.get_exercise("generated", "g4321")["title"], "Generated 4321")
+        self.assertEqual(manager.get_exercise("empty", "g4321")["id"], "not_found")
+        self.assertEqual(len(manager.get_exercises_by_level("generated")), 5000)
+        self.assertTrue(manager.get_random_exercise()["id"].startswith("g"))
+        self.assertTrue(manager.get_random_exercise("generated")["id"].startswith("g"))
+        self.assertEqual(manager.get_random_exercise("empty")["id"], "empty")
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Unit tests for KasongoType session verification
+"""
+
+import sys
+import os
+import random
+import threading
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import verification
+from common.typing_engine import TypingSession
+from common.verification import SessionVerifier, replay_keystrokes, verify_keystrokes
+
+def typed_session(text, keys, interval=0.12, jitter=0.04, seed=1):
+    """A session that typed keys at a human-looking pace"""
+    rng = random.Random(seed)
+    session = TypingSession(text, "test_user")
+    timestamp = session.start_time
+    for key in keys:
+        timestamp += interval + rng.uniform(-jitter, jitter)
+        session.process_keystroke(key, timestamp=timestamp)
+    return session
+
+class TestVerification(unittest.TestCase):
+    """Tests for replaying and vetting recorded keystrokes"""
+
+    def test_replay_matches_session(self):
+        """Test that the replay agrees with the live session on every path"""
+        rng = random.Random(7)
+        text = "the quick brown fox jumps over the lazy dog " * 20
+        keys = []
+        for char in text:
+            while rng.random() < 0.1:
+                keys.append(rng.choice("xyz"))
+            keys.append(char)
+        keys.extend("extra")
+        session = typed_session(text, keys)
+        key_codes, timestamps = session.keystroke_arrays()
+
+        expected = (session.current_position, session.errors)
+        self.assertEqual(replay_keystrokes(text, key_codes), expected)
+        with patch.object(verification, "np", None):
+            self.assertEqual(replay_keystrokes(text, key_codes), expected)
+
+        result = verify_keystrokes(text, session.start_time, key_codes, timestamps)
+        metrics = session.get_metrics()
+        self.assertEqual(result["wpm"], metrics.wpm)
+        self.assertEqual(result["accuracy"], metrics.accuracy)
+        self.assertTrue(result["verified"])
+
+    def test_flags(self):
+        """Test that pasted, machine-steady or misreported sessions are flagged"""
+        text = "asdf jkl; " * 10
+        pasted = typed_session(text, text, interval=0.001, jitter=0)
+        result = verify_keystrokes(text, pasted.start_time, *pasted.keystroke_arrays())
+        self.assertIn("impossible_intervals", result["flags"])
+        self.assertIn("wpm_too_high", result["flags"])
+        self.assertFalse(result["verified"])
+
+        steady = typed_session(text, text, interval=0.1, jitter=0)
+        result = verify_keystrokes(text, steady.start_time, *steady.keystroke_arrays())
+        self.assertEqual(result["flags"], ["too_regular"])
+
+        empty = TypingSession(text, "test_user")
+        result = verify_keystrokes(text, empty.start_time, *empty.keystroke_arrays())
+        self.assertEqual(result["flags"], ["no_keystrokes"])
+
+    def test_verifier_runs_in_background(self):
+        """Test that the pool verifies off the calling thread and reports back"""
+        verifier = SessionVerifier(max_workers=1)
+        results = []
+        threads = []
+
+        def on_verified(result):
+            results.append(result)
+            threads.append(threading.current_thread())
+
+        try:
+            future = verifier.submit(typed_session("abc", "abc"), on_verified=on_verified)
+            verifier.drain()
+        finally:
+            verifier.close()
+
+        self.assertEqual(future.result()["char_count"], 3)
+        self.assertEqual(len(results), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -7,13 +7,28 @@ import os
 import unittest
 import json
 import tempfile
+import threading
 from pathlib import Path
+from unittest.mock import PropertyMock, patch
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from web.app import app as flask_app
-from common.typing_engine import ExerciseManager
+# Whatever the app opens on import stays out of the shipped common/data
+_data_dir = tempfile.TemporaryDirectory()
+os.environ['KASONGOTYPE_DATA_DIR'] = _data_dir.name
+
+from web.app import (app as flask_app, adaptive_generator, exercise_manager, handle_stream_message,
+                     record_verified_session, session_verifier)
+from common.adaptive import AdaptiveGenerator
+from common.analytics import ProfileCache, UserProfile
+from common.leaderboard import SQLiteLeaderboard, leaderboard_path_for
+from common.storage import create_store
+
+def tearDownModule():
+    _data_dir.cleanup()
+from common.typing_engine import ExerciseManager, TypingSession
+from common.verification import verify_keystrokes
 
 class TestWebApp(unittest.TestCase):
     """Tests for the Flask web application"""
@@ -29,7 +44,6 @@ class TestWebApp(unittest.TestCase):
         
         # Create temporary files for testing
         self.exercises_fd, self.exercises_path = tempfile.mkstemp(suffix='.json')
-        self.profiles_fd, self.profiles_path = tempfile.mkstemp(suffix='.json')
         
         # Create test exercises
         test_exercises = {
@@ -47,9 +61,15 @@ class TestWebApp(unittest.TestCase):
         with os.fdopen(self.exercises_fd, 'w') as f:
             json.dump(test_exercises, f)
         
-        # Create empty profiles file
-        with os.fdopen(self.profiles_fd, 'w') as f:
-            json.dump({}, f)
+        # Give each test its own profiles and leaderboards
+        self.data_dir = tempfile.TemporaryDirectory()
+        self.profiles_path = os.path.join(self.data_dir.name, 'user_profiles.json')
+        self.profile_store = create_store(flask_app.config['PROFILE_STORE'], self.profiles_path)
+        self.profile_cache = ProfileCache(self.profile_store, data_path=self.profiles_path)
+        self.leaderboard = SQLiteLeaderboard(leaderboard_path_for(self.profiles_path))
+        self.stores = patch.multiple('web.app', profile_store=self.profile_store,
+                                     profile_cache=self.profile_cache, leaderboard=self.leaderboard)
+        self.stores.start()
         
         # Override the exercise_manager in the Flask app
         flask_app.config['EXERCISES_PATH'] = self.exercises_path
@@ -60,9 +80,15 @@ class TestWebApp(unittest.TestCase):
     
     def tearDown(self):
         """Clean up after each test"""
+        # Finish recording sessions before their store goes away
+        session_verifier.drain()
+        self.stores.stop()
+        self.leaderboard.close()
+        self.profile_store.close()
+        self.data_dir.cleanup()
+        
         # Remove temporary files
         os.unlink(self.exercises_path)
-        os.unlink(self.profiles_path)
     
     def test_index_route(self):
         """Test the main index route"""
@@ -104,6 +130,39 @@ class TestWebApp(unittest.TestCase):
         self.assertEqual(len(data['exercises']), 1)
         self.assertEqual(data['exercises'][0]['id'], 'test1')
     
+    def test_api_exercises_conditional(self):
+        """Test that the exercises API answers revalidation with a 304"""
+        response = self.client.get('/api/exercises')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        
+        response = self.client.get('/api/exercises', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        
+        response = self.client.get('/api/exercises?level=beginner', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+    
+    def test_api_exercises_pages(self):
+        """Test paging through a level's exercises"""
+        data = json.loads(self.client.get('/api/exercises?level=beginner&limit=2').data)
+        self.assertEqual(len(data['exercises']), 2)
+        self.assertEqual(data['total'], 4)
+        
+        response = self.client.get('/api/exercises?level=beginner&offset=2&limit=2')
+        page = json.loads(response.data)
+        self.assertEqual(page['offset'], 2)
+        self.assertEqual(len(page['exercises']), 2)
+        self.assertNotIn(page['exercises'][0]['id'], [exercise['id'] for exercise in data['exercises']])
+        self.assertNotEqual(response.headers['ETag'], self.client.get('/api/exercises?level=beginner').headers['ETag'])
+        
+        data = json.loads(self.client.get('/api/exercises?limit=1&offset=-5').data)
+        self.assertEqual(data['offset'], 0)
+        self.assertEqual({level: len(exercises) for level, exercises in data['exercises'].items()},
+                         {level: 1 for level in data['total']})
+    
     def test_api_exercise_by_id(self):
         """Test retrieving a specific exercise"""
         response = self.client.get('/api/exercise/test_level/test1')
@@ -170,5 +229,236 @@ class TestWebApp(unittest.TestCase):
         self.assertIn('result', data)
         self.assertIn('metrics', data)
 
+    def test_process_keystroke_batch(self):
+        """Test processing a batch of keystrokes in one request"""
+        start_response = self.client.post(
+            '/api/session/start',
+            data=json.dumps({'exercise_id': 'b1', 'level': 'beginner'}),
+            content_type='application/json'
+        )
+        session_id = json.loads(start_response.data)['session_id']
+        
+        batch_payload = {
+            'keystrokes': [{'key': 'a', 'timestamp': 1000}, {'key': 's', 'timestamp': 1100}],
+            'exercise_id': 'b1'
+        }
+        
+        response = self.client.post(
+            f'/api/session/{session_id}/keystrokes',
+            data=json.dumps(batch_payload),
+            content_type='application/json'
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        
+        data = json.loads(response.data)
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['result']['processed'], 2)
+        self.assertEqual(data['result']['position'], 2)
+        
+        # Malformed batches are rejected
+        response = self.client.post(
+            f'/api/session/{session_id}/keystrokes',
+            data=json.dumps({'keystrokes': [{'key': 'too long'}]}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+        # Another user cannot type into the session
+        other_client = flask_app.test_client()
+        with other_client.session_transaction() as sess:
+            sess['user_id'] = 'other_user'
+        for path, payload in (('keystrokes', batch_payload), ('keystroke', {'key': 'd'})):
+            response = other_client.post(
+                f'/api/session/{session_id}/{path}',
+                data=json.dumps(payload),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(
+            f'/api/session/{session_id}/keystroke',
+            data=json.dumps({'key': 'd'}),
+            content_type='application/json'
+        )
+        self.assertEqual(json.loads(response.data)['result']['position'], 3)
+
+    def test_adaptive_exercise(self):
+        """Test generating an adaptive drill and starting a session on it"""
+        response = self.client.get('/api/exercise/adaptive?words=12')
+        self.assertEqual(response.status_code, 200)
+        
+        exercise = json.loads(response.data)['exercise']
+        self.assertEqual(exercise['id'], 'adaptive')
+        self.assertEqual(len(exercise['text'].split()), 12)
+        
+        response = self.client.post(
+            '/api/session/start',
+            data=json.dumps({'level': 'adaptive'}),
+            content_type='application/json'
+        )
+        data = json.loads(response.data)
+        self.assertEqual(data['exercise']['title'], 'Adaptive Drill')
+        self.assertTrue(data['exercise']['text'])
+    
+    def test_adaptive_reindex_in_background(self):
+        """Test that drills keep the previous index while a changed catalog is reindexed"""
+        generator = adaptive_generator()
+        version = exercise_manager.version
+        indexed = threading.Event()
+        
+        def slow_index(texts):
+            indexed.wait(10)
+            return AdaptiveGenerator(texts)
+        
+        with patch.object(type(exercise_manager), 'version', new_callable=PropertyMock, return_value=version + 1), \
+                patch('web.app.AdaptiveGenerator', side_effect=slow_index):
+            self.assertIs(adaptive_generator(), generator)
+            indexed.set()
+            for thread in threading.enumerate():
+                if thread.name == 'adaptive-reindex':
+                    thread.join()
+            self.assertIsNot(adaptive_generator(), generator)
+    
+    def test_complete_session_is_verified(self):
+        """Test that completion records the replayed score, not the client's"""
+        start_response = self.client.post(
+            '/api/session/start',
+            data=json.dumps({'exercise_id': 'b1', 'level': 'beginner'}),
+            content_type='application/json'
+        )
+        session_id = json.loads(start_response.data)['session_id']
+        self.client.post(
+            f'/api/session/{session_id}/keystrokes',
+            data=json.dumps({'keystrokes': [{'key': 'a'}], 'exercise_id': 'b1'}),
+            content_type='application/json'
+        )
+        
+        response = self.client.post(
+            f'/api/session/{session_id}/complete',
+            data=json.dumps({'exercise_id': 'b1', 'metrics': {'wpm': 900, 'accuracy': 100}}),
+            content_type='application/json'
+        )
+        data = json.loads(response.data)
+        self.assertEqual(data['metrics']['verification'], 'pending')
+        
+        session_verifier.drain()
+        recorded = self.profile_cache.get('test_user').get_recent_sessions(1)[0]
+        self.assertLess(recorded['wpm'], 900)
+        
+        # A second completion of the same session records nothing more
+        response = self.client.post(
+            f'/api/session/{session_id}/complete',
+            data=json.dumps({'exercise_id': 'b1', 'metrics': {'wpm': 900}}),
+            content_type='application/json'
+        )
+        self.assertEqual(json.loads(response.data)['message'], 'Session already completed')
+    
+    def test_complete_realistic_session(self):
+        """Test that a session read before typing and with a typo is verified"""
+        start_response = self.client.post(
+            '/api/session/start',
+            data=json.dumps({'exercise_id': 'b1', 'level': 'beginner'}),
+            content_type='application/json'
+        )
+        start_data = json.loads(start_response.data)
+        session_id = start_data['session_id']
+        text = start_data['exercise']['text']
+        
+        # Sent in one batch, typed over longer than the session has existed
+        keys = text[:3] + 'x' + text[3:]
+        times = [1000 + 180 * i + 40 * (i % 3) for i in range(len(keys))]
+        response = self.client.post(
+            f'/api/session/{session_id}/keystrokes',
+            data=json.dumps({
+                'keystrokes': [{'key': key, 'timestamp': t} for key, t in zip(keys, times)],
+                'exercise_id': 'b1',
+                'level': 'beginner'
+            }),
+            content_type='application/json'
+        )
+        self.assertTrue(json.loads(response.data)['result']['complete'])
+        
+        response = self.client.post(
+            f'/api/session/{session_id}/complete',
+            data=json.dumps({'exercise_id': 'b1', 'level': 'beginner', 'metrics': {'wpm': 1, 'accuracy': 50}}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        
+        session_verifier.drain()
+        recorded = self.profile_cache.get('test_user').get_recent_sessions(1)[0]
+        self.assertTrue(recorded['verified'])
+        self.assertNotIn('flags', recorded)
+        self.assertAlmostEqual(recorded['time_elapsed'], (times[-1] - times[0]) / 1000)
+        self.assertEqual(recorded['wpm'], round((len(text) / 5) / ((times[-1] - times[0]) / 60000), 1))
+        self.assertEqual(recorded['accuracy'], round((1 - 1 / len(keys)) * 100, 1))
+    
+    def test_leaderboard(self):
+        """Test that a verified session of a known exercise reaches its boards"""
+        text = "asdf jkl; asdf jkl; asdf jkl; asdf jkl; asdf jkl; asdf jkl; asdf jkl; asdf jkl;"
+        typing_session = TypingSession(text, 'test_user')
+        for i, key in enumerate(text):
+            typing_session.process_keystroke(key, timestamp=typing_session.start_time + 0.1 * i + 0.03 * (i % 3))
+        verification = verify_keystrokes(text, typing_session.start_time, *typing_session.keystroke_arrays())
+        self.assertTrue(verification['verified'])
+        
+        record_verified_session(typing_session, 'b1', None, verification, 'beginner')
+        response = self.client.get('/api/leaderboard?level=beginner&exercise_id=b1')
+        data = json.loads(response.data)
+        self.assertEqual(data['board'], 'exercise:beginner/b1')
+        self.assertIn('test_user', [entry['user_id'] for entry in data['leaders']])
+        self.assertEqual(data['user']['users'], len(data['leaders']))
+        
+        # A level the session's text does not belong to is not trusted
+        record_verified_session(typing_session, 'b1', None, verification, 'advanced')
+        data = json.loads(self.client.get('/api/leaderboard?level=advanced').data)
+        self.assertIsNone(data['user'])
+        
+        response = self.client.get('/api/leaderboard?exercise_id=b1')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_sessions_from_other_workers(self):
+        """Test that a shared store's sessions reach the stats another worker serves"""
+        self.profile_cache.revalidate = True
+        
+        def session_count():
+            response = self.client.get('/api/user/stats')
+            return json.loads(response.data)['stats']['session_count']
+        
+        before = session_count()
+        other_worker = create_store(flask_app.config['PROFILE_STORE'], self.profiles_path)
+        UserProfile('test_user', store=other_worker).record_session('b1', 40.0, 90.0, 30.0)
+        other_worker.close()
+        self.assertEqual(session_count(), before + 1)
+    
+    def test_stream_message(self):
+        """Test applying keystroke messages from a session stream"""
+        start_response = self.client.post(
+            '/api/session/start',
+            data=json.dumps({'exercise_id': 'b1', 'level': 'beginner'}),
+            content_type='application/json'
+        )
+        session_id = json.loads(start_response.data)['session_id']
+        
+        reply = handle_stream_message(session_id, json.dumps({
+            'type': 'keystrokes',
+            'keystrokes': [{'key': 'a'}],
+            'exercise_id': 'b1'
+        }))
+        self.assertEqual(reply['type'], 'result')
+        self.assertEqual(reply['result']['position'], 1)
+        self.assertEqual(reply['metrics']['char_count'], 1)
+        
+        self.assertEqual(handle_stream_message(session_id, 'not json')['type'], 'error')
+        self.assertEqual(handle_stream_message('missing', json.dumps({'type': 'keystrokes'}))['type'], 'error')
+        
+        # Completing over the stream comes after the batches sent before it
+        handle_stream_message(session_id, json.dumps({'type': 'keystrokes', 'keystrokes': [{'key': 's'}]}))
+        reply = handle_stream_message(session_id, json.dumps({'type': 'complete', 'exercise_id': 'b1'}))
+        self.assertEqual(reply['type'], 'complete')
+        self.assertEqual(reply['metrics']['total_keystrokes'], 2)
+        self.assertIsNone(handle_stream_message(session_id, json.dumps({'type': 'complete'}))['metrics'])
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()
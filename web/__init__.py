@@ -0,0 +1,3 @@
+"""
+KasongoType web application
+"""
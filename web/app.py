@@ -6,23 +6,96 @@ Serves the web interface and handles API requests
 import os
 import sys
 import json
-from flask import Flask, render_template, request, jsonify, session
+import atexit
+import hashlib
+import threading
+from flask import Flask, Response, render_template, request, jsonify, session
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from common.typing_engine import TypingSession, ExerciseManager
-from common.analytics import UserProfile
+from common.adaptive import AdaptiveGenerator
+from common.analytics import ProfileCache
+from common.leaderboard import GLOBAL_BOARD, SQLiteLeaderboard, exercise_board, leaderboard_path_for, level_board
+from common.session_registry import SessionRegistry, create_session_backend
+from common.storage import WriteBehindStore, create_store
+from common.verification import SessionVerifier
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    # WebSocket streaming is optional, clients fall back to batched HTTP
+    Sock = None
 
 app = Flask(__name__)
 app.secret_key = 'kasongoType_cyb3rpunk_2077'  # For session management
 
-# Initialize exercise manager
-exercise_manager = ExerciseManager(data_path=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                                        "common/data/exercises.json"))
+# WebSocket transport for live typing sessions. Each open stream holds a
+# server thread, so thread-per-connection servers turn it off ("off")
+app.config['SESSION_STREAMS'] = Sock is not None and os.environ.get('KASONGOTYPE_SESSION_STREAMS', 'on') != 'off'
+sock = Sock(app) if app.config['SESSION_STREAMS'] else None
+
+# Initialize exercise manager, preferring a built catalog over the JSON file
+EXERCISES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              "common/data/exercises.json")
+CATALOG_PATH = os.path.splitext(EXERCISES_PATH)[0] + ".kcat"
+exercise_manager = ExerciseManager(data_path=CATALOG_PATH if os.path.exists(CATALOG_PATH) else EXERCISES_PATH)
+
+# Directory of user profiles, leaderboards and shared sessions
+DATA_DIR = os.environ.get('KASONGOTYPE_DATA_DIR',
+                          os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common/data"))
+
+# Path to the user profile storage
+PROFILES_PATH = os.path.join(DATA_DIR, "user_profiles.json")
+
+# Active session backend: "memory" (default) for a single process, or
+# "sqlite" to share sessions between worker processes
+app.config['SESSION_STORE'] = os.environ.get('KASONGOTYPE_SESSION_STORE', 'memory')
+
+# Worker processes that share sessions also share profiles
+SHARED_STORES = app.config['SESSION_STORE'] != 'memory'
+
+# Profile storage backend: "log" (default), "sqlite" or the legacy "json" file
+app.config['PROFILE_STORE'] = os.environ.get('KASONGOTYPE_PROFILE_STORE', 'log')
+
+# Session records are buffered and written in batches, flushed on shutdown.
+# Other workers cannot see a buffer, so a shared store is written at once,
+# from the verifier's threads rather than a request's
+profile_store = create_store(app.config['PROFILE_STORE'], PROFILES_PATH)
+if not SHARED_STORES:
+    profile_store = WriteBehindStore(profile_store)
+atexit.register(profile_store.close)
+
+# Recently used profiles stay in memory between requests, checked against
+# a shared store on every use so other workers' writes show up
+profile_cache = ProfileCache(profile_store, capacity=1024, data_path=PROFILES_PATH, revalidate=SHARED_STORES)
 
-# Store active typing sessions
-active_sessions = {}
+# Rankings across all users, shared by worker processes and kept up to date
+# as verified sessions are recorded. A new database is filled once from the
+# stored profiles
+leaderboard = SQLiteLeaderboard(leaderboard_path_for(PROFILES_PATH))
+if not leaderboard.seeded:
+    leaderboard.seed(profile_store.iter_profiles())
+
+# Largest keystroke batch accepted in a single request
+MAX_KEYSTROKE_BATCH = 512
+
+# Upper bound on points per progress series returned by /api/user/stats
+MAX_PROGRESS_POINTS = 1000
+
+# Database of active sessions shared between worker processes
+SESSIONS_DB_PATH = os.path.join(DATA_DIR, "active_sessions.db")
+
+# Active typing sessions, dropped after 15 idle minutes and capped in number
+active_sessions = SessionRegistry(ttl=15 * 60, max_sessions=10000,
+                                  backend=create_session_backend(app.config['SESSION_STORE'], SESSIONS_DB_PATH))
+atexit.register(active_sessions.close)
+
+# Completed sessions are replayed and recorded off the request thread. Exit
+# handlers run last-registered first, so this drains before the store closes
+session_verifier = SessionVerifier(max_workers=2)
+atexit.register(session_verifier.close)
 
 @app.route('/')
 def index():
@@ -43,20 +116,135 @@ def exercises():
     """Render exercises selection page"""
     return render_template('exercises.html')
 
+# Exercises per level in one /api/exercises page, and the default page size.
+# Only pages are ever decoded, so a large catalog stays on disk
+MAX_EXERCISES_PAGE = 100
+
+# Serialized first /api/exercises pages for the current exercise catalog
+# version, (version, level or None) -> (body, etag). Later pages are built
+# on demand.
+_exercises_cache = {}
+_exercises_cache_lock = threading.Lock()
+
+def exercises_body(level=None, offset=0, limit=MAX_EXERCISES_PAGE):
+    """Get a serialized page of the exercises of one level, or of each level, and its ETag"""
+    version = exercise_manager.version
+    first_page = offset == 0 and limit == MAX_EXERCISES_PAGE
+    entry = _exercises_cache.get((version, level)) if first_page else None
+    if entry is not None:
+        return entry
+    
+    if level:
+        exercises = exercise_manager.get_exercises_by_level(level, offset, limit)
+        total = exercise_manager.count_exercises(level)
+    else:
+        exercises = {}
+        total = {}
+        for level_name in exercise_manager.get_levels():
+            exercises[level_name] = exercise_manager.get_exercises_by_level(level_name, offset, limit)
+            total[level_name] = exercise_manager.count_exercises(level_name)
+    
+    reply = {"status": "success", "exercises": exercises, "offset": offset, "limit": limit, "total": total}
+    body = json.dumps(reply, separators=(',', ':')).encode('utf-8')
+    entry = (body, hashlib.blake2b(body, digest_size=16).hexdigest())
+    
+    # Unknown levels are not cached, so arbitrary queries cannot grow the cache
+    if first_page and (not level or level in exercise_manager.get_levels()):
+        with _exercises_cache_lock:
+            if any(key[0] != version for key in _exercises_cache):
+                _exercises_cache.clear()
+            _exercises_cache[(version, level)] = entry
+    return entry
+
 @app.route('/api/exercises')
 def get_exercises():
-    """Get all available exercises"""
+    """Get a page of the available exercises"""
     level = request.args.get('level', None)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', MAX_EXERCISES_PAGE, type=int), 1), MAX_EXERCISES_PAGE)
+    body, etag = exercises_body(level, offset, limit)
     
-    if level:
-        exercises = exercise_manager.get_exercises_by_level(level)
-        return jsonify({"status": "success", "exercises": exercises})
-    else:
-        all_exercises = {}
-        for level_name in exercise_manager.exercises["levels"]:
-            all_exercises[level_name] = exercise_manager.get_exercises_by_level(level_name)
-        
-        return jsonify({"status": "success", "exercises": all_exercises})
+    # Clients revalidate every time and get a 304 while the catalog is unchanged
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# Level name that asks for a drill generated from the user's weak keys
+ADAPTIVE_LEVEL = 'adaptive'
+
+# Largest adaptive drill, in words
+MAX_ADAPTIVE_WORDS = 200
+
+# Pages of exercises sampled from each level to index for adaptive drills,
+# spread evenly over the level
+ADAPTIVE_SAMPLE_PAGES = 20
+
+# Adaptive drill generator over the current exercise catalog version
+_adaptive = {"version": None, "generator": None, "reindexing": False}
+_adaptive_lock = threading.Lock()
+_adaptive_ready = threading.Event()
+
+def adaptive_corpus():
+    """Sample exercise texts from every level, a page at a time"""
+    for level_name in exercise_manager.get_levels():
+        count = exercise_manager.count_exercises(level_name)
+        pages = min(ADAPTIVE_SAMPLE_PAGES, -(-count // MAX_EXERCISES_PAGE))
+        for page in range(pages):
+            offset = page * count // pages
+            for exercise in exercise_manager.get_exercises_by_level(level_name, offset, MAX_EXERCISES_PAGE):
+                yield exercise["text"]
+
+def reindex_adaptive():
+    """Index a sample of the current catalog for the drill generator"""
+    try:
+        version = exercise_manager.version
+        generator = AdaptiveGenerator(adaptive_corpus())
+        with _adaptive_lock:
+            _adaptive["generator"] = generator
+            _adaptive["version"] = version
+    finally:
+        _adaptive["reindexing"] = False
+        _adaptive_ready.set()
+
+def adaptive_generator():
+    """Get the drill generator, reindexing in the background when the catalog changes
+    
+    Drills keep using the previous index until the new one is built. Only
+    the very first drill waits for an index.
+    """
+    if _adaptive["version"] != exercise_manager.version:
+        with _adaptive_lock:
+            start = not _adaptive["reindexing"]
+            _adaptive["reindexing"] = True
+        if start:
+            threading.Thread(target=reindex_adaptive, name="adaptive-reindex", daemon=True).start()
+    
+    if _adaptive["generator"] is None:
+        _adaptive_ready.wait()
+        if _adaptive["generator"] is None:
+            reindex_adaptive()
+    return _adaptive["generator"]
+
+def adaptive_exercise(user_id, word_count=30):
+    """Generate an exercise aimed at a user's weakest keys"""
+    drill = adaptive_generator().generate(profile_cache.get(user_id).get_key_stats(), word_count)
+    return {
+        "id": ADAPTIVE_LEVEL,
+        "title": "Adaptive Drill",
+        "text": drill["text"],
+        "focus": drill["focus"]
+    }
+
+@app.route('/api/exercise/adaptive')
+def get_adaptive_exercise():
+    """Get a drill generated from the user's weak keys"""
+    if 'user_id' not in session:
+        return jsonify({"status": "error", "message": "No user session"}), 401
+    
+    word_count = request.args.get('words', 30, type=int)
+    word_count = min(max(word_count, 1), MAX_ADAPTIVE_WORDS)
+    return jsonify({"status": "success", "exercise": adaptive_exercise(session['user_id'], word_count)})
 
 @app.route('/api/exercise/<level>/<id>')
 def get_exercise(level, id):
@@ -64,146 +252,345 @@ def get_exercise(level, id):
     exercise = exercise_manager.get_exercise(level, id)
     return jsonify({"status": "success", "exercise": exercise})
 
-@app.route('/api/session/start', methods=['POST'])
-def start_session():
-    """Start a new typing session"""
-    data = request.json
+def start_session_reply(user_id, data, streaming):
+    """Create a typing session for a start request, returning (reply, status)
+    
+    Shared by the Flask routes and the ASGI app. `streaming` tells whether
+    the transport serves session streams.
+    """
     exercise_id = data.get('exercise_id')
     level = data.get('level')
     
-    if exercise_id and level:
+    if level == ADAPTIVE_LEVEL:
+        exercise = adaptive_exercise(user_id)
+    elif exercise_id and level:
         exercise = exercise_manager.get_exercise(level, exercise_id)
     else:
         exercise = exercise_manager.get_random_exercise()
     
     # Create a new typing session
-    session_id = f"{session['user_id']}_{hash(exercise['text'])}"
-    active_sessions[session_id] = TypingSession(exercise['text'], session['user_id'])
+    session_id = f"{user_id}_{hash(exercise['text'])}"
+    active_sessions[session_id] = TypingSession(exercise['text'], user_id)
     
-    return jsonify({
+    return {
         "status": "success", 
         "session_id": session_id,
-        "exercise": exercise
-    })
+        "exercise": exercise,
+        "stream_url": f"/ws/session/{session_id}" if streaming else None
+    }, 200
 
-@app.route('/api/session/status')
-def session_status():
-    """Check if session has started"""
-    session_id = request.args.get('session_id')
-    
+def session_status_reply(session_id):
+    """Report whether a session has started, returning (reply, status)"""
     if session_id and session_id in active_sessions:
         typing_session = active_sessions[session_id]
-        return jsonify({
+        return {
             "status": "success",
             "started": True,
             "session_id": session_id,
             "start_time": typing_session.start_time
-        })
+        }, 200
     
-    return jsonify({
+    return {
         "status": "success",
         "started": False
-    })
+    }, 200
 
-@app.route('/api/session/<string:session_id>/complete', methods=['POST'])
-def complete_session(session_id):
-    """Complete a typing session and save final metrics"""
-    data = request.json
-    metrics = data.get('metrics', {})
+def complete_session_reply(user_id, session_id, data):
+    """Complete a user's session, returning (reply, status)
+    
+    The recorded score comes from replaying the keystrokes the server
+    received, metrics sent by the client are ignored.
+    """
     exercise_id = data.get('exercise_id', 'unknown')
+    level = data.get('level')
     
-    # Record the session in user profile
-    user_profile = UserProfile(session['user_id'],
-                              data_path=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                                                    "common/data/user_profiles.json"))
+    with active_sessions.checkout(session_id) as typing_session:
+        if typing_session is None or typing_session.user_id != user_id:
+            # Sessions finished by their last keystroke are already recorded
+            return {
+                "status": "success",
+                "message": "Session already completed"
+            }, 200
+        
+        metrics = finish_session(session_id, typing_session, exercise_id, level)
     
+    return {
+        "status": "success",
+        "message": "Session completed and results saved",
+        "metrics": metrics
+    }, 200
+
+@app.route('/api/session/start', methods=['POST'])
+def start_session():
+    """Start a new typing session"""
+    reply, status = start_session_reply(session['user_id'], request.json, sock is not None)
+    return jsonify(reply), status
+
+@app.route('/api/session/status')
+def session_status():
+    """Check if session has started"""
+    reply, status = session_status_reply(request.args.get('session_id'))
+    return jsonify(reply), status
+
+@app.route('/api/session/<string:session_id>/complete', methods=['POST'])
+def complete_session(session_id):
+    """Complete a typing session and save final metrics"""
+    reply, status = complete_session_reply(session.get('user_id'), session_id, request.get_json(silent=True) or {})
+    return jsonify(reply), status
+
+def exercise_level(typing_session, exercise_id, level):
+    """The level the client named, if the session really typed that exercise"""
+    if not isinstance(level, str) or not isinstance(exercise_id, str) or level not in exercise_manager.get_levels():
+        return None
+    if exercise_manager.get_exercise(level, exercise_id)["text"] != typing_session.text:
+        return None
+    return level
+
+def record_verified_session(typing_session, exercise_id, rhythm, verification, level=None):
+    """Record a verified session in the user profile, run by the verifier"""
+    user_profile = profile_cache.get(typing_session.user_id)
     user_profile.record_session(
         exercise_id,
-        metrics.get('wpm', 0),
-        metrics.get('accuracy', 0),
-        metrics.get('time_elapsed', 0)
+        verification['wpm'],
+        verification['accuracy'],
+        verification['time_elapsed'],
+        text=typing_session.text,
+        keystrokes=typing_session.iter_keystrokes(),
+        rhythm=rhythm,
+        verification=verification,
+        level=exercise_level(typing_session, exercise_id, level),
+        leaderboard=leaderboard
     )
+
+def finish_session(session_id, typing_session, exercise_id, level=None):
+    """Release a completed session and queue it for verification and recording"""
+    metrics = typing_session.get_metrics()
+    rhythm = typing_session.intervals.summary()
     
-    return jsonify({
+    # Clean up the session, so nothing changes it while it is verified
+    active_sessions.pop(session_id, None)
+    session_verifier.submit(
+        typing_session,
+        lambda verification: record_verified_session(typing_session, exercise_id, rhythm, verification, level)
+    )
+    return dict(metrics.to_dict(), rhythm=rhythm, verification="pending")
+
+def keystroke_reply(user_id, session_id, data):
+    """Apply a single keystroke to a user's session, returning (reply, status)"""
+    keystroke = data.get('key', '')
+    
+    with active_sessions.checkout(session_id) as typing_session:
+        if typing_session is None or typing_session.user_id != user_id:
+            return {"status": "error", "message": "Session not found"}, 404
+        
+        result = typing_session.process_keystroke(keystroke)
+        
+        # If session is complete, save the results
+        metrics_data = None
+        if result["complete"]:
+            metrics_data = finish_session(session_id, typing_session, data.get('exercise_id', 'unknown'),
+                                          level=data.get('level'))
+        
+    return {
         "status": "success",
-        "message": "Session completed and results saved"
-    })
+        "result": result,
+        "metrics": metrics_data
+    }, 200
 
-@app.route('/api/session/<string:session_id>/keystroke', methods=['POST'])
-def process_keystroke(session_id):
-    """Process a keystroke in a typing session"""
+def keystrokes_reply(user_id, session_id, data):
+    """Apply an ordered keystroke batch to a user's session, returning (reply, status)"""
     if session_id not in active_sessions:
-        return jsonify({"status": "error", "message": "Session not found"}), 404
-        
-    data = request.json
-    keystroke = data.get('key', '')
+        return {"status": "error", "message": "Session not found"}, 404
     
-    typing_session = active_sessions[session_id]
-    result = typing_session.process_keystroke(keystroke)
+    keystrokes = data.get('keystrokes', [])
     
-    # If session is complete, save the results
-    if result["complete"]:
-        metrics = typing_session.get_metrics()
-        user_profile = UserProfile(session['user_id'], 
-                                   data_path=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                                                         "common/data/user_profiles.json"))
-        
-        # Check if metrics is a dict or an object with attributes
-        if isinstance(metrics, dict):
-            user_profile.record_session(
-                data.get('exercise_id', 'unknown'),
-                metrics.get('wpm', 0),
-                metrics.get('accuracy', 0),
-                metrics.get('time_elapsed', 0)
-            )
-        else:
-            # Assuming metrics is an object with attributes
-            user_profile.record_session(
-                data.get('exercise_id', 'unknown'),
-                getattr(metrics, 'wpm', 0),
-                getattr(metrics, 'accuracy', 0),
-                getattr(metrics, 'time_elapsed', 0)
-            )
+    if isinstance(keystrokes, list) and len(keystrokes) > MAX_KEYSTROKE_BATCH:
+        return {"status": "error", "message": "Too many keystrokes in batch"}, 413
+    
+    with active_sessions.checkout(session_id) as typing_session:
+        if typing_session is None or typing_session.user_id != user_id:
+            return {"status": "error", "message": "Session not found"}, 404
         
-        # Clean up the session
-        del active_sessions[session_id]
-    
-    # Handle metrics similarly for the response
-    metrics_data = None
-    if "complete" in result and result["complete"]:
-        metrics = typing_session.get_metrics()
-        if isinstance(metrics, dict):
-            metrics_data = metrics
-        else:
-            metrics_data = metrics.__dict__
+        try:
+            result = typing_session.process_keystrokes(keystrokes)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}, 400
         
-    return jsonify({
+        # If session is complete, save the results
+        metrics_data = None
+        if result["complete"]:
+            metrics_data = finish_session(session_id, typing_session, data.get('exercise_id', 'unknown'),
+                                          level=data.get('level'))
+    
+    return {
         "status": "success",
         "result": result,
         "metrics": metrics_data
-    })
+    }, 200
 
+@app.route('/api/session/<string:session_id>/keystroke', methods=['POST'])
+def process_keystroke(session_id):
+    """Process a keystroke in a typing session"""
+    reply, status = keystroke_reply(session.get('user_id'), session_id, request.json)
+    return jsonify(reply), status
 
-@app.route('/api/user/stats')
-def get_user_stats():
-    """Get user statistics"""
-    if 'user_id' not in session:
-        return jsonify({"status": "error", "message": "No user session"}), 401
+@app.route('/api/session/<string:session_id>/keystrokes', methods=['POST'])
+def process_keystrokes(session_id):
+    """Process an ordered batch of keystrokes in a typing session"""
+    reply, status = keystrokes_reply(session.get('user_id'), session_id, request.get_json(silent=True) or {})
+    return jsonify(reply), status
+
+def handle_stream_message(session_id, message):
+    """Apply one message from a session stream and build the reply
+    
+    Messages are JSON objects. A {"type": "keystrokes"} message carries a
+    keystroke batch and is answered with an incremental "result" and live
+    metrics, or with "complete" and the final metrics once the exercise is
+    finished. A {"type": "complete"} message finishes the session early,
+    after every batch sent before it.
+    """
+    try:
+        data = json.loads(message)
+    except (TypeError, ValueError):
+        return {"type": "error", "message": "Invalid JSON message"}
+    
+    if not isinstance(data, dict):
+        return {"type": "error", "message": "Invalid message"}
+    
+    if data.get('type') == 'ping':
+        return {"type": "pong"}
+    
+    if data.get('type') == 'complete':
+        with active_sessions.checkout(session_id) as typing_session:
+            if typing_session is None:
+                # Sessions finished by their last keystroke are already recorded
+                return {"type": "complete", "metrics": None}
+            metrics = finish_session(session_id, typing_session, data.get('exercise_id', 'unknown'),
+                                     level=data.get('level'))
+        return {"type": "complete", "metrics": metrics}
+    
+    if data.get('type') != 'keystrokes':
+        return {"type": "error", "message": "Unknown message type"}
+    
+    keystrokes = data.get('keystrokes', [])
+    if isinstance(keystrokes, list) and len(keystrokes) > MAX_KEYSTROKE_BATCH:
+        return {"type": "error", "message": "Too many keystrokes in batch"}
+    
+    with active_sessions.checkout(session_id) as typing_session:
+        if typing_session is None:
+            return {"type": "error", "message": "Session not found"}
+        
+        try:
+            result = typing_session.process_keystrokes(keystrokes)
+        except ValueError as e:
+            return {"type": "error", "message": str(e)}
         
-    user_profile = UserProfile(session['user_id'], 
-                               data_path=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                                                     "common/data/user_profiles.json"))
+        if result["complete"]:
+            metrics = finish_session(session_id, typing_session, data.get('exercise_id', 'unknown'),
+                                     level=data.get('level'))
+            return {"type": "complete", "result": result, "metrics": metrics}
+        
+        return {"type": "result", "result": result, "metrics": typing_session.get_metrics().to_dict()}
+
+if sock is not None:
+    @sock.route('/ws/session/<string:session_id>')
+    def session_stream(ws, session_id):
+        """Stream keystrokes in and results out over one WebSocket"""
+        typing_session = active_sessions.get(session_id)
+        if typing_session is None or typing_session.user_id != session.get('user_id'):
+            ws.send(json.dumps({"type": "error", "message": "Session not found"}))
+            return
+        
+        while True:
+            message = ws.receive()
+            if message is None:
+                break
+            
+            reply = handle_stream_message(session_id, message)
+            ws.send(json.dumps(reply))
+            
+            # The stream is bound to one session and ends with it
+            if reply["type"] == "complete" or session_id not in active_sessions:
+                break
+
+def user_stats_reply(user_id, window=None, resolution=None, max_points=MAX_PROGRESS_POINTS):
+    """Gather a user's dashboard data, returning (reply, status)
+    
+    `window` is an optional number of most recent points to chart,
+    `resolution` a bucket size ("day" or "week") and `max_points` the
+    point budget for the downsampled series.
+    """
+    user_profile = profile_cache.get(user_id)
+    max_points = min(max(max_points, 3), MAX_PROGRESS_POINTS)
+    
+    try:
+        progress_data = user_profile.get_progress_data(window, resolution, max_points)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
     
     stats = user_profile.get_stats()
     recent_sessions = user_profile.get_recent_sessions(10)
-    progress_data = user_profile.get_progress_data()
     
-    return jsonify({
+    return {
         "status": "success",
         "stats": stats,
+        "rhythm": user_profile.get_rhythm(),
         "recent_sessions": recent_sessions,
         "progress_data": progress_data
+    }, 200
+
+@app.route('/api/user/stats')
+def get_user_stats():
+    """Get user statistics"""
+    if 'user_id' not in session:
+        return jsonify({"status": "error", "message": "No user session"}), 401
+    
+    reply, status = user_stats_reply(
+        session['user_id'],
+        request.args.get('window', None, type=int),
+        request.args.get('resolution', None),
+        request.args.get('max_points', MAX_PROGRESS_POINTS, type=int)
+    )
+    return jsonify(reply), status
+
+@app.route('/api/leaderboard')
+def get_leaderboard():
+    """Get the top users globally, or for a level or one exercise of it
+    
+    Includes the requesting user's percentile on the same board.
+    """
+    level = request.args.get('level')
+    exercise_id = request.args.get('exercise_id')
+    limit = request.args.get('limit', leaderboard.capacity, type=int)
+    limit = min(max(limit, 1), leaderboard.capacity)
+    
+    if exercise_id and not level:
+        return jsonify({"status": "error", "message": "exercise_id needs a level"}), 400
+    if level and exercise_id:
+        board = exercise_board(level, exercise_id)
+    elif level:
+        board = level_board(level)
+    else:
+        board = GLOBAL_BOARD
+    
+    return jsonify({
+        "status": "success",
+        "board": board,
+        "leaders": leaderboard.top(board, limit),
+        "user": leaderboard.percentile(session['user_id'], board) if 'user_id' in session else None
+    })
+
+@app.route('/api/server/stats')
+def get_server_stats():
+    """Get counters for active sessions and the memory they hold"""
+    return jsonify({
+        "status": "success",
+        "sessions": active_sessions.stats()
     })
 
+def main():
+    """Run the Flask development server, see web/serve.py for production"""
+    app.run(debug=True)
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    main()
\ No newline at end of file
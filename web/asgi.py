@@ -0,0 +1,302 @@
+"""
+ASGI application for KasongoType
+Serves the session and stats API from an event loop, everything else via Flask
+
+Run it with any ASGI server, for example:
+
+    uvicorn web.asgi:app
+
+Open session streams are coroutines rather than threads, so one process can
+hold thousands of idle typing sessions. The routes share their logic, state
+and session cookie with the Flask app in web/app.py.
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote
+
+from itsdangerous import BadSignature
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web.app import (app as flask_app, active_sessions, complete_session_reply, handle_stream_message,
+                     keystroke_reply, keystrokes_reply, session_status_reply, start_session_reply,
+                     user_stats_reply, MAX_PROGRESS_POINTS)
+
+# Threads for work that may touch disk: profile loads and, with a
+# non-memory session store, session checkouts
+PERSISTENCE_WORKERS = 8
+executor = ThreadPoolExecutor(max_workers=PERSISTENCE_WORKERS, thread_name_prefix="asgi-io")
+
+# Largest request body read, API payloads are far smaller
+MAX_BODY_BYTES = 1024 * 1024
+
+# Memory-backed sessions are only CPU work, applied on the loop itself
+_SESSIONS_IN_MEMORY = flask_app.config['SESSION_STORE'] == 'memory'
+
+_session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+
+
+async def run_blocking(fn, *args):
+    """Run a call that may block on I/O on the persistence executor"""
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+async def run_session(fn, *args):
+    """Run a call on the active session registry"""
+    if _SESSIONS_IN_MEMORY:
+        return fn(*args)
+    return await run_blocking(fn, *args)
+
+
+def user_id_from(scope):
+    """The user id in the Flask session cookie of a request, if valid"""
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+    for name, value in scope.get("headers", []):
+        if name != b"cookie":
+            continue
+        for part in value.decode("latin-1").split(";"):
+            key, _, cookie = part.strip().partition("=")
+            if key == cookie_name:
+                try:
+                    data = _session_serializer.loads(
+                        cookie, max_age=flask_app.permanent_session_lifetime.total_seconds())
+                except BadSignature:
+                    return None
+                return data.get('user_id')
+    return None
+
+
+def _query_int(query, name, default):
+    """An integer query argument, the default when missing or malformed"""
+    try:
+        return int(query[name][0])
+    except (KeyError, ValueError):
+        return default
+
+
+async def read_body(receive):
+    """Read a request body, or None if it is too large"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return bytes(body)
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            return None
+        if not message.get("more_body"):
+            return bytes(body)
+
+
+def _json_object(body):
+    """A JSON request body as a dict, empty if missing or not an object"""
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+async def send_json(send, reply, status=200):
+    body = flask_app.json.dumps(reply).encode("utf-8") + b"\n"
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# (method, path pattern) -> handler(scope, match, body) returning (reply, status)
+_routes = []
+
+
+def route(method, pattern):
+    def register(handler):
+        _routes.append((method, re.compile(pattern + "$"), handler))
+        return handler
+    return register
+
+
+@route("POST", r"/api/session/start")
+async def start_session(scope, match, body):
+    user_id = user_id_from(scope)
+    if user_id is None:
+        return {"status": "error", "message": "No user session"}, 401
+    # Adaptive drills read the user's profile
+    return await run_blocking(start_session_reply, user_id, _json_object(body), True)
+
+
+@route("GET", r"/api/session/status")
+async def session_status(scope, match, body):
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return await run_session(session_status_reply, query.get("session_id", [None])[0])
+
+
+@route("POST", r"/api/session/(?P<session_id>[^/]+)/keystroke")
+async def process_keystroke(scope, match, body):
+    return await run_session(keystroke_reply, user_id_from(scope), unquote(match["session_id"]),
+                             _json_object(body))
+
+
+@route("POST", r"/api/session/(?P<session_id>[^/]+)/keystrokes")
+async def process_keystrokes(scope, match, body):
+    return await run_session(keystrokes_reply, user_id_from(scope), unquote(match["session_id"]),
+                             _json_object(body))
+
+
+@route("POST", r"/api/session/(?P<session_id>[^/]+)/complete")
+async def complete_session(scope, match, body):
+    return await run_session(complete_session_reply, user_id_from(scope), unquote(match["session_id"]),
+                             _json_object(body))
+
+
+@route("GET", r"/api/user/stats")
+async def user_stats(scope, match, body):
+    user_id = user_id_from(scope)
+    if user_id is None:
+        return {"status": "error", "message": "No user session"}, 401
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return await run_blocking(user_stats_reply, user_id, _query_int(query, "window", None),
+                              query.get("resolution", [None])[0],
+                              _query_int(query, "max_points", MAX_PROGRESS_POINTS))
+
+
+def _wsgi_environ(scope, body):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "SERVER_NAME": (scope.get("server") or ("localhost", 80))[0],
+        "SERVER_PORT": str((scope.get("server") or ("localhost", 80))[1]),
+        "REMOTE_ADDR": (scope.get("client") or ("127.0.0.1", 0))[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    for name, value in scope.get("headers", []):
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if key == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif key != "CONTENT_LENGTH":
+            key = "HTTP_" + key
+            environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ):
+    """Run the Flask app on one request, returning (status, headers, body)"""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    result = flask_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return started["status"], started["headers"], body
+
+
+async def serve_wsgi(scope, body, send):
+    """Serve pages, static files and the remaining API routes through Flask"""
+    status, headers, data = await run_blocking(_call_wsgi, _wsgi_environ(scope, body))
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+async def http(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        await send_json(send, {"status": "error", "message": "Request body too large"}, 413)
+        return
+
+    for method, pattern, handler in _routes:
+        match = pattern.match(scope["path"])
+        if match and method == scope["method"]:
+            reply, status = await handler(scope, match, body)
+            await send_json(send, reply, status)
+            return
+    await serve_wsgi(scope, body, send)
+
+
+_stream_path = re.compile(r"/ws/session/(?P<session_id>[^/]+)$")
+
+
+async def session_stream(scope, receive, send):
+    """Stream keystrokes in and results out over one WebSocket"""
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    match = _stream_path.match(scope["path"])
+    if match is None:
+        await send({"type": "websocket.close", "code": 1008})
+        return
+
+    await send({"type": "websocket.accept"})
+    session_id = unquote(match["session_id"])
+    typing_session = await run_session(active_sessions.get, session_id)
+    if typing_session is None or typing_session.user_id != user_id_from(scope):
+        await send({"type": "websocket.send", "text": json.dumps({"type": "error", "message": "Session not found"})})
+        await send({"type": "websocket.close", "code": 1000})
+        return
+
+    while True:
+        message = await receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        text = message.get("text")
+        if text is None:
+            text = (message.get("bytes") or b"").decode("utf-8", errors="replace")
+
+        reply = await run_session(handle_stream_message, session_id, text)
+        await send({"type": "websocket.send", "text": json.dumps(reply)})
+
+        # The stream is bound to one session and ends with it
+        if reply["type"] == "complete" or not await run_session(active_sessions.__contains__, session_id):
+            await send({"type": "websocket.close", "code": 1000})
+            return
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Let queued profile reads and session writes finish
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown, True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI entry point"""
+    if scope["type"] == "http":
+        await http(scope, receive, send)
+    elif scope["type"] == "websocket":
+        await session_stream(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
@@ -0,0 +1,193 @@
+"""
+Production server for KasongoType
+Runs the web app under gunicorn, waitress or uvicorn instead of the Flask dev server
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger(__name__)
+
+SERVERS = ("auto", "gunicorn", "waitress", "uvicorn")
+
+
+def load_app():
+    """Import the Flask app, in each worker process"""
+    from web.app import app
+    return app
+
+
+def available_server():
+    """gunicorn where it runs, else waitress, else None"""
+    if os.name != "nt":
+        try:
+            import gunicorn  # noqa: F401
+            return "gunicorn"
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return "waitress"
+    except ImportError:
+        return None
+
+
+def configure_stores(workers):
+    """Pick stores that several worker processes can share
+
+    Active sessions live in process memory by default, so with more than one
+    worker a session started in one would be missing in the next. The app
+    reads this when each worker imports it.
+    """
+    if workers <= 1:
+        return
+    store = os.environ.setdefault("KASONGOTYPE_SESSION_STORE", "sqlite")
+    if store == "memory":
+        raise ValueError("KASONGOTYPE_SESSION_STORE=memory cannot be shared by several workers")
+
+
+def configure_streams(server):
+    """Turn off WebSocket session streams unless the server runs them as coroutines
+
+    Under gunicorn's threads or waitress an open stream holds a thread until
+    the client leaves, so a few idle typists would starve every other
+    request. Clients then send keystrokes in HTTP batches instead.
+    """
+    if server != "uvicorn":
+        os.environ["KASONGOTYPE_SESSION_STREAMS"] = "off"
+
+
+def serve_gunicorn(options):
+    """Serve with gunicorn: worker processes for cores, threads for connections
+
+    gunicorn drains on SIGTERM: workers stop accepting, finish requests for
+    up to the graceful timeout, then run their exit handlers, which flush
+    pending session records.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class KasongoTypeApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{options.host}:{options.port}")
+            self.cfg.set("workers", options.workers)
+            self.cfg.set("threads", options.threads)
+            # Threaded workers, so slow clients do not block a process
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("keepalive", options.keep_alive)
+            self.cfg.set("graceful_timeout", options.graceful_timeout)
+            self.cfg.set("timeout", options.timeout)
+            # Each worker imports the app itself: its store flusher and
+            # verifier threads would not survive a fork
+            self.cfg.set("preload_app", False)
+
+        def load(self):
+            return load_app()
+
+    KasongoTypeApplication().run()
+
+
+def serve_uvicorn(options):
+    """Serve the ASGI app with uvicorn: session streams are coroutines, not threads
+
+    Suits many open but idle typing sessions. uvicorn drains on SIGTERM
+    like gunicorn, then the app's lifespan handler waits for pending
+    profile writes.
+    """
+    import uvicorn
+
+    # Workers import the app by name, from the directory holding the web package
+    uvicorn.run("web.asgi:app", app_dir=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                host=options.host, port=options.port, workers=options.workers,
+                timeout_keep_alive=options.keep_alive, timeout_graceful_shutdown=options.graceful_timeout,
+                lifespan="on")
+
+
+def _has_open_requests(server):
+    for channel in list(server._map.values()):
+        if channel is not server and (getattr(channel, "requests", None) or getattr(channel, "total_outbufs_len", 0)):
+            return True
+    return False
+
+
+def serve_waitress(app, options, stop=None):
+    """Serve with waitress: one process, a pool of threads
+
+    On SIGTERM or SIGINT, or once `stop` is set, the listening socket is
+    closed and open requests get up to the graceful timeout to finish.
+    waitress's own shutdown would stop the event loop first, dropping
+    responses that were computed but not yet sent.
+    """
+    from waitress import wasyncore
+    from waitress.server import create_server
+
+    server = create_server(app, host=options.host, port=options.port, threads=options.threads,
+                           channel_timeout=options.keep_alive, ident="kasongotype")
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+    server.print_listen("Serving on http://{}:{}")
+
+    try:
+        while not stop.is_set():
+            wasyncore.loop(timeout=0.5, map=server._map, count=1)
+
+        # Stop accepting, but keep the loop running to send what is pending
+        server.del_channel()
+        server.socket.close()
+        deadline = time.monotonic() + options.graceful_timeout
+        while _has_open_requests(server) and time.monotonic() < deadline:
+            wasyncore.loop(timeout=0.1, map=server._map, count=1)
+    finally:
+        server.task_dispatcher.shutdown(cancel_pending=True, timeout=1)
+
+
+def main(argv=None):
+    """Run KasongoType under a production WSGI server"""
+    parser = argparse.ArgumentParser(description="Serve KasongoType with a production WSGI server")
+    parser.add_argument("--server", choices=SERVERS, default=os.environ.get("KASONGOTYPE_SERVER", "auto"),
+                        help="gunicorn (POSIX, multi-process), waitress (any platform, one process) "
+                             "or uvicorn (asyncio, for many idle session streams)")
+    parser.add_argument("--host", default=os.environ.get("KASONGOTYPE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("KASONGOTYPE_PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("KASONGOTYPE_WORKERS", os.cpu_count() or 1)),
+                        help="worker processes, gunicorn and uvicorn only")
+    parser.add_argument("--threads", type=int, default=int(os.environ.get("KASONGOTYPE_THREADS", 16)),
+                        help="threads per worker, gunicorn and waitress only")
+    parser.add_argument("--keep-alive", type=int, default=5, help="seconds an idle connection stays open")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="seconds open requests get to finish on shutdown")
+    parser.add_argument("--timeout", type=int, default=60, help="seconds before a silent worker is restarted")
+    options = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    server = options.server if options.server != "auto" else available_server()
+    if server is None:
+        parser.error("install gunicorn or waitress to serve in production")
+
+    configure_streams(server)
+    if server in ("gunicorn", "uvicorn"):
+        try:
+            configure_stores(options.workers)
+        except ValueError as e:
+            parser.error(str(e))
+        if server == "gunicorn":
+            serve_gunicorn(options)
+        else:
+            serve_uvicorn(options)
+    else:
+        if options.workers > 1:
+            logger.info("waitress runs one process, serving with %d threads", options.threads)
+        serve_waitress(load_app(), options)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ function loadUserStats() {
             console.log("Received user stats data:", data);
             if (data.status === 'success') {
                 displayStats(data.stats);
+                displayRhythm(data.rhythm);
                 displayRecentSessions(data.recent_sessions);
 
 
@@ -43,6 +44,33 @@ function displayStats(stats) {
     document.getElementById('avg-wpm').textContent = (stats.average_wpm || 0).toFixed(1);
     document.getElementById('avg-accuracy').textContent = (stats.accuracy || 0).toFixed(1) + '%';
     document.getElementById('total-sessions').textContent = stats.exercises_completed || 0;
+
+    // Rolling averages over the most recent sessions
+    const rolling = stats.rolling || {};
+    ['10', '50', '100'].forEach(window => {
+        const element = document.getElementById(`rolling-${window}`);
+        const values = rolling[window];
+        element.textContent = values && stats.exercises_completed
+            ? `${values.average_wpm.toFixed(1)} WPM / ${values.accuracy.toFixed(1)}%`
+            : '--';
+    });
+}
+
+/**
+ * Display inter-key rhythm across all sessions
+ */
+function displayRhythm(rhythm) {
+    if (!rhythm || !rhythm.sessions) {
+        return;
+    }
+
+    document.getElementById('burst-wpm').textContent = rhythm.best_burst_wpm.toFixed(1);
+    document.getElementById('sustained-wpm').textContent = rhythm.sustained_wpm.toFixed(1);
+    document.getElementById('key-interval').textContent =
+        `${rhythm.mean_interval_ms.toFixed(0)} ± ${rhythm.stddev_interval_ms.toFixed(0)} ms`;
+    // Coefficient of variation of key intervals, shown as steadiness
+    document.getElementById('consistency').textContent =
+        `${Math.max(0, 100 - rhythm.consistency * 100).toFixed(0)}%`;
 }
 
 /**
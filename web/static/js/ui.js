@@ -86,10 +86,22 @@ function initTypingInterface() {
     // Typing session variables
     let currentSessionId = null;
     let currentExercise = null;
+    let currentLevel = null;
     let typingStarted = false;
     let typingInterval = null;
     let sessionStartTime = null;
 
+    // Keystrokes waiting to be sent to the server in one batch
+    const KEYSTROKE_BATCH_SIZE = 32;
+    const KEYSTROKE_FLUSH_MS = 250;
+    let pendingKeystrokes = [];
+    let flushTimer = null;
+
+    // Live WebSocket stream for the current session, when the server offers one
+    let sessionSocket = null;
+    // Resolves a completion sent over the stream once the server answers it
+    let resolveStreamCompletion = null;
+
     // Check URL parameters for exercise selection
     const urlParams = new URLSearchParams(window.location.search);
     const exerciseIdParam = urlParams.get('exercise');
@@ -183,7 +195,9 @@ function initTypingInterface() {
                             if (sessionData.status === 'success') {
                                 // Set current session
                                 currentSessionId = sessionData.session_id;
+                                openSessionStream(sessionData.stream_url);
                                 currentExercise = sessionData.exercise;
+                                currentLevel = level;
 
                                 // Display exercise
                                 displayExercise(currentExercise);
@@ -229,7 +243,9 @@ function initTypingInterface() {
                     if (data.status === 'success') {
                         // Set current session
                         currentSessionId = data.session_id;
+                        openSessionStream(data.stream_url);
                         currentExercise = data.exercise;
+                        currentLevel = level;
 
                         // Display exercise
                         displayExercise(currentExercise);
@@ -313,6 +329,9 @@ function initTypingInterface() {
         hiddenInput.value = '';
         hiddenInput.disabled = false;
 
+        // Discard keystrokes queued for the previous session
+        clearPendingKeystrokes();
+
         // Reset flags
         typingStarted = false;
         sessionStartTime = null;
@@ -358,18 +377,6 @@ function initTypingInterface() {
     function handleTyping(event) {
         const input = event.target.value;
 
-        // Check if the exercise is complete locally before sending to server
-        if (currentExercise && input.length >= currentExercise.text.length) {
-            // Show completion immediately if user has typed enough characters
-            handleSessionComplete({
-                wpm: parseFloat(wpmDisplay.textContent),
-                accuracy: parseFloat(accuracyDisplay.textContent),
-                time_elapsed: (Date.now() - sessionStartTime) / 1000,
-                errors: document.querySelectorAll('.char.error').length
-            });
-            return;
-        }
-
         // If no session or no input, return
         if (!currentSessionId || input.length === 0) {
             return;
@@ -384,22 +391,86 @@ function initTypingInterface() {
 
             // Start the appropriate timer
             startTimer();
-
-            // Play keystroke sound
-            playSound('keypress');
         }
 
-        // Send keystroke to server
+        // Give immediate local feedback, the server confirms in batches
         const lastChar = input.charAt(input.length - 1);
+        updateCharacterStyling(input);
+        playSound(lastChar === currentExercise.text.charAt(input.length - 1) ? 'keypress' : 'error');
+
+        // Queue keystroke for the server
+        queueKeystroke(lastChar);
+
+        // Complete locally once enough characters are typed, the final
+        // keystroke is already queued and gets flushed before completing
+        if (input.length >= currentExercise.text.length) {
+            handleSessionComplete();
+        }
+    }
+
+    /**
+     * Queue a keystroke and flush when the buffer is full or the timer fires
+     */
+    function queueKeystroke(key) {
+        pendingKeystrokes.push({
+            key: key,
+            timestamp: Date.now()
+        });
+
+        // Stream keystrokes straight away when a socket is open
+        if (isStreamOpen() || pendingKeystrokes.length >= KEYSTROKE_BATCH_SIZE) {
+            flushKeystrokes();
+        } else if (!flushTimer) {
+            flushTimer = setTimeout(flushKeystrokes, KEYSTROKE_FLUSH_MS);
+        }
+    }
+
+    /**
+     * Drop any queued keystrokes, e.g. when a new session starts
+     */
+    function clearPendingKeystrokes() {
+        pendingKeystrokes = [];
+        if (flushTimer) {
+            clearTimeout(flushTimer);
+            flushTimer = null;
+        }
+    }
+
+    /**
+     * Send all queued keystrokes to the server in a single request
+     */
+    function flushKeystrokes() {
+        if (flushTimer) {
+            clearTimeout(flushTimer);
+            flushTimer = null;
+        }
+
+        if (!currentSessionId || pendingKeystrokes.length === 0) {
+            return Promise.resolve();
+        }
+
+        const batch = pendingKeystrokes;
+        pendingKeystrokes = [];
+
+        if (isStreamOpen()) {
+            sessionSocket.send(JSON.stringify({
+                type: 'keystrokes',
+                keystrokes: batch,
+                exercise_id: currentExercise.id,
+                level: currentLevel
+            }));
+            return Promise.resolve();
+        }
 
-        fetch(`/api/session/${currentSessionId}/keystroke`, {
+        return fetch(`/api/session/${currentSessionId}/keystrokes`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                key: lastChar,
-                exercise_id: currentExercise.id
+                keystrokes: batch,
+                exercise_id: currentExercise.id,
+                level: currentLevel
             })
         })
             .then(response => {
@@ -410,30 +481,8 @@ function initTypingInterface() {
             })
             .then(data => {
                 if (data.status === 'success') {
-                    // Update character styling
-                    updateCharacterStyling(input);
-
-                    // Update stats display from server data
-                    if (data.metrics) {
-                        wpmDisplay.textContent = data.metrics.wpm.toFixed(1);
-                        accuracyDisplay.textContent = data.metrics.accuracy.toFixed(1) + '%';
-
-                        // Update time display
-                        const timeElapsed = data.metrics.time_elapsed;
-                        timeDisplay.textContent = formatTime(timeElapsed);
-                    }
-
-                    // Play sound based on correctness
-                    if (data.result) {
-                        if (data.result.correct) {
-                            playSound('keypress');
-                        } else {
-                            playSound('error');
-                        }
-                    }
-
                     // Check if session is complete
-                    if (data.result && data.result.complete) {
+                    if (data.result && data.result.complete && !hiddenInput.disabled) {
                         handleSessionComplete(data.metrics);
                     }
                 } else {
@@ -441,14 +490,14 @@ function initTypingInterface() {
                 }
             })
             .catch(error => {
-                console.error('Error sending keystroke:', error);
+                console.error('Error sending keystrokes:', error);
 
                 // Implement fallback for error cases - continue locally
-                updateCharacterStyling(input);
                 updateStats(); // Update stats locally
 
                 // Check if we're at the end of the text and complete locally if necessary
-                if (input.length >= currentExercise.text.length) {
+                const input = hiddenInput.value;
+                if (input.length >= currentExercise.text.length && !hiddenInput.disabled) {
                     handleSessionComplete({
                         wpm: parseFloat(wpmDisplay.textContent),
                         accuracy: parseFloat(accuracyDisplay.textContent),
@@ -459,6 +508,65 @@ function initTypingInterface() {
             });
     }
 
+    /**
+     * Open the WebSocket stream bound to the current session
+     */
+    function openSessionStream(streamUrl) {
+        closeSessionStream();
+
+        if (!streamUrl || typeof WebSocket === 'undefined') {
+            return;
+        }
+
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}${streamUrl}`);
+
+        socket.onmessage = event => handleStreamMessage(JSON.parse(event.data));
+        socket.onclose = () => {
+            // Later keystrokes fall back to batched HTTP
+            if (sessionSocket === socket) {
+                sessionSocket = null;
+            }
+            // and so does a completion left unanswered
+            settleStreamCompletion(null);
+        };
+
+        sessionSocket = socket;
+    }
+
+    /**
+     * Close the current session stream, if any
+     */
+    function closeSessionStream() {
+        if (sessionSocket) {
+            const socket = sessionSocket;
+            sessionSocket = null;
+            socket.close();
+        }
+    }
+
+    /**
+     * Check whether keystrokes can be sent over the session stream
+     */
+    function isStreamOpen() {
+        return sessionSocket !== null && sessionSocket.readyState === WebSocket.OPEN;
+    }
+
+    /**
+     * Handle a message pushed by the server over the session stream
+     */
+    function handleStreamMessage(data) {
+        if (data.type === 'complete') {
+            settleStreamCompletion(data);
+            closeSessionStream();
+            if (!hiddenInput.disabled) {
+                handleSessionComplete(data.metrics);
+            }
+        } else if (data.type === 'error') {
+            console.warn('Session stream error:', data.message);
+        }
+    }
+
     /**
      * Update character styling based on user input
      */
@@ -581,25 +689,31 @@ function initTypingInterface() {
         console.log("Session complete - Final metrics:", finalMetrics);
 
         // Save to server if needed
-        saveSessionResults(finalMetrics);
+        saveSessionResults();
     }
 
     // Add this helper function to save results to the server
-    function saveSessionResults(metrics) {
+    function saveSessionResults() {
         // Only save if we have a valid session ID
         if (!currentSessionId || !currentExercise) return;
 
-        fetch(`/api/session/${currentSessionId}/complete`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                exercise_id: currentExercise.id,
-                metrics: metrics
-            })
-        })
-            .then(response => response.json())
+        const sessionId = currentSessionId;
+        const completion = {
+            exercise_id: currentExercise.id,
+            level: currentLevel
+        };
+
+        // Make sure the server has seen every queued keystroke first: over
+        // the stream the completion queues behind them, over HTTP it waits
+        // for the last batch to be answered
+        completeOverStream(completion)
+            .then(data => data || flushKeystrokes().then(() => fetch(`/api/session/${sessionId}/complete`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(completion)
+            })).then(response => response.json()))
             .then(data => {
                 console.log("Session results saved:", data);
             })
@@ -608,6 +722,34 @@ function initTypingInterface() {
             });
     }
 
+    /**
+     * Send the completion over the open stream after any queued keystrokes,
+     * resolving with the server's answer, or with null to complete over HTTP
+     */
+    function completeOverStream(completion) {
+        if (!isStreamOpen()) {
+            return Promise.resolve(null);
+        }
+
+        flushKeystrokes();
+        settleStreamCompletion(null);
+        return new Promise(resolve => {
+            resolveStreamCompletion = resolve;
+            sessionSocket.send(JSON.stringify(Object.assign({ type: 'complete' }, completion)));
+        });
+    }
+
+    /**
+     * Hand a pending stream completion its answer
+     */
+    function settleStreamCompletion(data) {
+        if (resolveStreamCompletion) {
+            const resolve = resolveStreamCompletion;
+            resolveStreamCompletion = null;
+            resolve(data);
+        }
+    }
+
     /**
      * Reset the current exercise
      */
@@ -633,6 +775,7 @@ function initTypingInterface() {
                     if (data.status === 'success') {
                         // Set current session
                         currentSessionId = data.session_id;
+                        openSessionStream(data.stream_url);
 
                         // Reset UI state
                         resetUIState();